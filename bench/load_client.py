@@ -0,0 +1,219 @@
+"""
+Load test for the session server (``python src/main.py --serve``).
+
+Opens many concurrent VoiceSession/Converse streams, each playing WAV
+fixtures in real time, and reports admission results plus latency from the
+end of caller speech to the transcript, the first response audio and the
+end of the turn. Without --target it starts the stand-ins and a server
+itself, so it needs nothing but this checkout:
+
+    python bench/load_client.py --sessions 200 --turns 2
+
+Unrecognized options are forwarded to the stand-ins, as with run_bench.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from array import array
+from pathlib import Path
+
+import grpc
+
+from run_bench import BENCH_DIR, SAMPLE_RATE, free_port, make_fixtures, percentiles, start_stand_ins
+
+PROTO_DIR = BENCH_DIR.parent / "proto"
+SPEECH_THRESHOLD = 300
+
+
+def session_protos():
+    sys.path.insert(0, str(PROTO_DIR))
+    try:
+        return grpc.protos_and_services("perceptra_session.proto")
+    finally:
+        sys.path.remove(str(PROTO_DIR))
+
+
+def load_fixture(path: Path, chunk_frames: int):
+    """Return (PCM chunks, seconds into the file where speech ends)"""
+    with wave.open(str(path), "rb") as wf:
+        pcm = wf.readframes(wf.getnframes())
+    samples = array("h", pcm)
+    speech_end = 0
+    for i, sample in enumerate(samples):
+        if abs(sample) > SPEECH_THRESHOLD:
+            speech_end = i
+    chunk_bytes = chunk_frames * 2
+    chunks = [pcm[i:i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+    return chunks, (speech_end + 1) / SAMPLE_RATE
+
+
+class Results:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.turns = 0
+        self.transcript = []
+        self.first_audio = []
+        self.turn_end = []
+        self.audio_bytes = 0
+
+
+async def run_session(stub, messages, fixtures, opts, results: Results):
+    call = stub.Converse()
+    events = asyncio.Queue()
+
+    async def read():
+        try:
+            async for message in call:
+                events.put_nowait((time.perf_counter(), message))
+        finally:
+            events.put_nowait((time.perf_counter(), None))
+
+    reader = asyncio.create_task(read())
+    try:
+        for turn in range(opts.turns):
+            chunks, speech_offset = fixtures[turn % len(fixtures)]
+            start = time.perf_counter()
+            for i, chunk in enumerate(chunks):
+                await call.write(messages.ClientMessage(audio=chunk))
+                delay = start + (i + 1) * opts.chunk_frames / SAMPLE_RATE - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            speech_end = start + speech_offset
+
+            first_audio = None
+            while True:
+                at, message = await events.get()
+                if message is None:
+                    raise RuntimeError("Session closed by server")
+                kind = message.WhichOneof("event")
+                if kind == "transcript":
+                    results.transcript.append(at - speech_end)
+                elif kind == "audio":
+                    results.audio_bytes += len(message.audio)
+                    if first_audio is None:
+                        first_audio = at
+                        results.first_audio.append(at - speech_end)
+                elif kind == "turn_end":
+                    results.turn_end.append(at - speech_end)
+                    results.turns += 1
+                    break
+        await call.done_writing()
+        results.admitted += 1
+    except (grpc.aio.AioRpcError, asyncio.InvalidStateError, RuntimeError):
+        if await call.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+            results.rejected += 1
+        else:
+            results.failed += 1
+    finally:
+        reader.cancel()
+        call.cancel()
+
+
+async def run_load(target: str, opts):
+    messages, services = session_protos()
+    paths = (
+        sorted(opts.fixtures.glob("*.wav")) if opts.fixtures
+        else make_fixtures(Path(tempfile.mkdtemp(prefix="perceptra-fixtures-")), 4)
+    )
+    fixtures = [load_fixture(path, opts.chunk_frames) for path in paths]
+    results = Results()
+    async with grpc.aio.insecure_channel(target) as channel:
+        await asyncio.wait_for(channel.channel_ready(), timeout=opts.startup_timeout)
+        stub = services.VoiceSessionStub(channel)
+        start = time.perf_counter()
+
+        async def staggered(index):
+            await asyncio.sleep(index * opts.ramp_ms / 1000)
+            await run_session(stub, messages, fixtures, opts, results)
+
+        await asyncio.gather(*(staggered(i) for i in range(opts.sessions)))
+        wall = time.perf_counter() - start
+    return results, wall
+
+
+def start_server(ports, opts):
+    command = [
+        sys.executable, str(BENCH_DIR.parent / "src" / "main.py"), "--serve",
+        "--listen", f"127.0.0.1:{ports['server']}",
+        "--asr-server", f"127.0.0.1:{ports['asr']}",
+        "--tts-server", f"127.0.0.1:{ports['tts']}",
+        "--max-sessions", str(opts.max_sessions or opts.sessions),
+        "--max-active-turns", str(opts.max_active_turns),
+        "--admission-timeout", str(opts.admission_timeout),
+        "--no-play-audio",
+        "--stream",
+    ]
+    env = dict(os.environ, ANTHROPIC_BASE_URL=f"http://127.0.0.1:{ports['llm']}", ANTHROPIC_API_KEY="stand-in")
+    log = open(opts.server_log, "w") if opts.server_log else subprocess.DEVNULL
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Concurrent session load test for the Perceptra session server",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--target", help="host:port of a running session server (spawn one if omitted)")
+    parser.add_argument("--sessions", type=int, default=100, help="Concurrent sessions to open")
+    parser.add_argument("--turns", type=int, default=2, help="Utterances per session")
+    parser.add_argument("--ramp-ms", type=float, default=10, help="Delay between session starts")
+    parser.add_argument("--fixtures", type=Path, help="Directory of 16 kHz mono WAV files (synthetic if omitted)")
+    parser.add_argument("--chunk-frames", type=int, default=1600, help="Frames per audio message")
+    parser.add_argument("--max-sessions", type=int, help="Spawned server's --max-sessions (default: --sessions)")
+    parser.add_argument("--max-active-turns", type=int, default=16, help="Spawned server's --max-active-turns")
+    parser.add_argument("--admission-timeout", type=float, default=2.0, help="Spawned server's --admission-timeout")
+    parser.add_argument("--startup-timeout", type=float, default=60, help="Seconds to wait for the server")
+    parser.add_argument("--server-log", type=Path, help="Write the spawned server's log here")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    return parser.parse_known_args()
+
+
+def main():
+    opts, stand_in_args = parse_args()
+    processes = []
+    try:
+        target = opts.target
+        if target is None:
+            ports = {"asr": free_port(), "tts": free_port(), "llm": free_port(), "server": free_port()}
+            # The stand-ins use synchronous gRPC servers: one thread per open stream
+            workers = ["--workers", str(2 * opts.sessions + 16)]
+            processes.append(start_stand_ins(ports, workers + stand_in_args))
+            processes.append(start_server(ports, opts))
+            target = f"127.0.0.1:{ports['server']}"
+        results, wall = asyncio.run(run_load(target, opts))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=15)
+
+    report = {
+        "sessions": opts.sessions,
+        "admitted": results.admitted,
+        "rejected": results.rejected,
+        "failed": results.failed,
+        "turns": results.turns,
+        "turns_per_s": round(results.turns / wall, 3),
+        "audio_out_s": round(results.audio_bytes / (2 * SAMPLE_RATE), 1),
+        "latency": {
+            "transcript": percentiles(results.transcript),
+            "first_audio": percentiles(results.first_audio),
+            "turn_end": percentiles(results.turn_end),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if opts.output:
+        opts.output.write_text(json.dumps(report, indent=2))
+    if results.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
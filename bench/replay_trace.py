@@ -0,0 +1,159 @@
+"""
+Replay a recorded session against the local stand-ins.
+
+Record a session with the local agent, e.g.
+
+    python src/main.py --continuous --record-trace slow-turn.ptrc
+
+then replay it, before and after a change:
+
+    python bench/replay_trace.py slow-turn.ptrc --output before.json
+    python bench/replay_trace.py slow-turn.ptrc --baseline before.json
+
+The stand-ins (bench/stand_ins.py --replay-trace) answer with the recorded
+ASR responses, LLM text and TTS audio at the recorded offsets, and the
+agent reads the recorded mic audio at the recorded pace, so every run sees
+the same inputs and server timings and latency differences come from the
+agent. --speed 2 replays twice as fast. The agent runs in the recorded
+mode (window, continuous or barge-in) with the recorded sample rates,
+without warm-up requests, which would use up recorded responses. Other
+agent options, e.g. the caches, must match the recording for the replay to
+send the same requests; pass them with --agent-arg.
+
+Any option not listed here is forwarded to the stand-ins.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from run_bench import compare, free_port, percentiles, print_report, start_stand_ins
+
+import session_trace  # noqa: E402  (src/ is on the path via run_bench)
+
+MODE_FLAGS = {"continuous": ["--continuous"], "barge_in": ["--barge-in"], "window": []}
+
+
+def build_agent_args(ports, trace, opts):
+    from agent_config import build_arg_parser
+
+    meta = trace.meta
+    rates = meta.get("rates", {})
+    argv = [
+        "--asr-server", f"127.0.0.1:{ports['asr']}",
+        "--tts-server", f"127.0.0.1:{ports['tts']}",
+        "--startup-timeout", "30",
+        "--skip-warmup",
+        "--no-play-audio",
+        "--replay-trace", str(opts.trace),
+        "--replay-speed", str(opts.speed),
+        *MODE_FLAGS[meta.get("mode", "window")],
+    ]
+    for stage in ("capture", "asr", "tts", "playback"):
+        if stage in rates:
+            argv += [f"--{stage}-rate-hz", str(rates[stage])]
+    if meta.get("stream"):
+        argv.append("--stream")
+    if meta.get("vad"):
+        argv.append("--vad")
+    return build_arg_parser().parse_args(argv + opts.agent_args)
+
+
+def replay(args):
+    """Run the agent until the trace's mic audio is used up and return its per-turn latencies"""
+    from main import PerceptraAgent
+    from shared_logging import configure_logging
+
+    class ReplayAgent(PerceptraAgent):
+        """Keeps the end of speech to first audio latency of every turn"""
+
+        def __init__(self, args):
+            self.turn_latencies = []
+            super().__init__(args)
+
+        def _record_turn_latency(self):
+            super()._record_turn_latency()
+            speech_end = self.asr_service.speech_end
+            first_audio = self.tts_service.first_audio_at
+            if speech_end is not None and first_audio is not None and first_audio > speech_end:
+                self.turn_latencies.append(first_audio - speech_end)
+
+    configure_logging(args)
+    agent = ReplayAgent(args)
+    try:
+        start = time.perf_counter()
+        agent.run()
+        wall = time.perf_counter() - start
+    finally:
+        agent.shutdown()
+    return agent.turn_latencies, wall
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Replay a --record-trace session against the stand-ins and report turn latency",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("trace", type=Path, help="Trace written with --record-trace")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed relative to the recording")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Fail if the turn p95 regresses against this JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 regression ratio")
+    parser.add_argument("--agent-arg", dest="agent_args", action="append", default=[],
+                        help="Extra argument passed to the agent parser (repeatable)")
+    return parser.parse_known_args()
+
+
+def main():
+    opts, stand_in_args = parse_args()
+    trace = session_trace.SessionTrace(opts.trace)
+    print(
+        f"{opts.trace}: {trace.duration:.1f}s, mode {trace.meta.get('mode')}, {len(trace.mic)} mic streams, "
+        f"{len(trace.asr)} ASR streams, {len(trace.llm)} LLM requests, {len(trace.tts)} TTS requests"
+    )
+    ports = {"asr": free_port(), "tts": free_port(), "llm": free_port()}
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{ports['llm']}"
+    os.environ["ANTHROPIC_API_KEY"] = "stand-in"
+
+    stand_ins = start_stand_ins(
+        ports, ["--replay-trace", str(opts.trace), "--replay-speed", str(opts.speed), *stand_in_args]
+    )
+    try:
+        from audio_codec import CODEC_STATS
+        from metrics import REGISTRY
+
+        latencies, wall = replay(build_agent_args(ports, trace, opts))
+        results = {
+            "stages": {
+                "turn": {
+                    "latency": percentiles(latencies),
+                    "throughput": round(len(latencies) / wall, 3),
+                    "unit": "turns/s",
+                },
+            },
+            "spans": {
+                name: {k: v for k, v in snapshot.items() if k != "buckets"}
+                for name, snapshot in REGISTRY.snapshot().items()
+            },
+            "transport": CODEC_STATS.snapshot(),
+            "config": {"trace": str(opts.trace), "speed": opts.speed, "meta": trace.meta,
+                       "agent_args": opts.agent_args, "stand_in_args": stand_in_args},
+        }
+    finally:
+        stand_ins.terminate()
+        stand_ins.wait(timeout=10)
+
+    print_report(results)
+    if opts.output:
+        opts.output.write_text(json.dumps(results, indent=2))
+    if opts.baseline:
+        regressions = compare(results, json.loads(opts.baseline.read_text()), opts.tolerance)
+        if regressions:
+            print("\nLatency regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
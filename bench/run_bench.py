@@ -0,0 +1,334 @@
+"""
+Offline pipeline benchmark.
+
+Starts the local stand-ins (bench/stand_ins.py) in a child process, points
+ASRService, TTSService and PerceptraAgent at them, drives them from WAV
+fixtures and reports per-stage throughput and latency percentiles. The
+``translate`` stage runs the same fixtures through speech-to-speech
+translation (--translate) to compare it with the chained ``turn`` stage. No GPU,
+microphone, speaker or API key is needed, so it runs in a plain CI job:
+
+    python bench/run_bench.py --output bench.json --baseline main-bench.json
+
+Any option not listed here (e.g. --tts-first-chunk-ms 200) is forwarded to
+the stand-ins; see ``python bench/stand_ins.py --help``.
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from array import array
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+SAMPLE_RATE = 16000
+SENTENCES = [
+    "Hello, how can I help you today?",
+    "The weather tomorrow will be sunny with a light breeze.",
+    "Your order has been shipped and should arrive on Thursday.",
+    "I'm sorry, I encountered an error processing your request.",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(samples):
+    """Exact p50/p95/p99 of raw samples"""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)], 6)
+
+    return {"count": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def make_fixtures(directory: Path, count: int):
+    """Write synthetic utterances: a modulated tone followed by trailing silence"""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        speech_s = 0.8 + 0.2 * (i % 4)
+        n_speech = int(SAMPLE_RATE * speech_s)
+        samples = array("h", (
+            int(4000 * math.sin(2 * math.pi * 180 * t / SAMPLE_RATE) * (0.6 + 0.4 * math.sin(2 * math.pi * 3 * t / SAMPLE_RATE)))
+            for t in range(n_speech)
+        ))
+        samples.extend([0] * int(SAMPLE_RATE * 0.6))
+        path = directory / f"utterance_{i:02d}.wav"
+        with wave.open(str(path), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(SAMPLE_RATE)
+            wf.writeframes(samples.tobytes())
+        paths.append(path)
+    return paths
+
+
+def wav_chunks(path: Path, chunk_frames: int, realtime: bool):
+    """Yield raw PCM chunks from a WAV file, optionally paced like a microphone"""
+    with wave.open(str(path), "rb") as wf:
+        rate = wf.getframerate()
+        start = time.perf_counter()
+        sent = 0
+        while True:
+            data = wf.readframes(chunk_frames)
+            if not data:
+                return
+            if realtime:
+                delay = start + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent += len(data) // (2 * wf.getnchannels())
+            yield data
+
+
+def wav_seconds(path: Path) -> float:
+    with wave.open(str(path), "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def start_stand_ins(ports, extra_args):
+    command = [
+        sys.executable, str(BENCH_DIR / "stand_ins.py"),
+        "--asr-port", str(ports["asr"]), "--tts-port", str(ports["tts"]), "--llm-port", str(ports["llm"]),
+        *extra_args,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if "ready" not in line:
+        process.kill()
+        raise RuntimeError(f"stand-ins failed to start: {line!r}")
+    return process
+
+
+def build_agent_args(ports, opts):
+    from agent_config import build_arg_parser
+
+    argv = [
+        "--asr-server", f"127.0.0.1:{ports['asr']}",
+        "--tts-server", f"127.0.0.1:{ports['tts']}",
+        "--sample-rate-hz", str(SAMPLE_RATE),
+        "--tts-cache-memory-mb", "0",
+        "--startup-timeout", "30",
+        "--no-play-audio",
+        "--asr-encoding", opts.asr_encoding,
+        "--tts-encoding", opts.tts_encoding,
+    ]
+    if opts.stream:
+        argv.append("--stream")
+    return build_arg_parser().parse_args(argv + opts.agent_args)
+
+
+def bench_asr(asr_service, fixtures, opts):
+    """Unpaced recognition of every fixture: latency per file and audio-seconds per second"""
+    latencies, audio_s = [], 0.0
+    start = time.perf_counter()
+    for _ in range(opts.iterations):
+        for path in fixtures:
+            t0 = time.perf_counter()
+            asr_service.get_transcription(wav_chunks(path, opts.chunk_frames, realtime=False))
+            latencies.append(time.perf_counter() - t0)
+            audio_s += wav_seconds(path)
+    wall = time.perf_counter() - start
+    return {"latency": percentiles(latencies), "throughput": round(audio_s / wall, 3), "unit": "audio s/s"}
+
+
+def bench_tts(tts_service, opts):
+    """Synthesis of fixed sentences: time to first audio and sentences per second"""
+    from metrics import TTS_TIME_TO_FIRST_AUDIO
+
+    latencies = []
+    start = time.perf_counter()
+    count = 0
+    for _ in range(opts.iterations):
+        for sentence in SENTENCES:
+            before = TTS_TIME_TO_FIRST_AUDIO.count
+            t0 = time.perf_counter()
+            tts_service.synthesize_speech(sentence)
+            latencies.append(time.perf_counter() - t0)
+            count += 1
+            if TTS_TIME_TO_FIRST_AUDIO.count == before:
+                raise RuntimeError("TTS produced no audio")
+    wall = time.perf_counter() - start
+    return {"latency": percentiles(latencies), "throughput": round(count / wall, 3), "unit": "sentences/s"}
+
+
+def bench_turns(agent, fixtures, opts):
+    """Full turns: paced mic audio -> ASR -> LLM (or a local command) -> TTS, end of speech to first audio"""
+    latencies = []
+    start = time.perf_counter()
+    turns = 0
+    for _ in range(opts.iterations):
+        for path in fixtures:
+            transcript = agent.asr_service.get_transcription(
+                wav_chunks(path, opts.chunk_frames, realtime=True)
+            )
+            if not transcript:
+                raise RuntimeError(f"No transcript for {path}")
+            # The agent's own turn handling, including locally answered commands
+            agent._handle_turn(transcript)
+            speech_end = agent.asr_service.speech_end
+            first_audio = agent.tts_service.first_audio_at
+            if speech_end is not None and first_audio is not None and first_audio > speech_end:
+                latencies.append(first_audio - speech_end)
+            turns += 1
+    wall = time.perf_counter() - start
+    return {"latency": percentiles(latencies), "throughput": round(turns / wall, 3), "unit": "turns/s"}
+
+
+def bench_translate(agent, fixtures, opts):
+    """Speech-to-speech translation: paced mic audio -> one S2S RPC per fixture, end of speech to first audio"""
+    import argparse
+
+    from translation_service import TranslationService
+
+    args = argparse.Namespace(**vars(agent.args))
+    args.translate, args.target_language = True, opts.target_language
+    service = TranslationService(args, agent.channels)
+    if not service.pool.wait_until_serving(args.startup_timeout):
+        raise RuntimeError("The S2S translation stand-in is not serving")
+    service.warm_up()
+    latencies = []
+    start = time.perf_counter()
+    turns = 0
+    try:
+        for _ in range(opts.iterations):
+            for path in fixtures:
+                service.first_audio_at = None
+                audio = b"".join(service.translate(wav_chunks(path, opts.chunk_frames, realtime=True)))
+                if not audio:
+                    raise RuntimeError(f"No translated audio for {path}")
+                if service.speech_end is not None and service.first_audio_at is not None:
+                    latencies.append(service.first_audio_at - service.speech_end)
+                turns += 1
+    finally:
+        service.close()
+    wall = time.perf_counter() - start
+    return {"latency": percentiles(latencies), "throughput": round(turns / wall, 3), "unit": "turns/s"}
+
+
+def compare(results, baseline, tolerance):
+    """Return the list of stages whose p95 regressed beyond the tolerance"""
+    regressions = []
+    for stage, result in results["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {}).get("latency", {}).get("p95")
+        new = result["latency"]["p95"]
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{stage}: p95 {old:.3f}s -> {new:.3f}s")
+    return regressions
+
+
+def print_report(results):
+    print(f"\n{'stage':<10} {'n':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9}  throughput")
+    for stage, result in results["stages"].items():
+        lat = result["latency"]
+        print(
+            f"{stage:<10} {lat['count']:>5} {lat['p50'] or 0:>9.3f} {lat['p95'] or 0:>9.3f} "
+            f"{lat['p99'] or 0:>9.3f}  {result['throughput']} {result['unit']}"
+        )
+    print("\nInternal spans:")
+    for name, snapshot in results["spans"].items():
+        if snapshot["count"] and "values" in snapshot:
+            print(f"  {name}: {snapshot['values']}")
+        elif snapshot["count"] and name.endswith("_seconds"):
+            print(f"  {name}: n={snapshot['count']} p50={snapshot['p50']:.3f}s p95={snapshot['p95']:.3f}s")
+        elif snapshot["count"]:
+            print(f"  {name}: n={snapshot['count']} p50={snapshot['p50']:.0f} p95={snapshot['p95']:.0f}")
+    print("\nTransport:")
+    for direction, stats in results["transport"].items():
+        print(
+            f"  {direction}: {stats['pcm_bytes']} PCM bytes -> {stats['wire_bytes']} on the wire "
+            f"(ratio {stats['ratio']}), codec CPU {stats['cpu_seconds'] * 1000:.1f} ms"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Offline ASR/LLM/TTS pipeline benchmark against local stand-ins",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--fixtures", type=Path, help="Directory of 16 kHz mono WAV files (synthetic if omitted)")
+    parser.add_argument("--num-fixtures", type=int, default=4, help="Synthetic fixtures to generate")
+    parser.add_argument("--iterations", type=int, default=2, help="Passes over the fixtures per stage")
+    parser.add_argument("--chunk-frames", type=int, default=1600, help="Frames per ASR request chunk")
+    parser.add_argument("--stages", default="asr,tts,turn,translate", help="Comma-separated stages to run")
+    parser.add_argument("--target-language", default="de-DE", help="Target language of the translate stage")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="Use batch synthesis")
+    parser.add_argument("--asr-encoding", default="pcm", help="Transport encoding for ASR uploads")
+    parser.add_argument("--tts-encoding", default="pcm", help="Transport encoding for TTS downloads")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Fail if any stage p95 regresses against this JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 regression ratio")
+    parser.add_argument("--agent-arg", dest="agent_args", action="append", default=[],
+                        help="Extra argument passed to the agent parser (repeatable)")
+    return parser.parse_known_args()
+
+
+def main():
+    opts, stand_in_args = parse_args()
+    ports = {"asr": free_port(), "tts": free_port(), "llm": free_port()}
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{ports['llm']}"
+    os.environ["ANTHROPIC_API_KEY"] = "stand-in"
+
+    fixtures = (
+        sorted(opts.fixtures.glob("*.wav")) if opts.fixtures
+        else make_fixtures(Path(tempfile.mkdtemp(prefix="perceptra-fixtures-")), opts.num_fixtures)
+    )
+    if not fixtures:
+        sys.exit("No WAV fixtures found")
+
+    stand_ins = start_stand_ins(ports, stand_in_args)
+    try:
+        from audio_codec import CODEC_STATS
+        from main import PerceptraAgent
+        from metrics import REGISTRY
+
+        agent = PerceptraAgent(build_agent_args(ports, opts))
+        stages = [s.strip() for s in opts.stages.split(",") if s.strip()]
+        results = {"stages": {}, "config": {"fixtures": len(fixtures), "iterations": opts.iterations,
+                                            "stream": opts.stream, "asr_encoding": opts.asr_encoding,
+                                            "tts_encoding": opts.tts_encoding, "stand_in_args": stand_in_args}}
+        if "asr" in stages:
+            results["stages"]["asr"] = bench_asr(agent.asr_service, fixtures, opts)
+        if "tts" in stages:
+            results["stages"]["tts"] = bench_tts(agent.tts_service, opts)
+        if "turn" in stages:
+            results["stages"]["turn"] = bench_turns(agent, fixtures, opts)
+        if "translate" in stages:
+            results["stages"]["translate"] = bench_translate(agent, fixtures, opts)
+        results["spans"] = {
+            name: {k: v for k, v in snapshot.items() if k != "buckets"}
+            for name, snapshot in REGISTRY.snapshot().items()
+        }
+        results["transport"] = CODEC_STATS.snapshot()
+        agent.shutdown()
+    finally:
+        stand_ins.terminate()
+        stand_ins.wait(timeout=10)
+
+    print_report(results)
+    if opts.output:
+        opts.output.write_text(json.dumps(results, indent=2))
+    if opts.baseline:
+        regressions = compare(results, json.loads(opts.baseline.read_text()), opts.tolerance)
+        if regressions:
+            print("\nLatency regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,636 @@
+"""
+Local stand-ins for the Riva ASR/TTS NIMs (with speech-to-speech
+translation on the ASR port) and the Anthropic messages API.
+
+The gRPC servicers are built from the checked-in proto/ definitions, and the
+LLM stand-in speaks the Anthropic server-sent-events streaming format. Every
+latency is configurable so the benchmark can model fast and slow backends.
+
+Run it on its own to point a real agent at it:
+
+    python bench/stand_ins.py --asr-port 50061 --tts-port 50062 --llm-port 8089
+
+With --replay-trace the stand-ins answer with the ASR responses, LLM text
+and TTS audio of a session recorded by ``--record-trace``, at the recorded
+pace (see bench/replay_trace.py).
+
+This process deliberately never imports riva.client: the stubs here are
+compiled from proto/ and would clash with riva.client's copies in one
+descriptor pool.
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import grpc
+
+PROTO_DIR = Path(__file__).resolve().parent.parent / "proto"
+PROTO_FILES = (
+    "riva_audio.proto", "riva_common.proto", "riva_asr.proto", "riva_tts.proto", "riva_nmt.proto", "health.proto"
+)
+SERVING = 1
+# riva AudioEncoding values
+LINEAR_PCM, FLAC, MULAW, OGGOPUS, ALAW = 1, 2, 3, 4, 20
+
+sys.path.insert(0, str(PROTO_DIR.parent / "src"))
+import audio_codec  # noqa: E402  (NumPy only, no riva.client)
+import session_trace  # noqa: E402
+
+_G711_DECODERS = {MULAW: audio_codec.mulaw_decode, ALAW: audio_codec.alaw_decode}
+_G711_ENCODERS = {MULAW: audio_codec.mulaw_encode, ALAW: audio_codec.alaw_encode}
+_CONTAINER_NAMES = {FLAC: "flac", OGGOPUS: "opus"}
+
+
+def load_protos():
+    """
+    Compile the checked-in protos at runtime.
+
+    The Riva files import each other as "riva/proto/<name>.proto"; they are
+    copied to a scratch directory with flat imports so they load as
+    top-level modules.
+
+    Returns:
+        dict: proto file name -> (messages module, services module)
+    """
+    scratch = Path(tempfile.mkdtemp(prefix="perceptra-protos-"))
+    for name in PROTO_FILES:
+        text = (PROTO_DIR / name).read_text()
+        text = re.sub(r'import "riva/proto/([^"]+)"', r'import "\1"', text)
+        (scratch / name).write_text(text)
+    sys.path.insert(0, str(scratch))
+    return {
+        name: grpc.protos_and_services(name)
+        for name in ("riva_asr.proto", "riva_tts.proto", "riva_nmt.proto", "health.proto")
+    }
+
+
+PROTOS = load_protos()
+asr_pb2, asr_pb2_grpc = PROTOS["riva_asr.proto"]
+tts_pb2, tts_pb2_grpc = PROTOS["riva_tts.proto"]
+nmt_pb2, nmt_pb2_grpc = PROTOS["riva_nmt.proto"]
+health_pb2, health_pb2_grpc = PROTOS["health.proto"]
+
+
+class HealthServicer(health_pb2_grpc.HealthServicer):
+    def Check(self, request, context):
+        return health_pb2.HealthCheckResponse(status=SERVING)
+
+    def Watch(self, request, context):
+        yield health_pb2.HealthCheckResponse(status=SERVING)
+        while context.is_active():
+            time.sleep(1)
+
+
+class ASRStandIn(asr_pb2_grpc.RivaSpeechRecognitionServicer):
+    """
+    Energy-based fake recognizer.
+
+    Speech is any chunk whose mean absolute amplitude exceeds a threshold.
+    While speech is present an interim hypothesis is emitted every
+    ``interim_every`` chunks; after ``endpoint_ms`` of silence (or at the end
+    of the stream) a final result is emitted. Each response is delayed by
+    ``latency_ms`` to model server processing.
+
+    MULAW/ALAW audio is decoded first. FLAC/OGGOPUS chunks do not align with
+    samples, so every non-empty chunk counts as speech and the final result
+    comes at the end of the stream.
+    """
+
+    def __init__(self, opts):
+        self.latency = opts.asr_latency_ms / 1000
+        self.endpoint_s = opts.asr_endpoint_ms / 1000
+        self.interim_every = opts.asr_interim_every
+        self.threshold = opts.asr_energy_threshold
+        self.utterances = 0
+        self.phrases = opts.asr_phrase or []
+        self._lock = threading.Lock()
+
+    def _next_transcript(self) -> str:
+        with self._lock:
+            self.utterances += 1
+            if self.phrases:
+                return self.phrases[(self.utterances - 1) % len(self.phrases)]
+            return f"benchmark utterance number {self.utterances}"
+
+    @staticmethod
+    def _result(transcript: str, is_final: bool, audio_processed: float):
+        return asr_pb2.StreamingRecognizeResponse(
+            results=[
+                asr_pb2.StreamingRecognitionResult(
+                    alternatives=[asr_pb2.SpeechRecognitionAlternative(transcript=transcript, confidence=1.0)],
+                    is_final=is_final,
+                    stability=0.0 if is_final else 0.9,
+                    audio_processed=audio_processed,
+                )
+            ]
+        )
+
+    def _is_speech(self, chunk: bytes) -> bool:
+        samples = array("h")
+        samples.frombytes(chunk[: len(chunk) - len(chunk) % 2])
+        if not samples:
+            return False
+        return sum(abs(s) for s in samples) / len(samples) > self.threshold
+
+    def StreamingRecognize(self, request_iterator, context):
+        sample_rate = 16000
+        processed = 0.0
+        in_speech = False
+        speech_chunks = 0
+        silence = 0.0
+        words = []
+        encoding = LINEAR_PCM
+
+        for request in request_iterator:
+            if request.HasField("streaming_config"):
+                sample_rate = request.streaming_config.config.sample_rate_hertz or sample_rate
+                encoding = request.streaming_config.config.encoding or LINEAR_PCM
+                continue
+            audio = request.audio_content
+            if encoding in _G711_DECODERS:
+                audio = _G711_DECODERS[encoding](audio)
+            duration = len(audio) / 2 / sample_rate
+            processed += duration
+
+            if encoding in _CONTAINER_NAMES:
+                if not in_speech and audio:
+                    in_speech = True
+                    words = self._next_transcript().split()
+            elif self._is_speech(audio):
+                if not in_speech:
+                    in_speech = True
+                    words = self._next_transcript().split()
+                speech_chunks += 1
+                silence = 0.0
+                if speech_chunks % self.interim_every == 0:
+                    time.sleep(self.latency)
+                    partial = " ".join(words[: min(len(words), speech_chunks // self.interim_every)])
+                    yield self._result(partial, False, processed)
+            elif in_speech:
+                silence += duration
+                if silence >= self.endpoint_s:
+                    time.sleep(self.latency)
+                    yield self._result(" ".join(words), True, processed)
+                    in_speech, speech_chunks, silence = False, 0, 0.0
+
+        if in_speech:
+            time.sleep(self.latency)
+            yield self._result(" ".join(words), True, processed)
+
+    def Recognize(self, request, context):
+        time.sleep(self.latency)
+        duration = len(request.audio) / 2 / (request.config.sample_rate_hertz or 16000)
+        return asr_pb2.RecognizeResponse(
+            results=[
+                asr_pb2.SpeechRecognitionResult(
+                    alternatives=[asr_pb2.SpeechRecognitionAlternative(transcript=self._next_transcript())],
+                    audio_processed=duration,
+                )
+            ]
+        )
+
+    def GetRivaSpeechRecognitionConfig(self, request, context):
+        return asr_pb2.RivaSpeechRecognitionConfigResponse()
+
+
+class TTSStandIn(tts_pb2_grpc.RivaSpeechSynthesisServicer):
+    """
+    Fake synthesizer producing a quiet tone whose length scales with the text.
+
+    Streaming responses arrive ``first_chunk_ms`` after the request and then
+    every ``chunk_interval_ms``, each carrying ``chunk_ms`` of audio.
+    """
+
+    def __init__(self, opts):
+        self.ms_per_char = opts.tts_ms_per_char
+        self.first_chunk = opts.tts_first_chunk_ms / 1000
+        self.chunk_ms = opts.tts_chunk_ms
+        self.chunk_interval = opts.tts_chunk_interval_ms / 1000
+        self.batch_latency = opts.tts_batch_latency_ms / 1000
+
+    def _audio(self, text: str, sample_rate: int) -> bytes:
+        n = int(sample_rate * len(text) * self.ms_per_char / 1000)
+        step = 2 * math.pi * 220 / sample_rate
+        return array("h", (int(1000 * math.sin(i * step)) for i in range(n))).tobytes()
+
+    @staticmethod
+    def _encode(audio: bytes, encoding: int, sample_rate: int) -> bytes:
+        if encoding in _G711_ENCODERS:
+            return _G711_ENCODERS[encoding](audio)
+        if encoding in _CONTAINER_NAMES:
+            encoder = audio_codec.Encoder(_CONTAINER_NAMES[encoding], sample_rate)
+            return encoder.encode(audio) + encoder.flush()
+        return audio
+
+    def Synthesize(self, request, context):
+        sample_rate = request.sample_rate_hz or 44100
+        audio = self._encode(self._audio(request.text, sample_rate), request.encoding, sample_rate)
+        time.sleep(self.batch_latency)
+        return tts_pb2.SynthesizeSpeechResponse(audio=audio)
+
+    def stream(self, text: str, sample_rate: int, encoding: int, context):
+        """Encoded audio chunks of a streaming synthesis, at the streaming pace"""
+        audio = self._audio(text, sample_rate)
+        step = 2 * sample_rate * self.chunk_ms // 1000
+        if encoding in _G711_ENCODERS:
+            # One byte per sample: chunk before encoding to keep chunk durations
+            chunks = [
+                self._encode(audio[offset:offset + step], encoding, sample_rate)
+                for offset in range(0, len(audio), step)
+            ]
+        else:
+            audio = self._encode(audio, encoding, sample_rate)
+            chunks = [audio[offset:offset + step] for offset in range(0, len(audio), step)]
+        time.sleep(self.first_chunk)
+        for index, chunk in enumerate(chunks):
+            if not context.is_active():
+                return
+            if index:
+                time.sleep(self.chunk_interval)
+            yield chunk
+
+    def SynthesizeOnline(self, request, context):
+        for chunk in self.stream(request.text, request.sample_rate_hz or 44100, request.encoding, context):
+            yield tts_pb2.SynthesizeSpeechResponse(audio=chunk)
+
+    def GetRivaSynthesisConfig(self, request, context):
+        return tts_pb2.RivaSynthesisConfigResponse()
+
+
+class TranslationStandIn(nmt_pb2_grpc.RivaTranslationServicer):
+    """
+    Fake speech-to-speech translation: the ASR stand-in's endpointing, then
+    ``nmt_latency_ms``, then the TTS stand-in's streaming synthesis of the
+    "translated" transcript in the target language. Each utterance's audio
+    is followed by an empty response, as Riva sends.
+    """
+
+    def __init__(self, opts, asr: ASRStandIn, tts: TTSStandIn):
+        self.asr = asr
+        self.tts = tts
+        self.latency = opts.nmt_latency_ms / 1000
+
+    def StreamingTranslateSpeechToSpeech(self, request_iterator, context):
+        config = nmt_pb2.StreamingTranslateSpeechToSpeechConfig()
+
+        def recognize_requests():
+            for request in request_iterator:
+                if request.HasField("config"):
+                    config.CopyFrom(request.config)
+                    yield asr_pb2.StreamingRecognizeRequest(streaming_config=config.asr_config)
+                else:
+                    yield asr_pb2.StreamingRecognizeRequest(audio_content=request.audio_content)
+
+        for response in self.asr.StreamingRecognize(recognize_requests(), context):
+            for result in response.results:
+                if not result.is_final:
+                    continue
+                time.sleep(self.latency)
+                text = f"{config.translation_config.target_language_code} {result.alternatives[0].transcript}"
+                tts_config = config.tts_config
+                for chunk in self.tts.stream(text, tts_config.sample_rate_hz or 44100, tts_config.encoding, context):
+                    yield nmt_pb2.StreamingTranslateSpeechToSpeechResponse(
+                        speech=tts_pb2.SynthesizeSpeechResponse(audio=chunk)
+                    )
+                yield nmt_pb2.StreamingTranslateSpeechToSpeechResponse(speech=tts_pb2.SynthesizeSpeechResponse())
+
+
+class Recorded:
+    """
+    Recorded exchanges of one kind, handed out in order or by request text.
+
+    Replayed timings are the recorded offsets divided by ``speed``.
+    """
+
+    def __init__(self, exchanges, speed: float, key=lambda exchange: exchange.request):
+        self.speed = speed
+        self._pending = list(exchanges)
+        self._key = key
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            return self._pending.pop(0) if self._pending else None
+
+    def match(self, key, fallback: bool = True):
+        """The first unused exchange with this key, else the next one if ``fallback``"""
+        with self._lock:
+            for index, exchange in enumerate(self._pending):
+                if self._key(exchange) == key:
+                    return self._pending.pop(index)
+            if fallback and self._pending:
+                return self._pending.pop(0)
+        return None
+
+    def play(self, exchange, started: float, context=None):
+        """Yield the payloads of an exchange at their recorded offsets from ``started``"""
+        for offset, payload in exchange.items:
+            delay = started + offset / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if context is not None and not context.is_active():
+                return
+            yield payload
+
+
+class ReplayASRStandIn(ASRStandIn):
+    """
+    Answers each StreamingRecognize RPC with the responses of the next
+    recorded one, at the recorded offsets from the start of the RPC. The
+    request stream is drained on a separate thread, and the RPC ends once
+    the client stops sending, like a real stream.
+    """
+
+    def __init__(self, opts, trace):
+        super().__init__(opts)
+        self.streams = Recorded(trace.asr, opts.replay_speed)
+
+    def StreamingRecognize(self, request_iterator, context):
+        started = time.perf_counter()
+        stream = self.streams.next()
+        drained = threading.Event()
+
+        def drain():
+            for _ in request_iterator:
+                pass
+            drained.set()
+
+        threading.Thread(target=drain, daemon=True).start()
+        if stream is not None:
+            for payload in self.streams.play(stream, started, context):
+                yield asr_pb2.StreamingRecognizeResponse.FromString(payload)
+        while not drained.wait(0.1) and context.is_active():
+            pass
+
+
+class ReplayTTSStandIn(TTSStandIn):
+    """
+    Answers synthesis requests with the recorded audio for the same text,
+    at the recorded offsets. Text that was never recorded, such as the
+    warm-up, gets a short silence without using up a recording.
+    """
+
+    def __init__(self, opts, trace):
+        super().__init__(opts)
+        self.recorded = Recorded(
+            [e for e in trace.tts if e.items], opts.replay_speed, key=lambda e: json.loads(e.request)["text"]
+        )
+
+    def _chunks(self, request, context):
+        """Recorded audio for the request text, encoded as requested, at the recorded pace"""
+        sample_rate = request.sample_rate_hz or 44100
+        started = time.perf_counter()
+        exchange = self.recorded.match(request.text, fallback=False)
+        if exchange is None:
+            yield self._encode(bytes(2 * sample_rate // 10), request.encoding, sample_rate)
+            return
+        chunks = self.recorded.play(exchange, started, context)
+        if request.encoding in _CONTAINER_NAMES:
+            # One container per response, as the recording was decoded whole
+            chunks = [b"".join(chunks)]
+        for audio in chunks:
+            yield self._encode(audio, request.encoding, sample_rate)
+
+    def Synthesize(self, request, context):
+        return tts_pb2.SynthesizeSpeechResponse(audio=b"".join(self._chunks(request, context)))
+
+    def SynthesizeOnline(self, request, context):
+        for audio in self._chunks(request, context):
+            yield tts_pb2.SynthesizeSpeechResponse(audio=audio)
+
+
+def _prompt_blocks(body):
+    """Text blocks of a Messages request in prompt order, with their cache_control flags"""
+    def blocks(content):
+        if isinstance(content, str):
+            return [(content, False)]
+        return [(block.get("text", ""), "cache_control" in block) for block in content]
+
+    result = blocks(body.get("system") or [])
+    for message in body.get("messages", []):
+        result.extend(blocks(message["content"]))
+    return result
+
+
+class PromptCache:
+    """
+    Prompt caching as the Messages API reports it: the longest cached prefix
+    ending on a block boundary at or before the last cache_control
+    breakpoint is read, and the prefix up to the last breakpoint is written
+    if missing. Tokens are estimated at 4 characters each.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prefixes = set()
+
+    def usage(self, body):
+        total, read, write = 0, 0, 0
+        digest = hashlib.sha1()
+        boundaries, last = [], None
+        for text, cached in _prompt_blocks(body):
+            digest.update(text.encode() + b"\0")
+            total += len(text) // 4 + 1
+            boundaries.append((digest.hexdigest(), total))
+            if cached:
+                last = len(boundaries)
+        if last is None:
+            return {"input_tokens": total, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        with self._lock:
+            for key, tokens in boundaries[:last]:
+                if key in self._prefixes:
+                    read = tokens
+            key, tokens = boundaries[last - 1]
+            if key not in self._prefixes:
+                self._prefixes.add(key)
+                write = tokens - read
+        return {"input_tokens": total - read - write, "cache_read_input_tokens": read, "cache_creation_input_tokens": write}
+
+
+def _last_user_text(body) -> str:
+    content = body.get("messages", [{}])[-1].get("content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+def make_llm_handler(opts, trace=None):
+    """
+    HTTP handler for POST /v1/messages streaming a canned reply as SSE, or
+    with a trace, the reply recorded for the same user message.
+    """
+    reply = opts.llm_reply
+    tokens = re.findall(r"\S+\s*", reply)
+    cache = PromptCache()
+    recorded = Recorded(trace.llm, opts.replay_speed) if trace is not None else None
+
+    def schedule(body, usage):
+        """(seconds after the request, text) of every delta"""
+        if recorded is not None:
+            exchange = recorded.match(_last_user_text(body).encode())
+            if exchange is not None:
+                return [(offset / recorded.speed, text.decode()) for offset, text in exchange.items]
+        # Cache reads are prefilled at a tenth of the cost of new tokens
+        prefill = usage["input_tokens"] + usage["cache_creation_input_tokens"] + usage["cache_read_input_tokens"] / 10
+        first = (opts.llm_ttft_ms + prefill * opts.llm_prefill_ms_per_1k / 1000) / 1000
+        return [(first + i * opts.llm_token_ms / 1000, token) for i, token in enumerate(tokens)]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _event(self, name, payload):
+            data = f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            model = body.get("model", "stand-in")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            started = time.perf_counter()
+            usage = cache.usage(body)
+            deltas = schedule(body, usage)
+            if deltas:
+                time.sleep(max(0.0, started + deltas[0][0] - time.perf_counter()))
+            self._event("message_start", {
+                "type": "message_start",
+                "message": {
+                    "id": "msg_stand_in", "type": "message", "role": "assistant", "content": [],
+                    "model": model, "stop_reason": None, "stop_sequence": None,
+                    "usage": dict(usage, output_tokens=1),
+                },
+            })
+            self._event("content_block_start", {
+                "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""},
+            })
+            for offset, token in deltas:
+                delay = started + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._event("content_block_delta", {
+                    "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token},
+                })
+            self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self._event("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(deltas)},
+            })
+            self._event("message_stop", {"type": "message_stop"})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def add_stand_in_arguments(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Latency and shape knobs shared by this script and the benchmark runner"""
+    parser.add_argument("--asr-latency-ms", type=float, default=20, help="Delay before each ASR response")
+    parser.add_argument("--asr-endpoint-ms", type=float, default=300, help="Silence that ends an utterance")
+    parser.add_argument("--asr-interim-every", type=int, default=2, help="Speech chunks per interim result")
+    parser.add_argument("--asr-energy-threshold", type=float, default=300, help="Mean |sample| counted as speech")
+    parser.add_argument(
+        "--asr-phrase", action="append", help="Transcript to cycle through instead of numbered utterances (repeatable)"
+    )
+    parser.add_argument("--tts-ms-per-char", type=float, default=60, help="Audio generated per input character")
+    parser.add_argument("--tts-first-chunk-ms", type=float, default=80, help="Streaming time to first chunk")
+    parser.add_argument("--tts-chunk-ms", type=int, default=100, help="Audio per streaming chunk")
+    parser.add_argument("--tts-chunk-interval-ms", type=float, default=20, help="Delay between streaming chunks")
+    parser.add_argument("--tts-batch-latency-ms", type=float, default=150, help="Batch synthesis latency")
+    parser.add_argument("--nmt-latency-ms", type=float, default=30, help="S2S translation delay between the end of an utterance and synthesis")
+    parser.add_argument("--llm-ttft-ms", type=float, default=250, help="LLM time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=15, help="LLM delay between tokens")
+    parser.add_argument(
+        "--llm-prefill-ms-per-1k", type=float, default=0, help="Extra time to first token per 1000 uncached prompt tokens"
+    )
+    parser.add_argument(
+        "--llm-reply",
+        default="Sure, I can help with that. Here is a short answer in a few sentences. "
+                "Let me know if you would like more detail on any part of it.",
+        help="Canned LLM reply",
+    )
+    parser.add_argument("--replay-trace", type=Path, help="Answer with the responses recorded in this session trace")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Speed-up of the replayed timings")
+    return parser
+
+
+def serve(opts):
+    """Start the requested stand-ins and block until interrupted"""
+    servers = []
+    workers = futures.ThreadPoolExecutor(max_workers=opts.workers)
+    trace = session_trace.SessionTrace(opts.replay_trace) if opts.replay_trace else None
+
+    if opts.asr_port:
+        server = grpc.server(workers)
+        asr = ReplayASRStandIn(opts, trace) if trace is not None else ASRStandIn(opts)
+        asr_pb2_grpc.add_RivaSpeechRecognitionServicer_to_server(asr, server)
+        # Riva serves NMT next to ASR; speech-to-speech translation synthesizes like the TTS stand-in
+        nmt_pb2_grpc.add_RivaTranslationServicer_to_server(TranslationStandIn(opts, ASRStandIn(opts), TTSStandIn(opts)), server)
+        health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(), server)
+        server.add_insecure_port(f"{opts.host}:{opts.asr_port}")
+        server.start()
+        servers.append(server)
+
+    if opts.tts_port:
+        server = grpc.server(workers)
+        tts = ReplayTTSStandIn(opts, trace) if trace is not None else TTSStandIn(opts)
+        tts_pb2_grpc.add_RivaSpeechSynthesisServicer_to_server(tts, server)
+        health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(), server)
+        server.add_insecure_port(f"{opts.host}:{opts.tts_port}")
+        server.start()
+        servers.append(server)
+
+    http = None
+    if opts.llm_port:
+        http = ThreadingHTTPServer((opts.host, opts.llm_port), make_llm_handler(opts, trace))
+        threading.Thread(target=http.serve_forever, daemon=True).start()
+
+    print(f"stand-ins ready asr={opts.asr_port} tts={opts.tts_port} llm={opts.llm_port}", flush=True)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    for server in servers:
+        server.stop(grace=0.5)
+    if http is not None:
+        http.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-ins for Riva ASR/TTS and the Anthropic API",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--asr-port", type=int, default=50061)
+    parser.add_argument("--tts-port", type=int, default=50062)
+    parser.add_argument("--llm-port", type=int, default=8089)
+    parser.add_argument("--workers", type=int, default=64, help="gRPC worker threads")
+    serve(add_stand_in_arguments(parser).parse_args())
+
+
+if __name__ == "__main__":
+    main()
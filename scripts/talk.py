@@ -5,6 +5,7 @@ import argparse
 import time
 import wave
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import riva.client
@@ -34,6 +35,13 @@ def parse_args() -> argparse.Namespace:
     group.add_argument("--text", type=str, help="Text input to synthesize.")
     group.add_argument("--list-devices", action="store_true", help="List output audio devices indices.")
     group.add_argument("--list-voices", action="store_true", help="List available voices.")
+    group.add_argument(
+        "--manifest",
+        type=Path,
+        help="Bulk mode: a .txt file with one text per line, or a .jsonl file with `text` and optional `output` "
+        "and `voice` fields. Items are synthesized concurrently with streaming synthesis and written to "
+        "`--output-dir`.",
+    )
     parser.add_argument(
         "--voice",
         help="A voice name to use. If this parameter is missing, then the server will try a first available model "
@@ -44,6 +52,8 @@ def parse_args() -> argparse.Namespace:
         type=Path,
         help="An input audio prompt (.wav) file for zero shot model. This is required to do zero shot inferencing.")
     parser.add_argument("-o", "--output", type=Path, default="output.wav", help="Output file .wav file to write synthesized audio.")
+    parser.add_argument("--output-dir", type=Path, default="bulk_output", help="Directory for bulk mode .wav files.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent synthesis requests in bulk mode.")
     parser.add_argument("--quality", type=int, help="Number of times decoder should be run on the output audio. A higher number improves quality of the produced output but introduces latencies.")
     parser.add_argument(
         "--play-audio",
@@ -73,6 +83,81 @@ def parse_args() -> argparse.Namespace:
     return args
 
 
+def read_manifest(path):
+    items = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if path.suffix == ".jsonl" else {"text": line}
+            item.setdefault("output", f"{len(items):05d}.wav")
+            items.append(item)
+    return items
+
+
+def synthesize_to_wav(service, args, text, voice, output, custom_dictionary):
+    """Stream one synthesis straight into a .wav file; returns (time to first audio, total time, audio seconds)"""
+    start = time.time()
+    first_audio = None
+    frames = 0
+    with wave.open(str(output), 'wb') as out_f:
+        out_f.setnchannels(1)
+        out_f.setsampwidth(2)
+        out_f.setframerate(args.sample_rate_hz)
+        responses = service.synthesize_online(
+            text, voice, args.language_code, sample_rate_hz=args.sample_rate_hz,
+            audio_prompt_file=args.audio_prompt_file, quality=20 if args.quality is None else args.quality,
+            custom_dictionary=custom_dictionary
+        )
+        for resp in responses:
+            if first_audio is None:
+                first_audio = time.time() - start
+            out_f.writeframesraw(resp.audio)
+            frames += len(resp.audio) // 2
+    return first_audio, time.time() - start, frames / args.sample_rate_hz
+
+
+def run_bulk(service, args, custom_dictionary):
+    items = read_manifest(args.manifest)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Synthesizing {len(items)} items with {args.workers} workers...")
+
+    def work(item):
+        try:
+            return item, synthesize_to_wav(
+                service, args, item["text"], item.get("voice", args.voice),
+                args.output_dir / item["output"], custom_dictionary
+            ), None
+        except Exception as e:
+            return item, None, e
+
+    start = time.time()
+    latencies, first_audio, audio_seconds, failures = [], [], 0.0, 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for item, result, error in executor.map(work, items):
+            if error is not None:
+                failures += 1
+                print(f"{item['output']}: {error}")
+                continue
+            ttfa, total, seconds = result
+            latencies.append(total)
+            if ttfa is not None:
+                first_audio.append(ttfa)
+            audio_seconds += seconds
+    wall = time.time() - start
+
+    def percentile(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+    print(f"Synthesized {len(items) - failures}/{len(items)} items, {audio_seconds:.1f}s of audio in {wall:.1f}s "
+          f"(real-time factor {wall / audio_seconds if audio_seconds else 0:.3f})")
+    print(f"Per item: time to first audio p50={percentile(first_audio, 0.5):.3f}s "
+          f"p95={percentile(first_audio, 0.95):.3f}s, total p50={percentile(latencies, 0.5):.3f}s "
+          f"p95={percentile(latencies, 0.95):.3f}s")
+
+
 def main() -> None:
     args = parse_args()
     if args.output.is_dir():
@@ -108,6 +193,13 @@ def main() -> None:
         print(json.dumps(tts_models, indent=4))
         return
 
+    if args.manifest is not None:
+        custom_dictionary_input = {}
+        if args.custom_dictionary is not None:
+            custom_dictionary_input = read_file_to_dict(args.custom_dictionary)
+        run_bulk(service, args, custom_dictionary_input)
+        return
+
     if not args.text:
         print("No input text provided")
         return
@@ -0,0 +1,257 @@
+import argparse
+import json
+import mmap
+import random
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import grpc
+import riva.client
+from riva.client.argparse_utils import add_asr_config_argparse_parameters, add_connection_argparse_parameters
+
+MAX_MESSAGE_BYTES = 256 * 1024 * 1024
+RETRYABLE = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED, grpc.StatusCode.RESOURCE_EXHAUSTED}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Concurrent batch transcription of WAV files via Riva AI Services",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "inputs",
+        type=Path,
+        nargs="+",
+        help="WAV files, directories (searched recursively) or manifests (.txt with one path per line, "
+        ".jsonl with an `audio_filepath` field).",
+    )
+    parser.add_argument("-o", "--output", type=Path, default="transcripts.jsonl", help="JSONL file results are appended to.")
+    parser.add_argument("--mode", choices=["offline", "streaming"], default="offline", help="Recognize or StreamingRecognize.")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Maximum concurrent RPCs.")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per file on UNAVAILABLE, DEADLINE_EXCEEDED or RESOURCE_EXHAUSTED.")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-RPC deadline in seconds.")
+    parser.add_argument("--resume", action="store_true", help="Skip files that already have a result in --output.")
+    parser.add_argument(
+        "--file-streaming-chunk",
+        type=int,
+        default=16000,
+        help="Frames per request in streaming mode.",
+    )
+    parser = add_asr_config_argparse_parameters(parser, profanity_filter=True)
+    parser = add_connection_argparse_parameters(parser)
+    return parser.parse_args()
+
+
+def collect_files(inputs):
+    files = []
+    for item in inputs:
+        if item.is_dir():
+            files.extend(sorted(item.rglob("*.wav")))
+        elif item.suffix == ".jsonl":
+            with open(item) as f:
+                files.extend(Path(json.loads(line)["audio_filepath"]) for line in f if line.strip())
+        elif item.suffix == ".txt":
+            with open(item) as f:
+                files.extend(Path(line.strip()) for line in f if line.strip())
+        else:
+            files.append(item)
+    return files
+
+
+def map_wav(path: Path):
+    """
+    Memory-map a PCM WAV file.
+
+    Returns:
+        Tuple of (mmap, memoryview of the sample data, sample rate, channel count)
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if mm[:4] != b"RIFF" or mm[8:12] != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+        offset, fmt = 12, None
+        while offset + 8 <= len(mm):
+            chunk_id, size = struct.unpack_from("<4sI", mm, offset)
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack_from("<HHIIHH", mm, body)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data chunk before fmt chunk")
+                audio_format, channels, rate, _, _, bits = fmt
+                if audio_format != 1 or bits != 16:
+                    raise ValueError("only 16-bit PCM WAV is supported")
+                return mm, memoryview(mm)[body:min(body + size, len(mm))], rate, channels
+            offset = body + size + (size & 1)
+        raise ValueError("no data chunk")
+    except Exception:
+        mm.close()
+        raise
+
+
+class ChannelAuth(riva.client.Auth):
+    """riva.client.Auth around an existing channel, without the connection its constructor opens"""
+
+    def __init__(self, channel: grpc.Channel, args: argparse.Namespace):
+        self.ssl_cert = None if args.ssl_cert is None else Path(args.ssl_cert).expanduser()
+        self.uri = args.server
+        self.use_ssl = args.use_ssl
+        self.metadata = [tuple(meta) for meta in args.metadata or []]
+        self.channel = channel
+
+
+class Transcriber:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        # One channel for every RPC, sized for whole-file Recognize requests
+        options = [
+            ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+            ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+            ("grpc.keepalive_time_ms", 20000),
+        ]
+        if args.ssl_cert is not None or args.use_ssl:
+            certificates = Path(args.ssl_cert).expanduser().read_bytes() if args.ssl_cert else None
+            channel = grpc.secure_channel(args.server, grpc.ssl_channel_credentials(certificates), options=options)
+        else:
+            channel = grpc.insecure_channel(args.server, options=options)
+        self.service = riva.client.ASRService(ChannelAuth(channel, args))
+
+    def recognition_config(self, sample_rate_hz: int, channels: int) -> riva.client.RecognitionConfig:
+        config = riva.client.RecognitionConfig(
+            encoding=riva.client.AudioEncoding.LINEAR_PCM,
+            language_code=self.args.language_code,
+            model=self.args.model_name,
+            max_alternatives=1,
+            profanity_filter=self.args.profanity_filter,
+            enable_automatic_punctuation=self.args.automatic_punctuation,
+            verbatim_transcripts=not self.args.no_verbatim_transcripts,
+            sample_rate_hertz=sample_rate_hz,
+            audio_channel_count=channels,
+        )
+        riva.client.add_word_boosting_to_config(config, self.args.boosted_lm_words, self.args.boosted_lm_score)
+        riva.client.add_custom_configuration_to_config(config, self.args.custom_configuration)
+        return config
+
+    def _offline(self, audio: memoryview, config) -> str:
+        request = riva.client.proto.riva_asr_pb2.RecognizeRequest(config=config, audio=audio.tobytes())
+        response = self.service.stub.Recognize(
+            request, metadata=self.service.auth.get_auth_metadata(), timeout=self.args.timeout
+        )
+        return " ".join(
+            result.alternatives[0].transcript.strip() for result in response.results if result.alternatives
+        )
+
+    def _streaming(self, audio: memoryview, config, frame_bytes: int) -> str:
+        step = self.args.file_streaming_chunk * frame_bytes
+        requests = (
+            riva.client.proto.riva_asr_pb2.StreamingRecognizeRequest(audio_content=audio[i:i + step].tobytes())
+            for i in range(0, len(audio), step)
+        )
+
+        def with_config():
+            yield riva.client.proto.riva_asr_pb2.StreamingRecognizeRequest(
+                streaming_config=riva.client.StreamingRecognitionConfig(config=config, interim_results=False)
+            )
+            yield from requests
+
+        responses = self.service.stub.StreamingRecognize(
+            with_config(), metadata=self.service.auth.get_auth_metadata(), timeout=self.args.timeout
+        )
+        finals = []
+        for response in responses:
+            for result in response.results:
+                if result.is_final and result.alternatives:
+                    finals.append(result.alternatives[0].transcript.strip())
+        return " ".join(finals)
+
+    def transcribe(self, path: Path) -> dict:
+        """Transcribe one file with retries; never raises"""
+        record = {"audio_filepath": str(path)}
+        start = time.perf_counter()
+        try:
+            mm, audio, rate, channels = map_wav(path)
+        except (OSError, ValueError) as e:
+            record["error"] = str(e)
+            return record
+        try:
+            record["duration_s"] = round(len(audio) / (2 * channels * rate), 3)
+            config = self.recognition_config(rate, channels)
+            for attempt in range(1, self.args.retries + 2):
+                rpc_start = time.perf_counter()
+                try:
+                    if self.args.mode == "offline":
+                        record["transcript"] = self._offline(audio, config)
+                    else:
+                        record["transcript"] = self._streaming(audio, config, 2 * channels)
+                    record["rpc_s"] = round(time.perf_counter() - rpc_start, 3)
+                    break
+                except grpc.RpcError as e:
+                    if e.code() not in RETRYABLE or attempt > self.args.retries:
+                        record["error"] = f"{e.code().name}: {e.details()}"
+                        break
+                    time.sleep(min(30.0, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            record["attempts"] = attempt
+        finally:
+            audio.release()
+            mm.close()
+        record["total_s"] = round(time.perf_counter() - start, 3)
+        return record
+
+
+def completed_files(output: Path):
+    done = set()
+    if output.exists():
+        with open(output) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if "transcript" in record:
+                    done.add(record["audio_filepath"])
+    return done
+
+
+def main() -> None:
+    args = parse_args()
+    files = collect_files(args.inputs)
+    if args.resume:
+        done = completed_files(args.output)
+        files = [path for path in files if str(path) not in done]
+    if not files:
+        print("Nothing to transcribe")
+        return
+
+    transcriber = Transcriber(args)
+    audio_s, failures, rpc_times = 0.0, 0, []
+    print(f"Transcribing {len(files)} files with up to {args.max_in_flight} requests in flight...")
+    start = time.perf_counter()
+    with open(args.output, "a") as out_f, ThreadPoolExecutor(max_workers=args.max_in_flight) as executor:
+        futures = [executor.submit(transcriber.transcribe, path) for path in files]
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            # Written as each file finishes, so an interrupted run keeps its results
+            out_f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out_f.flush()
+            if "error" in record:
+                failures += 1
+                print(f"[{done}/{len(files)}] {record['audio_filepath']}: {record['error']}")
+            else:
+                audio_s += record["duration_s"]
+                rpc_times.append(record["rpc_s"])
+    wall = time.perf_counter() - start
+
+    rpc_times.sort()
+    print(f"Transcribed {len(files) - failures}/{len(files)} files, {audio_s / 3600:.2f} h of audio in {wall:.1f}s "
+          f"({audio_s / wall:.1f}x real time)")
+    if rpc_times:
+        p50 = rpc_times[len(rpc_times) // 2]
+        p95 = rpc_times[min(len(rpc_times) - 1, int(len(rpc_times) * 0.95))]
+        print(f"RPC latency p50={p50:.3f}s p95={p95:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import argparse
+from pathlib import Path
+from typing import NamedTuple
+
+from riva.client.argparse_utils import (
+    add_asr_config_argparse_parameters,
+    add_connection_argparse_parameters,
+)
+
+from audio_codec import ENCODINGS
+from shared_logging import LOG_FORMATS
+
+MODEL_NAME = "claude-3-5-sonnet-20241022"
+MAX_TOKENS = 1024
+SYSTEM_PROMPT = "You are a seasoned and a smart voice assistant. Do not perform any action without be specifically requested for"
+ERROR_RESPONSE = "I'm sorry, I encountered an error processing your request."
+MAX_TRANSCRIPT_CHARS = 100
+
+SHUTDOWN_COMMANDS = {
+    "shut down", "shutdown", "exit", "close", "switch off"
+}
+
+
+def limit_transcript(transcript: str) -> str:
+    """Limit the transcript to MAX_TRANSCRIPT_CHARS characters if it's longer"""
+    return transcript[:MAX_TRANSCRIPT_CHARS]
+
+
+class AudioRates(NamedTuple):
+    capture: int
+    asr: int
+    tts: int
+    playback: int
+
+
+def audio_rates(args) -> AudioRates:
+    """Sample rate of each audio stage; unset stages follow --sample-rate-hz"""
+    tts = getattr(args, "tts_rate_hz", None) or args.sample_rate_hz
+    return AudioRates(
+        capture=getattr(args, "capture_rate_hz", None) or args.sample_rate_hz,
+        asr=getattr(args, "asr_rate_hz", None) or args.sample_rate_hz,
+        tts=tts,
+        playback=getattr(args, "playback_rate_hz", None) or tts,
+    )
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line parser shared by every Perceptra runtime.
+
+    Returns:
+        argparse.ArgumentParser: Parser with ASR, TTS and connection options
+    """
+    parser = argparse.ArgumentParser(
+        description="End-to-end speech agent with ASR and TTS",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    # Add ASR, TTS, and connection parameters
+    parser = add_asr_config_argparse_parameters(parser)
+    parser = add_connection_argparse_parameters(parser)
+
+    # ASR parameters
+    parser.add_argument("--asr-server", default="localhost:50051", help="ASR server endpoint, or a comma-separated list to balance over")
+    parser.add_argument("--tts-server", default="localhost:50052", help="TTS server endpoint, or a comma-separated list to balance over")
+    parser.add_argument("--keepalive-time-ms", type=int, default=20000, help="gRPC keepalive ping interval")
+    parser.add_argument("--startup-timeout", type=float, default=120, help="Seconds to wait for ASR/TTS to report SERVING")
+    parser.add_argument("--skip-warmup", action="store_true", help="Skip the warm-up requests at startup")
+    parser.add_argument("--profile-startup", action="store_true", help="Log an import-time and init-time breakdown before listening")
+    parser.add_argument("--input-device", type=int, help="Input audio device")
+    parser.add_argument("--sample-rate-hz", type=int, default=16000, help="Audio sample rate")
+    parser.add_argument("--capture-rate-hz", type=int, help="Microphone sample rate (default: --sample-rate-hz)")
+    parser.add_argument("--asr-rate-hz", type=int, help="Sample rate sent to ASR; mic audio is resampled (default: --sample-rate-hz)")
+    parser.add_argument("--file-streaming-chunk", type=int, default=1600, help="Audio chunk size")
+    parser.add_argument(
+        "--asr-encoding",
+        choices=list(ENCODINGS),
+        default="pcm",
+        help="Encoding of mic audio sent to ASR (mulaw/alaw halve the bytes; flac/opus need soundfile and buffer frames)",
+    )
+    parser.add_argument("--vad", action="store_true", help="Only stream mic audio to ASR while speech is detected")
+    parser.add_argument("--vad-threshold-db", type=float, default=-45.0, help="Minimum speech level in dBFS (raised with the noise floor)")
+    parser.add_argument("--vad-hangover-ms", type=int, default=600, help="Silence after speech before an utterance is closed")
+    parser.add_argument("--vad-preroll-ms", type=int, default=300, help="Audio sent from before the detected speech onset")
+    parser.add_argument("--async-runtime", action="store_true", help="Run the asyncio runtime (grpc.aio + AsyncAnthropic)")
+    parser.add_argument("--continuous", action="store_true", help="Keep one mic stream open and delimit turns by ASR endpointing")
+    parser.add_argument("--barge-in", action="store_true", help="Keep listening while speaking and stop when the user interrupts")
+    parser.add_argument("--barge-in-min-words", type=int, default=2, help="Words of user speech needed to interrupt playback (local commands interrupt at any length)")
+
+    # TTS parameters
+    parser.add_argument("--voice", help="Voice name for TTS")
+    parser.add_argument("--list-devices", action="store_true", help="List output audio devices")
+    parser.add_argument("--output-device", type=int, help="Output audio device")
+    parser.add_argument("--tts-rate-hz", type=int, help="Sample rate requested from TTS (default: --sample-rate-hz)")
+    parser.add_argument("--playback-rate-hz", type=int, help="Output sample rate; TTS audio is resampled (default: --tts-rate-hz)")
+    parser.add_argument("--playback-channels", type=int, default=1, help="Output channels; mono TTS audio is copied to each")
+    parser.add_argument("--playback-format", choices=["s16", "f32"], default="s16", help="Output sample format")
+    parser.add_argument(
+        "--no-play-audio",
+        dest="play_audio",
+        action="store_false",
+        help="Synthesize without opening an output device (benchmarks, headless runs)",
+    )
+    parser.add_argument("--stream", action="store_true", help="Enable streaming synthesis")
+    parser.add_argument("--audio-prompt-file", type=Path, help="Zero-shot audio prompt file")
+    parser.add_argument("--quality", type=int, help="Decoder runs for audio quality")
+    parser.add_argument(
+        "--tts-encoding",
+        choices=list(ENCODINGS),
+        default="pcm",
+        help="Encoding of synthesized audio sent by TTS, decoded before playback (flac/opus are decoded per chunk of text)",
+    )
+    parser.add_argument("--tts-slo-ms", type=float, default=0, help="Time-to-first-audio target; picks streaming/batch and quality per sentence (0 disables)")
+    parser.add_argument(
+        "--tts-quality-levels",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[20, 10, 5],
+        help="Comma-separated zero-shot quality values the controller may choose from",
+    )
+    parser.add_argument("--tts-hedge-ms", type=float, default=0, help="Also send a batch synthesis request to a second --tts-server after this long (0 disables)")
+    parser.add_argument("--custom-dictionary", type=str, help="User dictionary file path")
+    parser.add_argument("--tts-cache-memory-mb", type=int, default=32, help="In-memory TTS audio cache size (0 disables)")
+    parser.add_argument("--tts-cache-dir", type=Path, help="Directory for the on-disk TTS audio cache")
+    parser.add_argument("--tts-cache-disk-mb", type=int, default=512, help="On-disk TTS audio cache size")
+    parser.add_argument("--playback-buffer-ms", type=int, default=2000, help="Playback jitter buffer size")
+    parser.add_argument("--tts-queue-size", type=int, default=8, help="Max sentences buffered between LLM and TTS")
+    parser.add_argument("--chunk-min-chars", type=int, default=24, help="Min characters per synthesized chunk")
+    parser.add_argument("--chunk-max-chars", type=int, default=240, help="Max characters per synthesized chunk")
+
+    # LLM parameters
+    parser.add_argument("--history-tokens", type=int, default=4000, help="Conversation history kept across turns, in tokens (0 sends only the current turn)")
+    parser.add_argument(
+        "--no-prompt-cache",
+        dest="prompt_cache",
+        action="store_false",
+        help="Do not mark the system prompt and history with Anthropic cache_control",
+    )
+
+    parser.add_argument("--speculate", action="store_true", help="Start the LLM request from a stable interim transcript (continuous modes)")
+    parser.add_argument("--speculation-window-ms", type=int, default=300, help="How long an interim transcript must stay unchanged before speculating")
+    parser.add_argument("--llm-cache-size", type=int, default=0, help="Replies cached by normalized transcript (0 disables)")
+    parser.add_argument("--llm-cache-ttl", type=float, default=86400, help="Seconds a cached reply stays valid")
+    parser.add_argument("--llm-cache-file", type=Path, help="JSON-lines file that keeps cached replies across restarts")
+    parser.add_argument("--llm-cache-allow", action="append", help="Regex; if given, only matching transcripts are cached (repeatable)")
+    parser.add_argument("--llm-cache-deny", action="append", help="Regex for transcripts that always go to the LLM (repeatable)")
+
+    # Local commands
+    parser.add_argument("--local-commands", action="store_true", help="Answer repeat/stop/volume/time/date locally instead of sending them to the LLM (local agent only)")
+    parser.add_argument("--command-file", type=Path, help="JSON-lines file of commands answered locally: phrases and a reply text and/or WAV file (local agent only)")
+    parser.add_argument("--command-max-edits", type=int, choices=[0, 1], default=0, help="Character edits a transcript may be away from a command phrase (0 matches exactly); 1 indexes every phrase once per character")
+    parser.add_argument("--prerender-commands", action="store_true", help="Synthesize the fixed --command-file replies at startup")
+
+    # Translation
+    parser.add_argument("--translate", action="store_true", help="Speech-to-speech translation over one Riva StreamingTranslateSpeechToSpeech stream instead of the ASR -> LLM -> TTS chain")
+    parser.add_argument("--source-language", help="Language spoken into the microphone (default: --language-code)")
+    parser.add_argument("--target-language", help="Language the translated speech is synthesized in, e.g. de-DE (required with --translate)")
+    parser.add_argument("--nmt-server", help="Riva NMT endpoint, or a comma-separated list to balance over (default: --asr-server)")
+    parser.add_argument("--translation-model", help="NMT model name (default: the server's model for the language pair)")
+    parser.add_argument("--dnt-phrase", action="append", help="Word or phrase that is not translated, e.g. a product name (repeatable)")
+
+    # Metrics
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this port (0 disables)")
+    parser.add_argument("--metrics-json", type=str, help="Write latency histograms as JSON on shutdown")
+
+    # Logging
+    parser.add_argument("--log-format", choices=list(LOG_FORMATS), default="auto", help="Log output; auto is colored on a terminal and plain text otherwise, json emits one event per line with session and turn IDs")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO", help="Minimum level logged")
+
+    # Session traces
+    parser.add_argument("--record-trace", type=Path, help="Record mic audio, ASR responses, LLM text and TTS audio of the session to this file")
+    parser.add_argument("--replay-trace", type=Path, help="Take mic audio from a recorded trace (see bench/replay_trace.py)")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Speed-up of --replay-trace relative to the recording")
+
+    # Server mode
+    parser.add_argument("--serve", action="store_true", help="Serve remote voice sessions over gRPC instead of local devices")
+    parser.add_argument("--listen", default="0.0.0.0:50070", help="Address for the session server")
+    parser.add_argument("--max-sessions", type=int, default=64, help="Concurrent sessions admitted by the server")
+    parser.add_argument("--max-active-turns", type=int, default=16, help="Turns answered concurrently across all sessions")
+    parser.add_argument("--admission-timeout", type=float, default=2.0, help="Seconds a new session may wait for a free slot")
+    parser.add_argument("--session-queue-size", type=int, default=64, help="Messages buffered per session and direction")
+
+    return parser
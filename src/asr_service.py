@@ -1,106 +1,390 @@
+import itertools
+import threading
 import time
 import riva.client
-import riva.client.audio_io
+from agent_config import audio_rates
+from audio_codec import encode_chunks, proto_encoding
+from channels import ChannelManager, split_endpoints
+from endpoint_pool import build_endpoint_pool
+from metrics import ASR_FINALIZATION
+from resample import AudioConverter
+from session_trace import ASR_OPEN, ASR_RESPONSE, MIC_AUDIO, MIC_OPEN
 from shared_logging import setup_logger
+from vad import build_vad
 
 logger = setup_logger()
 
+
+class _MicFeed:
+    """
+    Shares one microphone stream across successive StreamingRecognize RPCs.
+
+    Each RPC gets its own request iterator from ``chunks()``. When a new RPC
+    starts, the previous iterator stops at its next read and hands the chunk
+    it was holding to the new one, so reconnecting loses no audio and keeps
+    chunks in order.
+    """
+
+    def __init__(self, audio_stream, stop_event=None):
+        self.audio_stream = audio_stream
+        self.stop_event = stop_event
+        self._lock = threading.Lock()
+        self._carry = []
+        self._generation = 0
+
+    def chunks(self):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        return self._iterate(generation)
+
+    def _iterate(self, generation):
+        while self.stop_event is None or not self.stop_event.is_set():
+            with self._lock:
+                if generation != self._generation:
+                    return
+                if self._carry:
+                    chunk = self._carry.pop(0)
+                else:
+                    chunk = next(self.audio_stream, None)
+                    if chunk is None:
+                        return
+                    if generation != self._generation:
+                        self._carry.append(chunk)
+                        return
+            yield chunk
+
+
+def _until(chunks, deadline):
+    """Stop a chunk iterator at a time.time() deadline"""
+    for chunk in chunks:
+        if time.time() >= deadline:
+            return
+        yield chunk
+
+
+def open_microphone(args):
+    """PyAudio mic stream for --input-device; PyAudio is only imported on first use"""
+    import riva.client.audio_io
+
+    return riva.client.audio_io.MicrophoneStream(
+        audio_rates(args).capture,
+        args.file_streaming_chunk,
+        device=args.input_device,
+    )
+
+
+def probe_input_device(args):
+    """
+    Look up the input device at startup so PortAudio initialization and a
+    missing or mismatched microphone show up before the first turn.
+
+    Returns:
+        Optional[dict]: PyAudio device info, or None if no device was found
+    """
+    import riva.client.audio_io
+
+    try:
+        if args.input_device is not None:
+            info = riva.client.audio_io.get_audio_device_info(args.input_device)
+        else:
+            info = riva.client.audio_io.get_default_input_device_info()
+    except Exception as e:
+        logger.warning(f"Could not query the input device: {e}")
+        return None
+    if info is None:
+        logger.warning("No input device found")
+        return None
+    logger.info(f"Input device: {info.get('name')} ({info.get('defaultSampleRate')} Hz default)")
+    return info
+
+
+def build_streaming_config(args) -> riva.client.StreamingRecognitionConfig:
+    """Build the streaming recognition config shared by the sync and async runtimes"""
+    asr_config = riva.client.StreamingRecognitionConfig(
+        config=riva.client.RecognitionConfig(
+            encoding=proto_encoding(args.asr_encoding),
+            language_code=args.language_code,
+            model=args.model_name,
+            max_alternatives=1,
+            enable_automatic_punctuation=args.automatic_punctuation,
+            verbatim_transcripts=not args.no_verbatim_transcripts,
+            sample_rate_hertz=audio_rates(args).asr,
+            audio_channel_count=1,
+        ),
+        interim_results=True,
+    )
+    riva.client.add_word_boosting_to_config(
+        asr_config, args.boosted_lm_words, args.boosted_lm_score
+    )
+    riva.client.add_endpoint_parameters_to_config(
+        asr_config,
+        args.start_history,
+        args.start_threshold,
+        args.stop_history,
+        args.stop_history_eou,
+        args.stop_threshold,
+        args.stop_threshold_eou,
+    )
+    riva.client.add_custom_configuration_to_config(
+        asr_config, args.custom_configuration
+    )
+    return asr_config
+
+
 class ASRService:
-    def __init__(self, args):
+    def __init__(self, args, channels=None, recorder=None, replay=None):
         self.args = args
-        self.asr_auth = riva.client.Auth(
-            args.ssl_cert, args.use_ssl, args.asr_server, args.metadata
-        )
-        self.asr_service = riva.client.ASRService(self.asr_auth)
+        self._owns_channels = channels is None
+        self.channels = channels or ChannelManager(args)
+        # --record-trace writer and --replay-trace mic source, if any
+        self.recorder = recorder
+        self.replay = replay
+        # Every --asr-server endpoint; each stream goes to the least loaded one
+        self.pool = build_endpoint_pool("ASR", split_endpoints(args.asr_server), self.channels, riva.client.ASRService)
+        self.asr_auth = self.pool.primary.auth
+        self.asr_service = self.pool.primary.service
         self.configure_asr()
+        # Client-side VAD, shared by every stream of the session (--vad)
+        self.vad = build_vad(args)
+        # perf_counter() of the last speech hypothesis of the latest transcript
+        self.speech_end = None
+        self._last_hypothesis = None
+
+    def _on_hypothesis(self, is_final: bool):
+        """Track when the user stopped talking and record ASR finalization latency"""
+        now = time.perf_counter()
+        if not is_final:
+            self._last_hypothesis = now
+            return
+        self.speech_end = self._last_hypothesis or now
+        self._last_hypothesis = None
+        ASR_FINALIZATION.observe(now - self.speech_end)
+
+    def warm_up(self):
+        """Load the model config and run a short silent stream on every backend so the first turn is not the slowest"""
+        self.pool.for_each(self._warm_up_backend)
+
+    def _warm_up_backend(self, backend):
+        if backend.serving is False:
+            return
+        start = time.time()
+        try:
+            backend.service.stub.GetRivaSpeechRecognitionConfig(
+                riva.client.proto.riva_asr_pb2.RivaSpeechRecognitionConfigRequest(),
+                metadata=backend.auth.get_auth_metadata(),
+            )
+            silence = bytes(2 * self.args.file_streaming_chunk)
+            for _ in backend.service.streaming_response_generator(
+                audio_chunks=self._encoded([silence]), streaming_config=self.asr_config
+            ):
+                pass
+        except Exception as e:
+            logger.warning(f"ASR warm-up of {backend.uri} failed: {str(e)}")
+            return
+        logger.info(f"ASR warm-up of {backend.uri}: {(time.time() - start):.3f}s")
 
     def configure_asr(self):
-        self.asr_config = riva.client.StreamingRecognitionConfig(
-            config=riva.client.RecognitionConfig(
-                encoding=riva.client.AudioEncoding.LINEAR_PCM,
-                language_code=self.args.language_code,
-                model=self.args.model_name,
-                max_alternatives=1,
-                enable_automatic_punctuation=self.args.automatic_punctuation,
-                verbatim_transcripts=not self.args.no_verbatim_transcripts,
-                sample_rate_hertz=self.args.sample_rate_hz,
-                audio_channel_count=1,
-            ),
-            interim_results=True,
-        )
-        riva.client.add_word_boosting_to_config(
-            self.asr_config, self.args.boosted_lm_words, self.args.boosted_lm_score
-        )
-        riva.client.add_endpoint_parameters_to_config(
-            self.asr_config,
-            self.args.start_history,
-            self.args.start_threshold,
-            self.args.stop_history,
-            self.args.stop_history_eou,
-            self.args.stop_threshold,
-            self.args.stop_threshold_eou,
-        )
-        riva.client.add_custom_configuration_to_config(
-            self.asr_config, self.args.custom_configuration
+        self.asr_config = build_streaming_config(self.args)
+
+    def _encoded(self, audio_chunks):
+        """Resample mic PCM to --asr-rate-hz and encode it with --asr-encoding; one converter and encoder per RPC"""
+        rates = audio_rates(self.args)
+        if rates.capture != rates.asr:
+            audio_chunks = AudioConverter(rates.capture, rates.asr).stream(audio_chunks)
+        return encode_chunks(audio_chunks, self.args.asr_encoding, rates.asr)
+
+    def _open_microphone(self):
+        """The mic stream, or the next recorded one when replaying a trace"""
+        if self.recorder is not None:
+            self.recorder.write(MIC_OPEN)
+        if self.replay is not None:
+            return self.replay.microphone()
+        return open_microphone(self.args)
+
+    def _recorded(self, audio_chunks):
+        """Record mic chunks to the trace as they are read"""
+        if self.recorder is None:
+            return audio_chunks
+        return self._record_chunks(audio_chunks)
+
+    def _record_chunks(self, audio_chunks):
+        for chunk in audio_chunks:
+            self.recorder.write(MIC_AUDIO, chunk)
+            yield chunk
+
+    def _recognize(self, backend, audio_chunks):
+        """
+        Open a StreamingRecognize RPC on a backend; its responses are recorded
+        with --record-trace, and the time from the first audio sent to the
+        first response is the backend's latency sample.
+        """
+        sent = []
+        responses = backend.service.streaming_response_generator(
+            audio_chunks=self._encoded(self._stamp_first(audio_chunks, sent)), streaming_config=self.asr_config
         )
+        if self.recorder is not None:
+            self.recorder.write(ASR_OPEN)
+            responses = self._record_responses(responses)
+        return self._observe_first(backend, responses, sent)
+
+    @staticmethod
+    def _stamp_first(audio_chunks, sent):
+        for chunk in audio_chunks:
+            if not sent:
+                sent.append(time.perf_counter())
+            yield chunk
+
+    def _observe_first(self, backend, responses, sent):
+        first = True
+        for response in responses:
+            if first and sent:
+                first = False
+                self.pool.observe(backend, time.perf_counter() - sent[0])
+            yield response
+
+    def _record_responses(self, responses):
+        for response in responses:
+            self.recorder.write(ASR_RESPONSE, response.SerializeToString())
+            yield response
+
+    def close(self):
+        """Report how much audio the VAD kept off the wire and the load per backend"""
+        if self.vad is not None:
+            self.vad.log_stats()
+        self.pool.log_stats()
+        self.pool.close()
+        if self._owns_channels:
+            self.channels.close()
 
     def get_transcription(self, audio_chunks) -> str:
         """Process audio chunks and return final transcription"""
         final_transcript = ""
 
         try:
-            responses = self.asr_service.streaming_response_generator(
-                audio_chunks=audio_chunks, streaming_config=self.asr_config
-            )
+            if self.vad is not None:
+                audio_chunks = self.vad.utterance(audio_chunks)
+            with self.pool.lease() as backend:
+                responses = self._recognize(backend, audio_chunks)
 
-            for response in responses:
-                if not response.results:  # Skip empty results
-                    continue
+                for response in responses:
+                    if not response.results:  # Skip empty results
+                        continue
 
-                for result in response.results:
-                    if result.is_final and result.alternatives:
-                        final_transcript = result.alternatives[0].transcript
-                        return final_transcript
+                    for result in response.results:
+                        if result.alternatives:
+                            self._on_hypothesis(result.is_final)
+                        if result.is_final and result.alternatives:
+                            final_transcript = result.alternatives[0].transcript
+                            return final_transcript
 
         except Exception as e:
             logger.error(f"Error during transcription: {str(e)}")
 
         return final_transcript
 
+    def listen(self, stop_event=None):
+        """
+        Continuously capture the microphone and yield one transcript per utterance.
+
+        A single MicrophoneStream stays open for the whole session and feeds a
+        long-lived StreamingRecognize RPC. Turns are delimited by the server's
+        ``is_final`` end-of-utterance results, driven by the endpointing
+        parameters set in ``configure_asr``. The mic keeps buffering while the
+        caller handles a turn, so no audio is dropped between utterances.
+
+        Args:
+            stop_event (Optional[threading.Event]): Ends the session when set
+
+        Yields:
+            str: Final transcript of each utterance
+        """
+        for transcript, is_final in self.listen_events(stop_event):
+            if is_final:
+                yield transcript
+
+    def listen_events(self, stop_event=None):
+        """
+        Like ``listen``, but also yield interim hypotheses as they arrive.
+
+        Args:
+            stop_event (Optional[threading.Event]): Ends the session when set
+
+        Yields:
+            Tuple[str, bool]: Non-empty transcript and whether it is final
+        """
+        with self._open_microphone() as audio_stream:
+            feed = _MicFeed(self._recorded(audio_stream), stop_event)
+
+            # The RPC may end on server-side stream limits or transient errors;
+            # reopen it on the same mic stream so buffered audio carries over.
+            # With --vad each RPC carries one utterance and is only opened
+            # once speech starts.
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    chunks = feed.chunks()
+                    if self.vad is not None:
+                        chunks = self.vad.utterance(chunks)
+                        first = next(chunks, None)
+                        if first is None:
+                            return
+                        chunks = itertools.chain([first], chunks)
+                    with self.pool.lease() as backend:
+                        responses = self._recognize(backend, chunks)
+                        for response in responses:
+                            for result in response.results:
+                                if not result.alternatives:
+                                    continue
+                                transcript = result.alternatives[0].transcript.strip()
+                                if transcript:
+                                    self._on_hypothesis(result.is_final)
+                                    yield transcript, result.is_final
+                    if audio_stream.closed:
+                        return
+                except Exception as e:
+                    if stop_event is not None and stop_event.is_set():
+                        return
+                    logger.error(f"ASR session error, reconnecting: {str(e)}")
+                    time.sleep(0.5)
+
     def record_and_transcribe(self, duration=5):
         """Record audio for specified duration and return transcription"""
         transcript = ""
         
         try:
-            with riva.client.audio_io.MicrophoneStream(
-                self.args.sample_rate_hz, 
-                self.args.file_streaming_chunk, 
-                device=self.args.input_device
-            ) as audio_stream:
-                responses = self.asr_service.streaming_response_generator(
-                    audio_chunks=audio_stream,
-                    streaming_config=self.asr_config,
-                )
-
+            with self._open_microphone() as audio_stream:
                 start_time = time.time()
-                remaining_time = duration
+                audio_chunks = self._recorded(audio_stream)
+                if self.vad is not None:
+                    # Silence sends nothing, so the request stream has to end
+                    # the window itself
+                    audio_chunks = self.vad.filter(_until(audio_chunks, start_time + duration))
+                with self.pool.lease() as backend:
+                    responses = self._recognize(backend, audio_chunks)
+
+                    remaining_time = duration
                 
-                for response in responses:
-                    current_time = time.time()
-                    elapsed_time = current_time - start_time
-                    new_remaining_time = duration - int(elapsed_time)
+                    for response in responses:
+                        current_time = time.time()
+                        elapsed_time = current_time - start_time
+                        new_remaining_time = duration - int(elapsed_time)
                     
-                    if new_remaining_time != remaining_time:
-                        remaining_time = new_remaining_time
-                        logger.warning(f"Time remaining: {remaining_time}s")
+                        if new_remaining_time != remaining_time:
+                            remaining_time = new_remaining_time
+                            logger.warning(f"Time remaining: {remaining_time}s")
                     
-                    if elapsed_time >= duration:
-                        break
+                        if elapsed_time >= duration:
+                            break
+
+                        if response.results:
+                            for result in response.results:
+                                if result.alternatives:
+                                    transcript = result.alternatives[0].transcript
+                                    self._on_hypothesis(False)
 
-                    if response.results:
-                        for result in response.results:
-                            if result.alternatives:
-                                transcript = result.alternatives[0].transcript
+                # The transcript is only handed over once the window closes
+                if transcript:
+                    self._on_hypothesis(True)
 
         except KeyboardInterrupt:
             logger.info("Recording stopped by user")
@@ -0,0 +1,761 @@
+import argparse
+import asyncio
+import itertools
+import os
+import threading
+import time
+import uuid
+import wave
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import anthropic
+import grpc
+import riva.client
+from riva.client.proto import riva_asr_pb2, riva_asr_pb2_grpc, riva_tts_pb2, riva_tts_pb2_grpc
+
+from agent_config import ERROR_RESPONSE, SHUTDOWN_COMMANDS, audio_rates
+from asr_service import build_streaming_config, open_microphone
+from audio_codec import Decoder, Encoder, proto_encoding
+from channels import SERVING, channel_credentials, channel_options, health_protos, split_endpoints
+from conversation import build_conversation, messages_api
+from metrics import (
+    ASR_FINALIZATION,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_TOTAL,
+    TTS_TIME_TO_FIRST_AUDIO,
+    TURN_LATENCY,
+    start_exporters,
+    stop_exporters,
+)
+from playback import PlaybackEngine
+from resample import AudioConverter
+from response_cache import ResponseCache, build_response_cache, normalize_transcript
+from shared_logging import log_context, setup_logger
+from speculation import LLMRequest, SpeculationStats
+from text_chunker import SentenceChunker
+from tts_cache import TTSCache
+from tts_controller import TTSController, build_tts_controller
+from tts_service import build_tts_cache, load_custom_dictionary
+from vad import build_vad
+
+logger = setup_logger()
+
+# The riva.client.proto modules are generated from the same definitions that
+# are checked in under proto/ (riva_asr.proto, riva_tts.proto, ...).
+
+
+def open_aio_channel(args, uri: str) -> grpc.aio.Channel:
+    """
+    Open a grpc.aio channel with the same TLS rules and options as ChannelManager.
+
+    Args:
+        args: Parsed connection arguments (ssl_cert, use_ssl, keepalive)
+        uri (str): Server endpoint; of a comma-separated list only the first is used
+
+    Returns:
+        grpc.aio.Channel: Channel bound to the running event loop
+    """
+    uris = split_endpoints(uri)
+    if len(uris) > 1:
+        logger.warning(f"The asyncio runtime does not balance over endpoints, using {uris[0]} of {uri}")
+    uri = uris[0]
+    credentials = channel_credentials(args)
+    options = channel_options(args)
+    if credentials is None:
+        return grpc.aio.insecure_channel(uri, options=options)
+    return grpc.aio.secure_channel(uri, credentials, options=options)
+
+
+async def check_health(channel: grpc.aio.Channel, metadata, timeout: float) -> bool:
+    """Async grpc.health.v1.Health/Check; True once the endpoint reports SERVING"""
+    messages, services = health_protos()
+    stub = services.HealthStub(channel)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        try:
+            response = await stub.Check(
+                messages.HealthCheckRequest(),
+                timeout=deadline - loop.time(),
+                wait_for_ready=True,
+                metadata=metadata,
+            )
+            if response.status == SERVING:
+                return True
+        except grpc.aio.AioRpcError as e:
+            if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                return False
+        await asyncio.sleep(min(1.0, max(0.0, deadline - loop.time())))
+    return False
+
+
+def call_metadata(args):
+    """Convert --metadata key/value pairs into gRPC call metadata"""
+    return tuple((key, value) for key, value in (args.metadata or []))
+
+
+class AsyncASRService:
+    """Streaming speech recognition over a grpc.aio channel"""
+
+    def __init__(self, args, channel: Optional[grpc.aio.Channel] = None):
+        """
+        Args:
+            args: Parsed agent arguments
+            channel (grpc.aio.Channel): Shared channel to use instead of opening one
+        """
+        self.args = args
+        self._owns_channel = channel is None
+        self.channel = channel or open_aio_channel(args, args.asr_server)
+        self.stub = riva_asr_pb2_grpc.RivaSpeechRecognitionStub(self.channel)
+        self.metadata = call_metadata(args)
+        self.asr_config = build_streaming_config(args)
+
+    async def results(self, audio_chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, bool]]:
+        """
+        Run one StreamingRecognize RPC and yield interim and final hypotheses.
+
+        Args:
+            audio_chunks (AsyncIterator[bytes]): Raw PCM chunks from the microphone
+
+        Yields:
+            Tuple[str, bool]: Non-empty transcript and whether it is final
+                (final results delimit utterances)
+        """
+        async def requests():
+            yield riva_asr_pb2.StreamingRecognizeRequest(streaming_config=self.asr_config)
+            rates = audio_rates(self.args)
+            converter = AudioConverter(rates.capture, rates.asr)
+            encoder = Encoder(self.args.asr_encoding, rates.asr)
+            async for chunk in audio_chunks:
+                data = encoder.encode(converter.convert(chunk))
+                if data:
+                    yield riva_asr_pb2.StreamingRecognizeRequest(audio_content=data)
+            tail = encoder.encode(converter.flush()) + encoder.flush()
+            if tail:
+                yield riva_asr_pb2.StreamingRecognizeRequest(audio_content=tail)
+
+        call = self.stub.StreamingRecognize(requests(), metadata=self.metadata)
+        try:
+            async for response in call:
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    transcript = result.alternatives[0].transcript.strip()
+                    if transcript:
+                        yield transcript, result.is_final
+        finally:
+            call.cancel()
+
+    async def warm_up(self):
+        """Wait for SERVING and fetch the model config"""
+        if not await check_health(self.channel, self.metadata, self.args.startup_timeout):
+            raise RuntimeError(f"{self.args.asr_server} did not report SERVING")
+        if not self.args.skip_warmup:
+            await self.stub.GetRivaSpeechRecognitionConfig(
+                riva_asr_pb2.RivaSpeechRecognitionConfigRequest(), metadata=self.metadata
+            )
+
+    async def close(self):
+        if self._owns_channel:
+            await self.channel.close()
+
+
+class AsyncTTSService:
+    """Speech synthesis over a grpc.aio channel, played through the shared playback engine"""
+
+    def __init__(
+        self,
+        args,
+        channel: Optional[grpc.aio.Channel] = None,
+        cache: Optional[TTSCache] = None,
+        sink: Optional[Callable[[bytes], Awaitable[None]]] = None,
+        controller: Optional[TTSController] = None,
+        custom_dictionary: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            args: Parsed agent arguments
+            channel (grpc.aio.Channel): Shared channel to use instead of opening one
+            cache (TTSCache): Shared synthesis cache; built from args if omitted
+            sink: Coroutine function receiving the audio instead of the local
+                playback engine (used by server sessions)
+            controller (TTSController): Shared latency controller; built from
+                args if omitted
+            custom_dictionary (Dict[str, str]): Parsed --custom-dictionary;
+                loaded from args if omitted
+        """
+        self.args = args
+        self._owns_channel = channel is None
+        self.channel = channel or open_aio_channel(args, args.tts_server)
+        self.stub = riva_tts_pb2_grpc.RivaSpeechSynthesisStub(self.channel)
+        self.metadata = call_metadata(args)
+        # Format of the synthesized audio; playback and the sink may differ (--playback-*)
+        self.rates = audio_rates(args)
+        self.nchannels = 1
+        self.sampwidth = 2
+        self.quality = 20 if self.args.quality is None else self.args.quality
+        if custom_dictionary is None:
+            custom_dictionary = load_custom_dictionary(self.args.custom_dictionary)
+        self.custom_dictionary = custom_dictionary
+        self.cache = cache if cache is not None else build_tts_cache(self.args)
+        self._owns_controller = controller is None
+        self.controller = controller if controller is not None else build_tts_controller(self.args, self.quality)
+        self.sink = sink
+        # perf_counter() of the first audio of the current turn written to
+        # the device, or handed to the sink
+        self.first_audio_at = None
+
+        self.playback = None
+        self.converter = AudioConverter(
+            self.rates.tts,
+            self.rates.playback,
+            self.nchannels,
+            self.args.playback_channels,
+            self.args.playback_format,
+        )
+        if sink is None and (self.args.output_device is not None or self.args.play_audio):
+            self.playback = PlaybackEngine(
+                self.args.output_device,
+                self.rates.playback,
+                nchannels=self.args.playback_channels,
+                sampwidth=self.converter.out_width,
+                buffer_ms=self.args.playback_buffer_ms,
+            )
+            self.playback.start()
+
+    def _synthesis_request(self, text: str, quality: Optional[int] = None) -> riva_tts_pb2.SynthesizeSpeechRequest:
+        """Build a request equivalent to riva.client.SpeechSynthesisService's"""
+        request = riva_tts_pb2.SynthesizeSpeechRequest(
+            text=text,
+            language_code=self.args.language_code,
+            sample_rate_hz=self.rates.tts,
+            encoding=proto_encoding(self.args.tts_encoding),
+        )
+        if self.args.voice is not None:
+            request.voice_name = self.args.voice
+        if self.args.audio_prompt_file is not None:
+            with wave.open(str(self.args.audio_prompt_file), "rb") as wf:
+                request.zero_shot_data.sample_rate_hz = wf.getframerate()
+            request.zero_shot_data.audio_prompt = self.args.audio_prompt_file.read_bytes()
+            request.zero_shot_data.encoding = riva.client.AudioEncoding.LINEAR_PCM
+            request.zero_shot_data.quality = self.quality if quality is None else quality
+        if self.custom_dictionary:
+            request.custom_dictionary = ",".join(
+                f"{key}  {value}" for key, value in self.custom_dictionary.items()
+            )
+        return request
+
+    async def speak(self, text: str, start: float, first: bool = True):
+        """
+        Synthesize one chunk of text and queue its audio for playback.
+
+        Args:
+            text (str): Text to synthesize
+            start (float): Turn start time, for time-to-first-audio logging
+            first (bool): Whether this is the first chunk of the turn
+        """
+        stream, quality, decision = self.args.stream, self.quality, None
+        if self.controller is not None:
+            decision = self.controller.choose(text)
+            stream, quality = decision.stream, decision.quality
+        key = None
+        if self.cache is not None and self.args.audio_prompt_file is None:
+            key = TTSCache.make_key(
+                text,
+                self.args.voice,
+                self.args.language_code,
+                self.rates.tts,
+                quality,
+                self.custom_dictionary,
+                self.args.tts_encoding,
+            )
+            # The disk tier reads files, which must not block other sessions
+            audio = await asyncio.to_thread(self.cache.get, key)
+            if audio is not None:
+                if first:
+                    logger.info(f"Time to first audio (cached): {(time.time() - start):.3f}s")
+                await self._play(audio)
+                return
+
+        request = self._synthesis_request(text, quality)
+        decoder = Decoder(self.args.tts_encoding)
+        collected = []
+        requested = time.perf_counter()
+        first_audio = None
+        if stream:
+            call = self.stub.SynthesizeOnline(request, metadata=self.metadata)
+            try:
+                async for resp in call:
+                    audio = decoder.decode(resp.audio)
+                    if not audio:
+                        continue
+                    if not collected:
+                        first_audio = time.perf_counter() - requested
+                        TTS_TIME_TO_FIRST_AUDIO.observe(first_audio)
+                    if first:
+                        logger.info(f"Time to first audio: {(time.time() - start):.3f}s")
+                        first = False
+                    await self._play(audio)
+                    collected.append(audio)
+            finally:
+                call.cancel()
+            audio = decoder.flush()
+            if audio:
+                if not collected:
+                    first_audio = time.perf_counter() - requested
+                    TTS_TIME_TO_FIRST_AUDIO.observe(first_audio)
+                await self._play(audio)
+                collected.append(audio)
+        else:
+            resp = await self.stub.Synthesize(request, metadata=self.metadata)
+            first_audio = time.perf_counter() - requested
+            TTS_TIME_TO_FIRST_AUDIO.observe(first_audio)
+            if first:
+                logger.info(f"Time spent: {(time.time() - start):.3f}s")
+            audio = decoder.decode(resp.audio) + decoder.flush()
+            await self._play(audio)
+            collected.append(audio)
+
+        audio = b"".join(collected)
+        if decision is not None and first_audio is not None:
+            self.controller.observe(
+                decision,
+                first_audio,
+                time.perf_counter() - requested,
+                len(audio) / (self.sampwidth * self.rates.tts),
+            )
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, key, audio)
+
+    async def warm_up(self):
+        """Wait for SERVING, fetch the synthesis config and run a tiny synthesis"""
+        if not await check_health(self.channel, self.metadata, self.args.startup_timeout):
+            raise RuntimeError(f"{self.args.tts_server} did not report SERVING")
+        if not self.args.skip_warmup:
+            await self.stub.GetRivaSynthesisConfig(
+                riva_tts_pb2.RivaSynthesisConfigRequest(), metadata=self.metadata
+            )
+            await self.stub.Synthesize(self._synthesis_request("Hi."), metadata=self.metadata)
+
+    def arm_first_audio(self):
+        """Start a new turn: ``first_audio_at`` is stamped when its first sound reaches the device"""
+        self.first_audio_at = None
+        if self.playback is not None:
+            self.playback.notify_first_audio(self._on_first_audio)
+
+    def _on_first_audio(self, at: float):
+        if self.first_audio_at is None:
+            self.first_audio_at = at
+
+    async def _play(self, audio):
+        if self.playback is None:
+            # Audio handed to a sink, or not played at all, counts as played now
+            self._on_first_audio(time.perf_counter())
+            if self.sink is None:
+                return
+        await self._output(self.converter.convert(audio))
+
+    async def _output(self, audio):
+        if not audio:
+            return
+        if self.sink is not None:
+            await self.sink(audio)
+        elif self.playback is not None:
+            await asyncio.to_thread(self.playback.write, audio)
+
+    def flush(self):
+        """Drop audio that is queued but not yet played"""
+        self.converter.reset()
+        if self.playback is not None:
+            self.playback.flush()
+
+    async def drain(self):
+        """Play the resampler's tail and wait for queued audio to finish playing"""
+        await self._output(self.converter.flush())
+        if self.playback is not None:
+            await asyncio.to_thread(self.playback.drain)
+
+    async def close(self):
+        if self._owns_channel:
+            await self.channel.close()
+        if self.cache is not None:
+            logger.info(f"TTS cache stats: {self.cache.stats()}")
+        if self.controller is not None and self._owns_controller:
+            self.controller.log_stats()
+        if self.playback is not None:
+            self.playback.close()
+
+
+class AsyncPerceptraAgent:
+    """
+    Asyncio counterpart of PerceptraAgent.
+
+    Microphone capture, ASR, the LLM stream and TTS run as separate tasks
+    joined by asyncio queues, so listening continues while a turn is being
+    answered and any turn can be cancelled mid-flight.
+    """
+
+    SHUTDOWN_COMMANDS = SHUTDOWN_COMMANDS
+    AUDIO_QUEUE_SIZE = 64
+
+    def __init__(
+        self,
+        args: argparse.Namespace,
+        asr_service: Optional[AsyncASRService] = None,
+        tts_service: Optional[AsyncTTSService] = None,
+        anthropic_client: Optional[anthropic.AsyncAnthropic] = None,
+        response_cache: Optional[ResponseCache] = None,
+    ):
+        """
+        Args:
+            args (argparse.Namespace): Configuration arguments for services.
+            asr_service, tts_service, anthropic_client, response_cache: Pre-built
+                clients and caches, so server sessions can share them; created
+                from args if omitted.
+        """
+        self.args = args
+        if not os.environ.get("ANTHROPIC_API_KEY"):
+            raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+
+        self.asr_service = asr_service or AsyncASRService(self.args)
+        self.tts_service = tts_service or AsyncTTSService(self.args)
+        self.anthropic_client = anthropic_client or anthropic.AsyncAnthropic()
+        self.conversation = build_conversation(self.args)
+        self._owns_response_cache = response_cache is None
+        self.response_cache = response_cache or build_response_cache(self.args)
+
+        # Per-session VAD: only speech is streamed to ASR (--vad)
+        self.vad = build_vad(self.args)
+        self._mic_stop = threading.Event()
+        self._current_turn: Optional[asyncio.Task] = None
+        self._turn_ids = itertools.count(1)
+        self._interrupted = False
+        self._speech_end = None
+
+        # Speculation state: the pending stability timer and the LLM stage
+        # started from an interim hypothesis
+        self.speculation_stats = SpeculationStats() if self.args.speculate else None
+        self._speculation_timer: Optional[asyncio.TimerHandle] = None
+        self._speculation_key = None
+        self._speculation = None
+
+    def _is_shutdown_command(self, transcript: str) -> bool:
+        return transcript.strip().lower() in self.SHUTDOWN_COMMANDS
+
+    def _pump_microphone(self, loop: asyncio.AbstractEventLoop, audio_queue: asyncio.Queue):
+        """Read the (blocking) PyAudio mic stream on its own thread and hand chunks to the loop"""
+        try:
+            with open_microphone(self.args) as audio_stream:
+                for chunk in audio_stream:
+                    if self._mic_stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(self._offer_audio, audio_queue, chunk)
+        except Exception as e:
+            logger.error(f"Microphone error: {e}")
+
+    @staticmethod
+    def _offer_audio(audio_queue: asyncio.Queue, chunk: bytes):
+        # Never block the capture thread; drop the oldest chunk if ASR falls behind
+        if audio_queue.full():
+            audio_queue.get_nowait()
+            logger.warning("ASR is falling behind, dropping audio", extra={"rate_limit": 1.0})
+        audio_queue.put_nowait(chunk)
+
+    @staticmethod
+    async def _audio_chunks(audio_queue: asyncio.Queue) -> AsyncIterator[bytes]:
+        while True:
+            yield await audio_queue.get()
+
+    async def _request_audio(self, audio_queue: asyncio.Queue) -> AsyncIterator[bytes]:
+        """
+        Audio for the next StreamingRecognize RPC: the whole stream, or with
+        --vad one utterance, returned only once speech has started so that
+        the RPC is not opened during silence.
+        """
+        chunks = self._audio_chunks(audio_queue)
+        if self.vad is None:
+            return chunks
+        utterance = self.vad.utterance_async(chunks)
+        first = await utterance.__anext__()
+
+        async def resumed():
+            yield first
+            async for chunk in utterance:
+                yield chunk
+
+        return resumed()
+
+    async def _listen(self, audio_queue: asyncio.Queue, transcripts: asyncio.Queue):
+        """ASR stage: turn mic audio into final transcripts, reconnecting on errors"""
+        last_hypothesis = None
+        while True:
+            try:
+                audio_chunks = await self._request_audio(audio_queue)
+                async for transcript, is_final in self.asr_service.results(audio_chunks):
+                    now = time.perf_counter()
+                    if not is_final:
+                        last_hypothesis = now
+                    else:
+                        self._speech_end = last_hypothesis or now
+                        last_hypothesis = None
+                        ASR_FINALIZATION.observe(now - self._speech_end)
+                    self._observe_hypothesis(transcript, is_final)
+                    if self.args.barge_in and len(transcript.split()) >= self.args.barge_in_min_words:
+                        self._interrupt()
+                    if is_final:
+                        await transcripts.put(transcript)
+            except grpc.aio.AioRpcError as e:
+                logger.error(f"ASR session error, reconnecting: {e.details()}")
+                await asyncio.sleep(0.5)
+            except Exception as e:
+                # Anything else would end the task silently and leave run() waiting for transcripts
+                logger.error(f"ASR session error, reconnecting: {str(e)}")
+                await asyncio.sleep(0.5)
+
+    def _turn_in_flight(self) -> bool:
+        return self._current_turn is not None and not self._current_turn.done()
+
+    def _observe_hypothesis(self, transcript: str, is_final: bool):
+        """
+        Speculation: restart the stability timer whenever the interim
+        hypothesis changes, and stop it on the final transcript.
+        """
+        if self.speculation_stats is None:
+            return
+        key = normalize_transcript(transcript)
+        if not is_final and key == self._speculation_key:
+            return
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+        self._speculation_key = None if is_final else key
+        if is_final or self._turn_in_flight():
+            return
+        self._speculation_timer = asyncio.get_running_loop().call_later(
+            self.args.speculation_window_ms / 1000, self._speculate, transcript
+        )
+
+    def _speculate(self, hypothesis: str):
+        """Start the LLM stage for a hypothesis that stayed stable for the window"""
+        self._speculation_timer = None
+        if self._turn_in_flight():
+            return
+        if self._speculation is not None:
+            if self._speculation[0] == normalize_transcript(hypothesis):
+                return
+            self._speculation[3].cancel()
+            self.speculation_stats.miss(self._speculation[1], hypothesis)
+        logger.info(f"Speculating on interim transcript: {hypothesis}")
+        sentences = asyncio.Queue(maxsize=self.args.tts_queue_size)
+        request = LLMRequest()
+        producer = asyncio.create_task(self._generate(hypothesis, sentences, request))
+        self._speculation = (
+            normalize_transcript(hypothesis), hypothesis, sentences, producer, request, time.perf_counter()
+        )
+        self.speculation_stats.started()
+
+    def _start_generation(self, transcript: str) -> Tuple[asyncio.Queue, asyncio.Task, LLMRequest]:
+        """
+        The LLM stage for a final transcript: the speculative one if it was
+        started from the same words, otherwise a new one.
+        """
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+        self._speculation_key = None
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            key, hypothesis, sentences, producer, request, started_at = speculation
+            if key == normalize_transcript(transcript):
+                self.speculation_stats.hit(time.perf_counter() - started_at)
+                return sentences, producer, request
+            producer.cancel()
+            self.speculation_stats.miss(hypothesis, transcript)
+        sentences = asyncio.Queue(maxsize=self.args.tts_queue_size)
+        request = LLMRequest()
+        return sentences, asyncio.create_task(self._generate(transcript, sentences, request)), request
+
+    def _cancel_speculation(self):
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+        if self._speculation is not None:
+            self._speculation[3].cancel()
+            self._speculation = None
+
+    def _interrupt(self):
+        """
+        Barge-in: cancel the turn in flight. Cancelling the task closes the
+        Anthropic stream and the SynthesizeOnline call; queued audio is dropped.
+        """
+        turn = self._current_turn
+        if turn is None or turn.done() or self._interrupted:
+            return
+        logger.info("Barge-in detected, interrupting response")
+        self._interrupted = True
+        turn.cancel()
+        self.tts_service.flush()
+
+    async def _generate(self, transcript: str, sentences: asyncio.Queue, request: LLMRequest):
+        """LLM stage: stream the Anthropic reply into the sentence queue, recording failure on ``request``"""
+        chunker = SentenceChunker(self.args.chunk_min_chars, self.args.chunk_max_chars)
+        start = time.perf_counter()
+        try:
+            reply = self.response_cache.get(transcript) if self.response_cache is not None else None
+            if reply is not None:
+                logger.info("LLM cache hit")
+                for chunk in chunker.feed(reply):
+                    await sentences.put(chunk)
+            else:
+                async with messages_api(self.anthropic_client, self.args).stream(
+                    **self.conversation.request(transcript)
+                ) as stream:
+                    first = True
+                    async for delta in stream.text_stream:
+                        if first:
+                            LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                            first = False
+                        for chunk in chunker.feed(delta):
+                            await sentences.put(chunk)
+                    message = await stream.get_final_message()
+                    self.conversation.record_usage(message.usage)
+                LLM_TOTAL.observe(time.perf_counter() - start)
+                if self.response_cache is not None:
+                    # Appends to the cache file, so off the event loop
+                    await asyncio.to_thread(
+                        self.response_cache.put,
+                        transcript,
+                        "".join(block.text for block in message.content if block.type == "text"),
+                    )
+            tail = chunker.flush()
+            if tail:
+                await sentences.put(tail)
+        except Exception as e:
+            logger.error(f"Anthropic interaction error: {e}")
+            request.failed = True
+            await sentences.put(ERROR_RESPONSE)
+        await sentences.put(None)
+
+    async def _announce(self, sentence: str):
+        logger.info(f" Perceptra: {sentence}")
+
+    async def _respond(self, transcript: str):
+        """Run the LLM and TTS stages of one turn concurrently"""
+        start = time.time()
+        self.tts_service.arm_first_audio()
+        sentences, producer, request = self._start_generation(transcript)
+        spoken = []
+        try:
+            first = True
+            while True:
+                chunk = await sentences.get()
+                if chunk is None:
+                    break
+                await self._announce(chunk)
+                spoken.append(chunk)
+                await self.tts_service.speak(chunk, start, first)
+                first = False
+            await self.tts_service.drain()
+        finally:
+            producer.cancel()
+            # An interrupted reply is remembered as far as it was spoken
+            if not request.failed:
+                self.conversation.record(transcript, " ".join(spoken))
+
+    async def _take_turn(self, transcript: str) -> bool:
+        """
+        Answer one transcript as a cancellable task.
+
+        Returns:
+            bool: False if the response was interrupted or failed
+        """
+        self._interrupted = False
+        # The turn task and the tasks it starts log with its turn ID
+        with log_context(turn=next(self._turn_ids)):
+            self._current_turn = asyncio.create_task(self._respond(transcript))
+        speech_end = self._speech_end
+        try:
+            await self._current_turn
+            first_audio = self.tts_service.first_audio_at
+            if speech_end is not None and first_audio is not None and first_audio > speech_end:
+                TURN_LATENCY.observe(first_audio - speech_end)
+            return True
+        except asyncio.CancelledError:
+            # Only swallow cancellations caused by barge-in
+            if not self._interrupted:
+                raise
+            logger.info("Speech interrupted")
+        except Exception as e:
+            logger.error(f"Speech processing error: {e}")
+        finally:
+            self._current_turn = None
+        return False
+
+    async def run(self):
+        """
+        Main speech loop: capture and ASR run for the whole session, turns are
+        answered one at a time as final transcripts arrive.
+        """
+        start = time.time()
+        await asyncio.gather(self.asr_service.warm_up(), self.tts_service.warm_up())
+        logger.info(f"ASR and TTS are SERVING, ready in {(time.time() - start):.3f}s")
+
+        loop = asyncio.get_running_loop()
+        audio_queue = asyncio.Queue(maxsize=self.AUDIO_QUEUE_SIZE)
+        transcripts = asyncio.Queue()
+
+        mic_thread = threading.Thread(
+            target=self._pump_microphone, args=(loop, audio_queue), name="mic-capture", daemon=True
+        )
+        mic_thread.start()
+        listener = asyncio.create_task(self._listen(audio_queue, transcripts))
+        logger.info("Perceptra: I'm listening!")
+        start_exporters(self.args)
+
+        try:
+            while True:
+                transcript = await transcripts.get()
+                logger.info(f"Transcript: {transcript}")
+
+                if self._is_shutdown_command(transcript):
+                    logger.info("Shutdown command received. Exiting...")
+                    return
+
+                await self._take_turn(transcript)
+        finally:
+            self._mic_stop.set()
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Cancel in-flight work and release channels and the audio device"""
+        logger.info("Perceptra shutting down...")
+        if self._current_turn is not None:
+            self._current_turn.cancel()
+        self._cancel_speculation()
+        if self.vad is not None:
+            self.vad.log_stats()
+        self.conversation.log_stats()
+        if self.speculation_stats is not None:
+            self.speculation_stats.log_stats()
+        if self.response_cache is not None and self._owns_response_cache:
+            self.response_cache.close()
+        await self.asr_service.close()
+        await self.tts_service.close()
+        stop_exporters(self.args)
+
+
+async def _run(args: argparse.Namespace):
+    # grpc.aio channels bind to the running loop, so build the agent inside it
+    with log_context(session=uuid.uuid4().hex[:12]):
+        agent = AsyncPerceptraAgent(args)
+        await agent.run()
+
+
+def run_async(args: argparse.Namespace):
+    """Run the asyncio runtime until shutdown or Ctrl+C"""
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        logger.info("Recording stopped by user")
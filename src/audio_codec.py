@@ -0,0 +1,236 @@
+import io
+import threading
+import time
+from typing import Dict, Iterable, Iterator
+
+import numpy as np
+
+# --asr-encoding / --tts-encoding choices and their riva AudioEncoding names
+ENCODINGS = {
+    "pcm": "LINEAR_PCM",
+    "mulaw": "MULAW",
+    "alaw": "ALAW",
+    "flac": "FLAC",
+    "opus": "OGGOPUS",
+}
+# libsndfile (format, subtype) for the container encodings
+_CONTAINERS = {
+    "flac": ("FLAC", "PCM_16"),
+    "opus": ("OGG", "OPUS"),
+}
+
+
+def proto_encoding(name: str) -> int:
+    """riva AudioEncoding value for a transport encoding name"""
+    import riva.client
+
+    return riva.client.AudioEncoding.Value(ENCODINGS[name])
+
+
+# G.711 tables, following the ITU reference implementation (Sun g711.c).
+# Encoding is a single lookup indexed by the 16-bit sample's bit pattern,
+# decoding a lookup indexed by the 8-bit code.
+
+def _build_mulaw_tables():
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    value = samples >> 2
+    mask = np.where(value < 0, 0x7F, 0xFF)
+    value = np.minimum(np.abs(value), 8159) + (0x84 >> 2)
+    seg_end = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+    seg = np.searchsorted(seg_end, value)
+    code = np.where(seg >= 8, 0x7F, (np.minimum(seg, 7) << 4) | ((value >> (seg + 1)) & 0x0F)) ^ mask
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[samples.astype(np.uint16)] = code
+
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    decode = np.where(u & 0x80, 0x84 - t, t - 0x84).astype("<i2")
+    return encode, decode
+
+
+def _build_alaw_tables():
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    value = samples >> 3
+    mask = np.where(value >= 0, 0xD5, 0x55)
+    value = np.where(value >= 0, value, -value - 1)
+    seg_end = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+    seg = np.searchsorted(seg_end, value)
+    shift = np.where(seg < 2, 1, np.minimum(seg, 7))
+    code = np.where(seg >= 8, 0x7F, (np.minimum(seg, 7) << 4) | ((value >> shift) & 0x0F)) ^ mask
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[samples.astype(np.uint16)] = code
+
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = np.where(seg == 0, t + 8, (t + 0x108) << np.maximum(seg - 1, 0))
+    decode = np.where(a & 0x80, t, -t).astype("<i2")
+    return encode, decode
+
+
+_MULAW_ENCODE, _MULAW_DECODE = _build_mulaw_tables()
+_ALAW_ENCODE, _ALAW_DECODE = _build_alaw_tables()
+
+
+def mulaw_encode(pcm) -> bytes:
+    """16-bit little-endian PCM to G.711 mu-law"""
+    return _MULAW_ENCODE[np.frombuffer(pcm, dtype="<u2")].tobytes()
+
+
+def mulaw_decode(data) -> bytes:
+    """G.711 mu-law to 16-bit little-endian PCM"""
+    return _MULAW_DECODE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+def alaw_encode(pcm) -> bytes:
+    """16-bit little-endian PCM to G.711 A-law"""
+    return _ALAW_ENCODE[np.frombuffer(pcm, dtype="<u2")].tobytes()
+
+
+def alaw_decode(data) -> bytes:
+    """G.711 A-law to 16-bit little-endian PCM"""
+    return _ALAW_DECODE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+class CodecStats:
+    """Bytes before/after the codec and codec CPU time, per direction"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    def record(self, direction: str, pcm_bytes: int, wire_bytes: int, cpu_seconds: float):
+        with self._lock:
+            counters = self._counters.setdefault(
+                direction, {"pcm_bytes": 0, "wire_bytes": 0, "cpu_seconds": 0.0}
+            )
+            counters["pcm_bytes"] += pcm_bytes
+            counters["wire_bytes"] += wire_bytes
+            counters["cpu_seconds"] += cpu_seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snapshot = {}
+            for direction, counters in self._counters.items():
+                snapshot[direction] = dict(counters)
+                snapshot[direction]["cpu_seconds"] = round(counters["cpu_seconds"], 6)
+                snapshot[direction]["ratio"] = (
+                    round(counters["wire_bytes"] / counters["pcm_bytes"], 4) if counters["pcm_bytes"] else None
+                )
+            return snapshot
+
+
+CODEC_STATS = CodecStats()
+
+
+def _sound_file(*args, **kwargs):
+    try:
+        import soundfile
+    except ImportError as e:
+        raise RuntimeError("FLAC and Opus transport need the soundfile package (pip install soundfile)") from e
+    return soundfile.SoundFile(*args, **kwargs)
+
+
+class Encoder:
+    """
+    Incremental PCM encoder for one stream.
+
+    ``encode`` returns the bytes to send for a chunk of PCM (possibly empty
+    for container codecs that buffer whole frames); ``flush`` returns what
+    is left at the end of the stream.
+    """
+
+    def __init__(self, name: str, sample_rate_hz: int):
+        self.name = name
+        self._file = None
+        if name in _CONTAINERS:
+            fmt, subtype = _CONTAINERS[name]
+            self._buffer = io.BytesIO()
+            self._sent = 0
+            self._file = _sound_file(
+                self._buffer, "w", samplerate=sample_rate_hz, channels=1, format=fmt, subtype=subtype
+            )
+
+    def _take(self) -> bytes:
+        data = self._buffer.getbuffer()[self._sent:].tobytes()
+        self._sent += len(data)
+        return data
+
+    def encode(self, pcm) -> bytes:
+        start = time.thread_time()
+        if self.name == "pcm":
+            data = bytes(pcm)
+        elif self.name == "mulaw":
+            data = mulaw_encode(pcm)
+        elif self.name == "alaw":
+            data = alaw_encode(pcm)
+        else:
+            self._file.write(np.frombuffer(pcm, dtype="<i2"))
+            data = self._take()
+        CODEC_STATS.record("asr_upload", len(pcm), len(data), time.thread_time() - start)
+        return data
+
+    def flush(self) -> bytes:
+        if self._file is None:
+            return b""
+        start = time.thread_time()
+        self._file.close()
+        data = self._take()
+        CODEC_STATS.record("asr_upload", 0, len(data), time.thread_time() - start)
+        return data
+
+
+class Decoder:
+    """
+    Decoder for one synthesized response.
+
+    G.711 and PCM chunks decode independently. Container codecs are
+    buffered and decoded by ``flush`` once the response is complete.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._pending = []
+
+    def decode(self, data) -> bytes:
+        start = time.thread_time()
+        if self.name == "pcm":
+            pcm = data
+        elif self.name == "mulaw":
+            pcm = mulaw_decode(data)
+        elif self.name == "alaw":
+            pcm = alaw_decode(data)
+        else:
+            self._pending.append(bytes(data))
+            pcm = b""
+        CODEC_STATS.record("tts_download", len(pcm), len(data), time.thread_time() - start)
+        return pcm
+
+    def flush(self) -> bytes:
+        if not self._pending:
+            return b""
+        start = time.thread_time()
+        # Read in blocks: streamed containers may not declare their length
+        blocks = []
+        with _sound_file(io.BytesIO(b"".join(self._pending)), "r") as f:
+            while True:
+                block = f.read(16384, dtype="int16")
+                if not len(block):
+                    break
+                blocks.append(block.tobytes())
+        pcm = b"".join(blocks)
+        self._pending = []
+        CODEC_STATS.record("tts_download", len(pcm), 0, time.thread_time() - start)
+        return pcm
+
+
+def encode_chunks(chunks: Iterable[bytes], name: str, sample_rate_hz: int) -> Iterator[bytes]:
+    """Encode a PCM chunk iterator for one ASR stream, skipping empty outputs"""
+    encoder = Encoder(name, sample_rate_hz)
+    for chunk in chunks:
+        data = encoder.encode(chunk)
+        if data:
+            yield data
+    tail = encoder.flush()
+    if tail:
+        yield tail
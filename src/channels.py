@@ -0,0 +1,182 @@
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import grpc
+import riva.client
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+PROTO_DIR = Path(__file__).resolve().parent.parent / "proto"
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+SERVING = 1  # grpc.health.v1.HealthCheckResponse.ServingStatus.SERVING
+
+
+def split_endpoints(value: str) -> List[str]:
+    """Endpoints of a comma-separated --asr-server/--tts-server value"""
+    return [uri.strip() for uri in value.split(",") if uri.strip()]
+
+
+def channel_options(args) -> List[Tuple[str, int]]:
+    """
+    gRPC channel options shared by every ASR/TTS channel.
+
+    Keepalive pings keep idle connections (and NAT/LB state) warm between
+    turns; the message limits cover long batch synthesis responses.
+    """
+    return [
+        ("grpc.keepalive_time_ms", args.keepalive_time_ms),
+        ("grpc.keepalive_timeout_ms", 10000),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+        ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+    ]
+
+
+def channel_credentials(args):
+    """TLS credentials following riva.client.Auth's rules, or None for plaintext"""
+    if args.ssl_cert is not None:
+        with open(args.ssl_cert, "rb") as f:
+            return grpc.ssl_channel_credentials(f.read())
+    if args.use_ssl:
+        return grpc.ssl_channel_credentials()
+    return None
+
+
+_protos: Dict[str, tuple] = {}
+_protos_lock = threading.Lock()
+
+
+def load_protos(filename: str):
+    """
+    Load messages and stubs for a proto file under proto/ at runtime, once.
+
+    The import path is extended while the file is compiled, so loads are
+    serialized; startup loads the protos before its threads start.
+
+    Returns:
+        Tuple of (messages module, services module)
+    """
+    with _protos_lock:
+        if filename not in _protos:
+            sys.path.insert(0, str(PROTO_DIR))
+            try:
+                _protos[filename] = grpc.protos_and_services(filename)
+            finally:
+                sys.path.remove(str(PROTO_DIR))
+        return _protos[filename]
+
+
+def health_protos():
+    """grpc.health.v1 messages and stubs from proto/health.proto"""
+    return load_protos("health.proto")
+
+
+class ChannelAuth(riva.client.Auth):
+    """
+    ``riva.client.Auth`` around an existing channel.
+
+    The base constructor opens a channel of its own, which would only be
+    closed again, so the attributes it sets are filled in here instead.
+    """
+
+    def __init__(
+        self,
+        channel: grpc.Channel,
+        uri: str,
+        ssl_cert: Optional[str] = None,
+        use_ssl: bool = False,
+        metadata_args: Optional[List[List[str]]] = None,
+    ):
+        self.ssl_cert = None if ssl_cert is None else Path(ssl_cert).expanduser()
+        self.uri = uri
+        self.use_ssl = use_ssl
+        self.metadata = []
+        for meta in metadata_args or []:
+            if len(meta) != 2:
+                raise ValueError(f"Metadata should be a key-value pair, got {len(meta)} values")
+            self.metadata.append(tuple(meta))
+        self.channel = channel
+
+
+class ChannelManager:
+    """
+    Owns one pre-configured gRPC channel per endpoint, shared by all services.
+
+    Services ask for a ``riva.client.Auth`` bound to the shared channel
+    instead of building their own with default options.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self._channels: Dict[str, grpc.Channel] = {}
+        self._auths: Dict[str, riva.client.Auth] = {}
+        self._lock = threading.Lock()
+
+    def channel(self, uri: str) -> grpc.Channel:
+        """Return the shared channel for an endpoint, creating it on first use"""
+        with self._lock:
+            if uri not in self._channels:
+                credentials = channel_credentials(self.args)
+                options = channel_options(self.args)
+                if credentials is None:
+                    self._channels[uri] = grpc.insecure_channel(uri, options=options)
+                else:
+                    self._channels[uri] = grpc.secure_channel(uri, credentials, options=options)
+            return self._channels[uri]
+
+    def auth(self, uri: str) -> riva.client.Auth:
+        """Return a riva.client.Auth that uses the shared channel for an endpoint"""
+        channel = self.channel(uri)
+        with self._lock:
+            if uri not in self._auths:
+                self._auths[uri] = ChannelAuth(
+                    channel, uri, self.args.ssl_cert, self.args.use_ssl, self.args.metadata
+                )
+            return self._auths[uri]
+
+    def check_health(self, uri: str, timeout: float) -> bool:
+        """
+        Block until the endpoint answers grpc.health.v1.Health/Check with SERVING.
+
+        Args:
+            uri (str): Server endpoint
+            timeout (float): Seconds to keep retrying
+
+        Returns:
+            bool: Whether the endpoint reported SERVING in time
+        """
+        messages, services = health_protos()
+        stub = services.HealthStub(self.channel(uri))
+        metadata = self.auth(uri).get_auth_metadata()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                response = stub.Check(
+                    messages.HealthCheckRequest(),
+                    timeout=remaining,
+                    wait_for_ready=True,
+                    metadata=metadata,
+                )
+                if response.status == SERVING:
+                    return True
+                logger.info(f"{uri} is not serving yet (status {response.status})")
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    return False
+                logger.info(f"Waiting for {uri}: {e.code().name}")
+            time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        with self._lock:
+            for channel in self._channels.values():
+                channel.close()
+            self._channels.clear()
+            self._auths.clear()
@@ -0,0 +1,382 @@
+import json
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from metrics import LOCAL_COMMANDS
+from resample import AudioConverter
+from response_cache import normalize_transcript
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+# Trie keys that cannot be words: normalized transcripts have no empty words
+# and no "*" (punctuation is stripped)
+_END = ""
+WILDCARD = "*"
+# A phrase may differ from the transcript by one character per this many characters
+CHARS_PER_EDIT = 4
+# The deletion index stores about len(phrase) ** edits variants per phrase,
+# so two edits already cost seconds to build and milliseconds per match
+MAX_EDITS = 1
+VOLUME_STEP = 1.5
+VOLUME_RANGE = (0.1, 4.0)
+
+
+class CommandReply(NamedTuple):
+    """What a command answers: nothing (handled silently), text to speak, or pre-rendered audio"""
+    text: Optional[str] = None
+    # 16-bit mono PCM at the TTS rate, played without contacting TTS
+    audio: Optional[bytes] = None
+    # Whether the turn is added to the LLM conversation history
+    remember: bool = True
+
+
+class CommandMatch(NamedTuple):
+    command: "Command"
+    phrase: str
+    # Words matched by a trailing "*" in the phrase
+    rest: str = ""
+    edits: int = 0
+
+
+class Command:
+    """
+    A local command: its phrases and either a handler or a fixed reply.
+
+    The handler gets the match and returns a ``CommandReply``, or None to
+    pass the transcript on to the LLM after all.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        phrases: Iterable[str],
+        handler: Optional[Callable[[CommandMatch], Optional[CommandReply]]] = None,
+        reply: Optional[str] = None,
+        audio: Optional[bytes] = None,
+    ):
+        self.name = name
+        self.phrases = list(phrases)
+        self.handler = handler
+        self.reply = CommandReply(reply, audio)
+
+    def answer(self, match: CommandMatch) -> Optional[CommandReply]:
+        if self.handler is not None:
+            return self.handler(match)
+        return self.reply
+
+
+def _deletions(text: str, edits: int) -> Set[str]:
+    """``text`` with up to ``edits`` characters deleted"""
+    variants = {text}
+    frontier = {text}
+    for _ in range(edits):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance between two strings, or ``limit + 1``
+    once it is above ``limit``. The common prefix and suffix are skipped,
+    and of the rest only the band of ``limit`` cells on either side of the
+    diagonal is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    above = limit + 1
+    before, previous = None, [j if j <= limit else above for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else above] + [above] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if before is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cost = min(cost, before[j - 2] + 1)
+            current[j] = min(cost, above)
+        if min(current) > limit:
+            return above
+        before, previous = previous, current
+    return previous[-1]
+
+
+class CommandRouter:
+    """
+    Answers known utterances locally, before the LLM is called.
+
+    Phrases are normalized like LLM cache keys (case, punctuation, filler
+    words) and compiled into a word trie when they are registered, so an
+    exact match costs one dictionary lookup per word of the transcript,
+    however many phrases there are. A phrase ending in "*" matches any
+    transcript that starts with it, including the bare phrase.
+
+    With ``max_edits`` a transcript that matches no phrase exactly may still
+    match one that is up to that many character edits away (at most one
+    edit per ``CHARS_PER_EDIT`` characters of the phrase, so short phrases
+    stay exact). Candidates come from a symmetric-deletion index: every
+    phrase is stored under each variant with up to its allowed number of
+    characters deleted, and the transcript's own deletion variants are
+    looked up and verified, so no phrase is compared one by one. Transcripts
+    longer than any phrase skip the fuzzy lookup. The index holds one entry
+    per character of each phrase, so ``max_edits`` is capped at ``MAX_EDITS``.
+    """
+
+    def __init__(self, max_edits: int = 0):
+        if not 0 <= max_edits <= MAX_EDITS:
+            raise ValueError(f"max_edits must be between 0 and {MAX_EDITS}, got {max_edits}")
+        self.max_edits = max_edits
+        self.commands: List[Command] = []
+        self._trie: Dict = {}
+        self._fuzzy: Dict[str, List[Tuple[str, Command, int]]] = {}
+        self._longest = 0
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses = 0
+        self._match_ns = 0
+        self._matches = 0
+
+    def register(
+        self,
+        name: str,
+        phrases: Iterable[str],
+        handler: Optional[Callable[[CommandMatch], Optional[CommandReply]]] = None,
+        reply: Optional[str] = None,
+        audio: Optional[bytes] = None,
+    ) -> Command:
+        """
+        Add a command.
+
+        Args:
+            name (str): Name used in logs and the ``local_commands_total`` metric
+            phrases: Phrases that trigger it; a trailing "*" matches the rest of the transcript
+            handler: Callable answering a match, or None to always answer ``reply``/``audio``
+            reply (Optional[str]): Fixed text to speak
+            audio (Optional[bytes]): Fixed pre-rendered PCM to play
+
+        Returns:
+            Command: The registered command
+        """
+        command = Command(name, phrases, handler, reply, audio)
+        for phrase in command.phrases:
+            wildcard = phrase.rstrip().endswith(WILDCARD)
+            key = normalize_transcript(phrase.rstrip().rstrip(WILDCARD))
+            if not key:
+                continue
+            node = self._trie
+            for word in key.split():
+                node = node.setdefault(word, {})
+            marker = WILDCARD if wildcard else _END
+            if marker in node:
+                logger.warning(f"Command phrase {phrase!r} of {name} is already registered by {node[marker][1].name}")
+                continue
+            node[marker] = (key, command)
+            if not wildcard and self.max_edits:
+                self._index(key, command)
+        self.commands.append(command)
+        return command
+
+    def _index(self, key: str, command: Command):
+        edits = min(self.max_edits, len(key) // CHARS_PER_EDIT)
+        if edits == 0:
+            return
+        self._longest = max(self._longest, len(key))
+        for variant in _deletions(key, edits):
+            self._fuzzy.setdefault(variant, []).append((key, command, edits))
+
+    def match(self, transcript: str) -> Optional[CommandMatch]:
+        """The command a transcript triggers, or None"""
+        key = normalize_transcript(transcript)
+        words = key.split()
+        node = self._trie
+        prefix = None
+        for index, word in enumerate(words):
+            if WILDCARD in node:
+                prefix = (node[WILDCARD], index)
+            node = node.get(word)
+            if node is None:
+                break
+        else:
+            if _END in node:
+                phrase, command = node[_END]
+                return CommandMatch(command, phrase)
+            if WILDCARD in node:
+                prefix = (node[WILDCARD], len(words))
+        if prefix is not None:
+            (phrase, command), index = prefix
+            return CommandMatch(command, phrase, " ".join(words[index:]))
+        if self._fuzzy and 0 < len(key) <= self._longest + self.max_edits:
+            return self._fuzzy_match(key)
+        return None
+
+    def _fuzzy_match(self, key: str) -> Optional[CommandMatch]:
+        best = None
+        checked = set()
+        for variant in _deletions(key, self.max_edits):
+            for phrase, command, edits in self._fuzzy.get(variant, ()):
+                # A close phrase shares several deletion variants with the transcript
+                if phrase in checked:
+                    continue
+                checked.add(phrase)
+                distance = edit_distance(key, phrase, edits)
+                if distance <= edits and (best is None or distance < best.edits):
+                    best = CommandMatch(command, phrase, edits=distance)
+        return best
+
+    def route(self, transcript: str) -> Optional[Tuple[CommandMatch, CommandReply]]:
+        """
+        Match a transcript and run its command.
+
+        Returns:
+            Optional[Tuple[CommandMatch, CommandReply]]: The match and the
+                reply, or None if the LLM should answer
+        """
+        start = time.perf_counter_ns()
+        match = self.match(transcript)
+        elapsed = time.perf_counter_ns() - start
+        with self._lock:
+            self._match_ns += elapsed
+            self._matches += 1
+            if match is None:
+                self.misses += 1
+        if match is None:
+            return None
+        reply = match.command.answer(match)
+        if reply is None:
+            return None
+        with self._lock:
+            self.hits[match.command.name] = self.hits.get(match.command.name, 0) + 1
+        LOCAL_COMMANDS.inc(command=match.command.name)
+        fuzzy = f", {match.edits} edits from {match.phrase!r}" if match.edits else ""
+        logger.info(f"Local command {match.command.name} matched in {elapsed / 1000:.1f}us{fuzzy}")
+        return match, reply
+
+    def prerender(self, render: Callable[[str], bytes]):
+        """Synthesize the fixed text replies once, so they play without contacting TTS"""
+        start = time.time()
+        rendered = 0
+        for command in self.commands:
+            reply = command.reply
+            if command.handler is not None or not reply.text or reply.audio is not None:
+                continue
+            try:
+                command.reply = reply._replace(audio=render(reply.text))
+                rendered += 1
+            except Exception as e:
+                logger.warning(f"Could not pre-render the reply of {command.name}: {e}")
+        logger.info(f"Pre-rendered {rendered} command replies in {(time.time() - start):.3f}s")
+
+    def log_stats(self):
+        phrases = sum(len(command.phrases) for command in self.commands)
+        mean_us = self._match_ns / self._matches / 1000 if self._matches else 0.0
+        logger.info(
+            f"Local commands: {len(self.commands)} commands, {phrases} phrases, {sum(self.hits.values())} turns "
+            f"answered {self.hits}, {self.misses} passed to the LLM, mean match time {mean_us:.1f}us"
+        )
+
+
+def load_reply_audio(path: Path, sample_rate_hz: int) -> bytes:
+    """A 16-bit WAV file as mono PCM at the TTS rate"""
+    with wave.open(str(path), "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path} is not 16-bit PCM")
+        converter = AudioConverter(wf.getframerate(), sample_rate_hz, wf.getnchannels(), 1)
+        return b"".join(converter.stream([wf.readframes(wf.getnframes())]))
+
+
+def load_command_file(router: CommandRouter, path: Path, sample_rate_hz: int):
+    """
+    Register the commands of a JSON-lines file, one object per line with
+    ``phrases`` and a ``reply`` text and/or an ``audio`` WAV file (relative
+    to the file), and optionally a ``name``.
+    """
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                audio = None
+                if entry.get("audio"):
+                    audio = load_reply_audio(path.parent / entry["audio"], sample_rate_hz)
+                router.register(
+                    entry.get("name", f"{path.stem}:{number}"), entry["phrases"], reply=entry.get("reply"), audio=audio
+                )
+                count += 1
+            except (ValueError, KeyError, TypeError, OSError, EOFError, wave.Error) as e:
+                logger.warning(f"Malformed command on line {number} of {path}: {e}")
+    logger.info(f"Loaded {count} commands from {path}")
+
+
+def _spoken_time(_match) -> CommandReply:
+    now = time.localtime()
+    return CommandReply(f"It's {now.tm_hour % 12 or 12}:{now.tm_min:02d} {'AM' if now.tm_hour < 12 else 'PM'}.")
+
+
+def _spoken_date(_match) -> CommandReply:
+    now = time.localtime()
+    return CommandReply(f"Today is {time.strftime('%A, %B', now)} {now.tm_mday}.")
+
+
+def register_builtin_commands(router: CommandRouter, agent):
+    """Repeat, stop, volume, time and date commands of the local agent"""
+
+    def repeat(_match):
+        # Without an earlier reply, "what did you say" is a question for the LLM
+        if not agent.last_reply:
+            return None
+        return CommandReply(agent.last_reply, remember=False)
+
+    def volume(factor):
+        def change(_match):
+            playback = agent.tts_service.playback
+            if playback is not None:
+                playback.volume = min(max(playback.volume * factor, VOLUME_RANGE[0]), VOLUME_RANGE[1])
+                logger.info(f"Playback volume set to {playback.volume:.2f}")
+            return CommandReply("Okay.", remember=False)
+        return change
+
+    router.register(
+        "repeat",
+        ["repeat", "repeat that", "say that again", "say it again", "come again", "what did you say", "pardon"],
+        repeat,
+    )
+    def stop(_match):
+        agent.stop_speaking()
+        return CommandReply(remember=False)
+
+    router.register(
+        "stop",
+        ["stop", "stop talking", "be quiet", "quiet", "never mind", "nevermind", "cancel", "that's enough"],
+        stop,
+    )
+    router.register("louder", ["louder", "speak up", "volume up", "turn it up"], volume(VOLUME_STEP))
+    router.register("quieter", ["quieter", "softer", "volume down", "turn it down"], volume(1 / VOLUME_STEP))
+    router.register("time", ["what time is it", "what's the time", "what is the time", "tell me the time"], _spoken_time)
+    router.register(
+        "date", ["what's the date", "what is the date", "what day is it", "what's today's date"], _spoken_date
+    )
+
+
+def build_command_router(args, agent) -> Optional[CommandRouter]:
+    """The built-in commands with --local-commands and the --command-file ones, or None without either"""
+    if not args.local_commands and args.command_file is None:
+        return None
+    from agent_config import audio_rates
+
+    router = CommandRouter(args.command_max_edits)
+    if args.local_commands:
+        register_builtin_commands(router, agent)
+    if args.command_file is not None:
+        load_command_file(router, args.command_file, audio_rates(args).tts)
+    return router
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The modules import each other by bare name (they run as python src/main.py),
+# so the tests next to them need src/ on the import path too
+sys.path.insert(0, str(Path(__file__).resolve().parent))
@@ -0,0 +1,162 @@
+from typing import Dict, List, Optional, Tuple
+
+from agent_config import MAX_TOKENS, MODEL_NAME, SYSTEM_PROMPT, limit_transcript
+from metrics import LLM_CACHE_READ_TOKENS, LLM_CACHE_WRITE_TOKENS
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+# Rough English average, good enough to keep the prompt under a budget
+CHARS_PER_TOKEN = 4
+# Compaction stops once the history is back under this share of the budget,
+# so the cached prefix stays unchanged for several turns afterwards
+COMPACT_TO = 0.75
+DIGEST_USER_CHARS = 100
+DIGEST_REPLY_CHARS = 160
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def messages_api(client, args):
+    """
+    The Messages resource to stream from: the prompt caching beta, which
+    accepts ``cache_control`` and reports cache token counts, unless
+    --no-prompt-cache is set.
+    """
+    if args.prompt_cache:
+        return client.beta.prompt_caching.messages
+    return client.messages
+
+
+class Conversation:
+    """
+    Bounded multi-turn history for one user, laid out for prompt caching.
+
+    Requests are built as system prompt, digest of compacted turns, recent
+    turns, then the new transcript. The system block and the last recorded
+    reply carry ``cache_control`` breakpoints, so each follow-up turn reads
+    everything before the new transcript from the cache and only the
+    previous exchange is written.
+
+    When the estimated history size passes ``budget_tokens`` the oldest turns
+    are folded into a one-line-per-turn digest until the history is back
+    under 75% of the budget. Compacting in batches changes the cached prefix
+    once rather than on every turn.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int,
+        system_prompt: str = SYSTEM_PROMPT,
+        prompt_cache: bool = True,
+    ):
+        self.budget_tokens = budget_tokens
+        self.system_prompt = system_prompt
+        self.prompt_cache = prompt_cache
+        self.turns: List[Tuple[str, str]] = []
+        self.digest: List[str] = []
+        self.totals = {"turns": 0, "input_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+
+    def _system(self):
+        blocks = [{"type": "text", "text": self.system_prompt}]
+        if self.digest:
+            blocks.append({"type": "text", "text": "Earlier in this conversation:\n" + "\n".join(self.digest)})
+        if not self.prompt_cache:
+            return "\n\n".join(block["text"] for block in blocks)
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+        return blocks
+
+    def request(self, transcript: str) -> Dict:
+        """
+        Keyword arguments for ``messages.stream`` answering a new transcript.
+
+        Args:
+            transcript (str): Transcribed speech input
+
+        Returns:
+            Dict: model, max_tokens, system and messages
+        """
+        messages = []
+        for index, (user, reply) in enumerate(self.turns):
+            messages.append({"role": "user", "content": user})
+            content = reply
+            if self.prompt_cache and index == len(self.turns) - 1:
+                content = [{"type": "text", "text": reply, "cache_control": CACHE_CONTROL}]
+            messages.append({"role": "assistant", "content": content})
+        messages.append({"role": "user", "content": limit_transcript(transcript)})
+        return {
+            "model": MODEL_NAME,
+            "max_tokens": MAX_TOKENS,
+            "system": self._system(),
+            "messages": messages,
+        }
+
+    def record(self, transcript: str, reply: str):
+        """
+        Add a finished turn; for an interrupted turn pass what was spoken.
+
+        Turns without a reply are left out so roles keep alternating.
+        """
+        reply = reply.strip()
+        if self.budget_tokens <= 0 or not reply:
+            return
+        self.turns.append((limit_transcript(transcript), reply))
+        self._compact()
+
+    def _history_tokens(self) -> int:
+        return sum(estimate_tokens(user) + estimate_tokens(reply) for user, reply in self.turns) + sum(
+            estimate_tokens(line) for line in self.digest
+        )
+
+    def _compact(self):
+        if self._history_tokens() <= self.budget_tokens:
+            return
+        target = self.budget_tokens * COMPACT_TO
+        folded = 0
+        # Keep the latest turn verbatim so the next reply has full context
+        while len(self.turns) > 1 and self._history_tokens() > target:
+            user, reply = self.turns.pop(0)
+            self.digest.append(f"- User: {user[:DIGEST_USER_CHARS]} / You: {reply[:DIGEST_REPLY_CHARS]}")
+            folded += 1
+        while len(self.digest) > 1 and self._history_tokens() > target:
+            self.digest.pop(0)
+        logger.info(f"Compacted {folded} turns into the conversation digest ({self._history_tokens()} tokens of history)")
+
+    def record_usage(self, usage) -> Optional[Dict[str, int]]:
+        """Log and accumulate the token counts of one response"""
+        if usage is None:
+            return None
+        counts = {
+            "input_tokens": usage.input_tokens or 0,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "output_tokens": usage.output_tokens or 0,
+        }
+        self.totals["turns"] += 1
+        for key, value in counts.items():
+            self.totals[key] += value
+        LLM_CACHE_READ_TOKENS.observe(counts["cache_read_tokens"])
+        LLM_CACHE_WRITE_TOKENS.observe(counts["cache_write_tokens"])
+        logger.info(
+            f"LLM tokens: input={counts['input_tokens']} cache_read={counts['cache_read_tokens']} "
+            f"cache_write={counts['cache_write_tokens']} output={counts['output_tokens']}"
+        )
+        return counts
+
+    def log_stats(self, label: str = "Conversation"):
+        totals = self.totals
+        prompt = totals["input_tokens"] + totals["cache_read_tokens"] + totals["cache_write_tokens"]
+        if not prompt:
+            return
+        logger.info(
+            f"{label}: {totals['turns']} turns, {prompt} prompt tokens, "
+            f"{totals['cache_read_tokens'] / prompt:.1%} read from cache, "
+            f"{totals['cache_write_tokens']} written to cache"
+        )
+
+
+def build_conversation(args) -> Conversation:
+    return Conversation(args.history_tokens, prompt_cache=args.prompt_cache)
@@ -0,0 +1,279 @@
+import collections
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import grpc
+
+from channels import SERVING, ChannelManager, health_protos
+from metrics import ENDPOINT_LATENCY, ENDPOINT_LATENCY_SAMPLES, ENDPOINT_REQUESTS
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+# Smoothing of the per-backend latency used to break ties between idle backends
+LATENCY_EWMA = 0.3
+WATCH_RETRY_SECONDS = 1.0
+POLL_SECONDS = 5.0
+
+
+class Backend:
+    """One ASR or TTS server of a pool, with its riva client and load counters"""
+
+    def __init__(self, uri: str, auth, service):
+        self.uri = uri
+        self.auth = auth
+        self.service = service
+        # None until the first health answer; unknown backends are still used
+        self.serving: Optional[bool] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.latency: Optional[float] = None
+        self.latencies = collections.deque(maxlen=256)
+
+    @property
+    def usable(self) -> bool:
+        return self.serving is not False
+
+
+class EndpointPool:
+    """
+    Routes RPCs over several servers of one NIM (``--asr-server a,b``).
+
+    Each RPC goes to the usable backend with the fewest in-flight requests;
+    ties go to the lower smoothed latency, then to the least used backend,
+    so a slow or restarting server stops receiving work without any manual
+    weights. Liveness comes from one ``grpc.health.v1.Health/Watch`` stream
+    per backend (``Check`` polling if the server lacks ``Watch``); a backend
+    that fails an RPC with UNAVAILABLE is also skipped until its health
+    stream reports SERVING again. If no backend is usable, all are tried.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        uris: List[str],
+        channels: ChannelManager,
+        make_service: Callable,
+    ):
+        self.name = name
+        self.channels = channels
+        self.backends = []
+        for uri in uris:
+            auth = channels.auth(uri)
+            self.backends.append(Backend(uri, auth, make_service(auth)))
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._watches: Dict[str, grpc.Future] = {}
+        self._watchers = []
+
+    def __len__(self):
+        return len(self.backends)
+
+    @property
+    def primary(self) -> Backend:
+        return self.backends[0]
+
+    def pick(self, exclude: Optional[Backend] = None) -> Backend:
+        """Least-outstanding-requests choice among usable backends other than ``exclude`` if possible"""
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend is not exclude] or self.backends
+            usable = [backend for backend in candidates if backend.usable] or candidates
+            return min(usable, key=lambda b: (b.in_flight, b.latency or 0.0, b.requests))
+
+    def acquire(self, exclude: Optional[Backend] = None, hedge: bool = False) -> Backend:
+        """Pick a backend and count an RPC against it until ``release``"""
+        backend = self.pick(exclude)
+        with self._lock:
+            backend.in_flight += 1
+            backend.requests += 1
+            if hedge:
+                backend.hedges += 1
+        return backend
+
+    def release(self, backend: Backend, error: Optional[BaseException] = None, cancelled: bool = False):
+        """Finish an RPC; an UNAVAILABLE error takes the backend out of rotation"""
+        outcome = "ok"
+        if cancelled or isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.CANCELLED:
+            outcome = "cancelled"
+        elif error is not None:
+            outcome = "error"
+        down = False
+        with self._lock:
+            backend.in_flight -= 1
+            if outcome == "error":
+                backend.errors += 1
+                unavailable = isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.UNAVAILABLE
+                down = unavailable and len(self.backends) > 1 and backend.serving is not False
+                if down:
+                    backend.serving = False
+        if down:
+            logger.warning(f"{self.name} backend {backend.uri} is unavailable, routing around it")
+        ENDPOINT_REQUESTS.inc(service=self.name, backend=backend.uri, outcome=outcome)
+
+    def release_when_done(self, backend: Backend, call: grpc.Future):
+        """Release a backend once a future-style RPC completes"""
+        def done(call):
+            if call.cancelled():
+                self.release(backend, cancelled=True)
+            else:
+                self.release(backend, call.exception())
+
+        call.add_done_callback(done)
+
+    @contextmanager
+    def lease(self):
+        """
+        Hold a backend for the duration of a blocking or streaming RPC.
+
+        Yields:
+            Backend: The backend to send the RPC to
+        """
+        backend = self.acquire()
+        error = None
+        try:
+            yield backend
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(backend, error)
+
+    def for_each(self, fn: Callable[[Backend], None]):
+        """Run ``fn`` for every backend concurrently, e.g. to warm them all up"""
+        threads = [threading.Thread(target=fn, args=(backend,), daemon=True) for backend in self.backends]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def observe(self, backend: Backend, seconds: float, answered: bool = True):
+        """
+        Record the response latency of one RPC.
+
+        Args:
+            answered (bool): False for a lost hedge, whose latency is only a
+                lower bound: it steers routing but is not exported
+        """
+        with self._lock:
+            backend.latencies.append(seconds)
+            if backend.latency is None:
+                backend.latency = seconds
+            else:
+                backend.latency += LATENCY_EWMA * (seconds - backend.latency)
+        if answered:
+            ENDPOINT_LATENCY.inc(seconds, service=self.name, backend=backend.uri)
+            ENDPOINT_LATENCY_SAMPLES.inc(service=self.name, backend=backend.uri)
+
+    def _set_serving(self, backend: Backend, serving: bool):
+        with self._lock:
+            changed = backend.serving != serving
+            backend.serving = serving
+        if changed:
+            state = "SERVING" if serving else "NOT_SERVING"
+            log = logger.info if serving else logger.warning
+            log(f"{self.name} backend {backend.uri} is {state}")
+
+    def wait_until_serving(self, timeout: float) -> bool:
+        """
+        Block until one backend reports SERVING, so a restarting server does
+        not hold up startup; the others keep being checked in the background.
+
+        Returns:
+            bool: Whether a backend reported SERVING within ``timeout``
+        """
+        finished = []
+        progress = threading.Condition()
+
+        def check(backend):
+            serving = self.channels.check_health(backend.uri, timeout)
+            self._set_serving(backend, serving)
+            if not serving:
+                logger.error(f"{self.name} backend {backend.uri} did not report SERVING within {timeout:.0f}s")
+            with progress:
+                finished.append(serving)
+                progress.notify_all()
+
+        for backend in self.backends:
+            threading.Thread(target=check, args=(backend,), daemon=True).start()
+        with progress:
+            progress.wait_for(lambda: any(finished) or len(finished) == len(self.backends))
+            return any(finished)
+
+    def start_watching(self):
+        """Follow every backend's Health/Watch stream on a daemon thread"""
+        if self._watchers:
+            return
+        for backend in self.backends:
+            watcher = threading.Thread(
+                target=self._watch, args=(backend,), name=f"health-{backend.uri}", daemon=True
+            )
+            watcher.start()
+            self._watchers.append(watcher)
+
+    def _watch(self, backend: Backend):
+        messages, services = health_protos()
+        stub = services.HealthStub(backend.auth.channel)
+        metadata = backend.auth.get_auth_metadata()
+        while not self._closed.is_set():
+            try:
+                call = stub.Watch(messages.HealthCheckRequest(), metadata=metadata)
+                self._watches[backend.uri] = call
+                for response in call:
+                    self._set_serving(backend, response.status == SERVING)
+            except grpc.RpcError as e:
+                if self._closed.is_set():
+                    return
+                if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                    logger.info(f"{backend.uri} has no Health/Watch, polling Health/Check instead")
+                    self._poll(backend, stub, messages, metadata)
+                    return
+                self._set_serving(backend, False)
+            self._closed.wait(WATCH_RETRY_SECONDS)
+
+    def _poll(self, backend: Backend, stub, messages, metadata):
+        while not self._closed.wait(POLL_SECONDS):
+            try:
+                response = stub.Check(messages.HealthCheckRequest(), timeout=POLL_SECONDS, metadata=metadata)
+                self._set_serving(backend, response.status == SERVING)
+            except grpc.RpcError:
+                self._set_serving(backend, False)
+
+    def stats(self) -> List[Dict]:
+        """Load, errors and latency per backend"""
+        rows = []
+        with self._lock:
+            for backend in self.backends:
+                latencies = sorted(backend.latencies)
+                rows.append({
+                    "backend": backend.uri,
+                    "serving": backend.serving,
+                    "in_flight": backend.in_flight,
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                    "hedges": backend.hedges,
+                    "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                    "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+                })
+        return rows
+
+    def log_stats(self):
+        for row in self.stats():
+            logger.info(f"{self.name} backend stats: {row}")
+
+    def close(self):
+        """Stop the health watchers"""
+        self._closed.set()
+        for call in list(self._watches.values()):
+            call.cancel()
+
+
+def build_endpoint_pool(name: str, uris: List[str], channels: ChannelManager, make_service: Callable) -> EndpointPool:
+    """Create a pool and start following its backends' health"""
+    pool = EndpointPool(name, uris, channels, make_service)
+    # Liveness only changes routing when there is somewhere else to go
+    if len(pool) > 1:
+        pool.start_watching()
+    return pool
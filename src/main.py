@@ -1,24 +1,37 @@
 import argparse
-import logging
+import itertools
 import os
+import queue
 import threading
 import time
-from pathlib import Path
-from typing import Optional, Union
+import uuid
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple, Union
 
-import anthropic
-import riva.client.audio_io
-import riva.client.argparse_utils
-from asr_service import ASRService
+# First, so that --profile-startup times every import below
+from startup import PROFILE
+from agent_config import (
+    ERROR_RESPONSE,
+    SHUTDOWN_COMMANDS,
+    build_arg_parser,
+    limit_transcript,
+)
+from asr_service import ASRService, probe_input_device
+from channels import ChannelManager, health_protos
+from command_router import build_command_router
+from conversation import build_conversation, messages_api
+from metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_TOTAL, TURN_LATENCY, start_exporters, stop_exporters
+from response_cache import build_response_cache
+from session_trace import LLM_OPEN, LLM_TEXT, build_trace_replay, build_trace_writer
+from shared_logging import configure_logging, set_log_fields, setup_logger
+from speculation import LLMRequest, SpeculationStats, SpeculativeReply, Speculator
+from text_chunker import SentenceChunker
 from tts_service import TTSService
 
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    import anthropic
+    from translation_service import TranslationService
+
+logger = setup_logger()
 
 class PerceptraAgent:
     """
@@ -27,9 +40,7 @@ class PerceptraAgent:
     Manages speech-to-text, AI interaction, and text-to-speech functionalities.
     """
     
-    SHUTDOWN_COMMANDS = {
-        "shut down", "shutdown", "exit", "close", "switch off"
-    }
+    SHUTDOWN_COMMANDS = SHUTDOWN_COMMANDS
     
     def __init__(self, args: Optional[argparse.Namespace] = None):
         """
@@ -41,11 +52,66 @@ class PerceptraAgent:
         self.args = args or self._parse_args()
         self._validate_config()
         
-        self.asr_service = ASRService(self.args)
-        self.tts_service = TTSService(self.args)
-        self.anthropic_client = self._initialize_anthropic_client()
+        # Logged with every record; the turn is set per transcript (--log-format json)
+        self.session_id = uuid.uuid4().hex[:12]
+        self._turn_ids = itertools.count(1)
+        set_log_fields(session=self.session_id)
         
+        self.channels = ChannelManager(self.args)
         self.stop_event = threading.Event()
+        # --record-trace / --replay-trace; a replay stops the agent once its mic audio is used up
+        self.recorder = build_trace_writer(self.args)
+        self.replay = build_trace_replay(self.args, self.stop_event)
+        start = time.time()
+        # The ASR and TTS chains (client, SERVING check, warm-up) and the
+        # Anthropic import only meet here, so network waits and the output
+        # device overlap with the slow SDK import
+        services = {
+            "ASR": self._initialize_asr_service,
+            "TTS": self._initialize_tts_service,
+            "Anthropic client": self._initialize_anthropic_client,
+        }
+        if self.args.translate:
+            # One S2S stream replaces the whole chain
+            services = {"NMT": self._initialize_translation_service}
+        # Proto loading extends sys.path, so it happens before the threads start
+        health_protos()
+        try:
+            parts = PROFILE.run_parallel(services, cleanup=self._close_part)
+        except Exception:
+            # shutdown() never runs for an agent that failed to start
+            self.channels.close()
+            if self.recorder is not None:
+                self.recorder.close()
+            raise
+        self.asr_service = parts.get("ASR")
+        self.tts_service = parts.get("TTS")
+        self.anthropic_client = parts.get("Anthropic client")
+        self.translation_service = parts.get("NMT")
+        self.conversation = build_conversation(self.args)
+        self.response_cache = build_response_cache(self.args)
+        # Known commands are answered before the LLM; "repeat that" replays the last reply
+        self.last_reply = None
+        self.command_router = None if self.args.translate else build_command_router(self.args, self)
+        if self.command_router is not None and self.args.prerender_commands:
+            with PROFILE.step("command replies"):
+                self.command_router.prerender(self.tts_service.render)
+        serving = "NMT is" if self.args.translate else "ASR and TTS are"
+        logger.info(f"{serving} SERVING, ready in {(time.time() - start):.3f}s")
+        
+        # Barge-in state: set while a response is being spoken / after it was cut off
+        self._speaking = threading.Event()
+        self._interrupted = threading.Event()
+        self._llm_request = None
+        
+        # Speculation state: the pending stability timer and the request
+        # started from an interim hypothesis
+        self.speculation_stats = SpeculationStats() if self.args.speculate else None
+        self.speculator = None
+        if self.speculation_stats is not None:
+            self.speculator = Speculator(
+                self.args.speculation_window_ms, self._stream_anthropic, self.speculation_stats, self._speaking.is_set
+            )
     
     @staticmethod
     def _parse_args() -> argparse.Namespace:
@@ -55,47 +121,120 @@ class PerceptraAgent:
         Returns:
             argparse.Namespace: Parsed configuration arguments
         """
-        parser = argparse.ArgumentParser(
-            description="End-to-end speech agent with ASR and TTS",
-            formatter_class=argparse.ArgumentDefaultsHelpFormatter
-        )
-        
-        # Add ASR, TTS, and connection parameters
-        parser = riva.client.argparse_utils.add_asr_config_argparse_parameters(parser)
-        parser = riva.client.argparse_utils.add_connection_argparse_parameters(parser)
-        
-        # ASR parameters
-        parser.add_argument("--asr-server", default="localhost:50051", help="ASR server endpoint")
-        parser.add_argument("--tts-server", default="localhost:50052", help="TTS server endpoint")
-        parser.add_argument("--input-device", type=int, help="Input audio device")
-        parser.add_argument("--sample-rate-hz", type=int, default=16000, help="Audio sample rate")
-        parser.add_argument("--file-streaming-chunk", type=int, default=1600, help="Audio chunk size")
-        
-        # TTS parameters
-        parser.add_argument("--voice", help="Voice name for TTS")
-        parser.add_argument("--list-devices", action="store_true", help="List output audio devices")
-        parser.add_argument("--output-device", type=int, help="Output audio device")
-        parser.add_argument("--stream", action="store_true", help="Enable streaming synthesis")
-        parser.add_argument("--audio-prompt-file", type=Path, help="Zero-shot audio prompt file")
-        parser.add_argument("--quality", type=int, help="Decoder runs for audio quality")
-        parser.add_argument("--custom-dictionary", type=str, help="User dictionary file path")
-        
-        return parser.parse_args()
+        parser = build_arg_parser()
+        args = parser.parse_args()
+        if args.serve or args.async_runtime:
+            # Local commands and translation are only wired into this agent
+            sync_only = {
+                "--local-commands": args.local_commands,
+                "--command-file": args.command_file is not None,
+                "--prerender-commands": args.prerender_commands,
+                "--translate": args.translate,
+            }
+            used = [flag for flag, given in sync_only.items() if given]
+            if used:
+                runtime = "--serve" if args.serve else "--async-runtime"
+                parser.error(f"{', '.join(used)} not supported with {runtime}")
+        return args
     
     def _validate_config(self):
         """
         Validate configuration and ensure required environment variables are set.
         """
+        if self.args.translate:
+            if not self.args.target_language:
+                raise ValueError("--translate needs --target-language")
+            return
         if not os.environ.get("ANTHROPIC_API_KEY"):
             raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
     
-    def _initialize_anthropic_client(self) -> anthropic.Anthropic:
+    def _wait_until_ready(self, service, name: str):
+        """
+        Block until a backend of a NIM reports SERVING, then warm it up.
+        
+        Args:
+            service: ASRService, TTSService or TranslationService to wait for
+            name (str): Service name for the profile
+        
+        Raises:
+            RuntimeError: If no backend is serving within --startup-timeout
+        """
+        try:
+            with PROFILE.step(f"{name} SERVING"):
+                if not service.pool.wait_until_serving(self.args.startup_timeout):
+                    raise RuntimeError(f"No {name} endpoint is serving")
+            if not self.args.skip_warmup:
+                with PROFILE.step(f"{name} warm-up"):
+                    service.warm_up()
+        except Exception:
+            # The caller never gets the service, so release its pool and output device here
+            service.close()
+            raise
+    
+    @staticmethod
+    def _close_part(part):
+        """Release a service or client built by a startup step that succeeded while another failed"""
+        try:
+            part.close()
+        except Exception as e:
+            logger.warning(f"Error closing {type(part).__name__} after a failed startup: {e}")
+    
+    def _initialize_asr_service(self) -> ASRService:
+        """
+        Create the ASR service and wait until it is ready.
+        
+        Returns:
+            ASRService: Service bound to the shared ASR channel
+        """
+        asr_service = ASRService(self.args, self.channels, recorder=self.recorder, replay=self.replay)
+        self._wait_until_ready(asr_service, "ASR")
+        return asr_service
+    
+    def _initialize_tts_service(self) -> TTSService:
+        """
+        Create the TTS service, which opens the output device, probe the
+        input device while PortAudio is initialized, and wait until TTS is
+        ready.
+        
+        Returns:
+            TTSService: Service bound to the shared TTS channel
+        """
+        tts_service = TTSService(self.args, self.channels, recorder=self.recorder)
+        if tts_service.playback is not None:
+            with PROFILE.step("input device"):
+                probe_input_device(self.args)
+        self._wait_until_ready(tts_service, "TTS")
+        return tts_service
+    
+    def _initialize_translation_service(self) -> "TranslationService":
+        """
+        Create the S2S translation service, which opens the output device,
+        and wait until NMT is ready.
+        
+        Returns:
+            TranslationService: Service bound to the shared NMT channel
+        """
+        from translation_service import TranslationService
+
+        translation_service = TranslationService(self.args, self.channels)
+        if translation_service.playback is not None:
+            with PROFILE.step("input device"):
+                probe_input_device(self.args)
+        self._wait_until_ready(translation_service, "NMT")
+        return translation_service
+    
+    def _initialize_anthropic_client(self) -> "anthropic.Anthropic":
         """
         Initialize Anthropic client with default configuration.
         
+        The SDK is the slowest import of the agent, so it is loaded here,
+        concurrently with the other clients, rather than at module import.
+        
         Returns:
             anthropic.Anthropic: Configured Anthropic client
         """
+        import anthropic
+
         return anthropic.Anthropic()
     
     def _interact_with_anthropic(self, transcript: str) -> str:
@@ -108,20 +247,171 @@ class PerceptraAgent:
         Returns:
             str: AI-generated response
         """
-        # Limit the transcript to 100 characters if it's longer
-        limited_transcript = transcript[:100] if len(transcript) > 100 else transcript
+        return "".join(self._stream_anthropic(transcript))
+    
+    def _stream_anthropic(self, transcript: str, request: Optional[LLMRequest] = None) -> Iterator[str]:
+        """
+        Send transcript to Anthropic and yield the response text as it streams.
         
+        Args:
+            transcript (str): Transcribed speech input
+            request (LLMRequest): Holds this request's stream and failure flag
+        
+        Yields:
+            str: AI-generated text deltas
+        """
+        start = time.perf_counter()
+        if request is None:
+            request = LLMRequest()
+        if self.response_cache is not None:
+            reply = self.response_cache.get(transcript)
+            if reply is not None:
+                logger.info("LLM cache hit")
+                yield reply
+                return
+        if self.recorder is not None:
+            self.recorder.write(LLM_OPEN, limit_transcript(transcript).encode())
         try:
-            with self.anthropic_client.messages.stream(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1024,
-                system="You are a seasoned and a smart voice assistant. Do not perform any action without be specifically requested for",
-                messages=[{"role": "user", "content": limited_transcript}]
+            with messages_api(self.anthropic_client, self.args).stream(
+                **self.conversation.request(transcript)
             ) as stream:
-                return "".join(stream.text_stream)
+                request.attach(stream)
+                first = True
+                for text in stream.text_stream:
+                    if first:
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                        first = False
+                    if self.recorder is not None:
+                        self.recorder.write(LLM_TEXT, text.encode())
+                    yield text
+                message = stream.get_final_message()
+                self.conversation.record_usage(message.usage)
+            LLM_TOTAL.observe(time.perf_counter() - start)
+            if self.response_cache is not None and not request.closed:
+                self.response_cache.put(transcript, "".join(block.text for block in message.content if block.type == "text"))
         except Exception as e:
+            if request.closed:
+                return
             logger.error(f"Anthropic interaction error: {e}")
-            return "I'm sorry, I encountered an error processing your request."
+            request.failed = True
+            yield ERROR_RESPONSE
+        finally:
+            request.detach()
+    
+    def _observe_hypothesis(self, transcript: str, is_final: bool):
+        """
+        Speculation: restart the stability timer whenever the interim
+        hypothesis changes, and stop it on the final transcript.
+        """
+        if self.speculator is not None:
+            self.speculator.observe(transcript, is_final)
+    
+    def _take_speculation(self) -> Optional[SpeculativeReply]:
+        """Stop the stability timer and hand over the speculative request, if any"""
+        if self.speculator is None:
+            return None
+        return self.speculator.take()
+    
+    def _reply_deltas(self, transcript: str) -> Tuple[LLMRequest, Iterator[str]]:
+        """
+        The LLM reply for a final transcript: the speculative request if it
+        was started from the same words, otherwise a new request.
+        """
+        speculation = self._take_speculation()
+        if speculation is not None:
+            if speculation.matches(transcript):
+                self.speculation_stats.hit(time.perf_counter() - speculation.started_at)
+                return speculation.request, speculation.deltas()
+            speculation.cancel()
+            self.speculation_stats.miss(speculation.hypothesis, transcript)
+        request = LLMRequest()
+        return request, self._stream_anthropic(transcript, request)
+    
+    def _respond(self, transcript: str) -> str:
+        """
+        Stream the AI response for a transcript into TTS sentence by sentence.
+        
+        Args:
+            transcript (str): Transcribed speech input
+        
+        Returns:
+            str: The full response that was spoken
+        """
+        chunker = SentenceChunker(self.args.chunk_min_chars, self.args.chunk_max_chars)
+        self._interrupted.clear()
+        request, deltas = self._reply_deltas(transcript)
+        self._llm_request = request
+        self._speaking.set()
+        try:
+            spoken = self.tts_service.speak_stream(chunker.chunks(deltas))
+        finally:
+            self._speaking.clear()
+            self._llm_request = None
+        # An interrupted reply is remembered as far as it was spoken
+        if not request.failed:
+            self.conversation.record(transcript, spoken)
+            self.last_reply = spoken or self.last_reply
+        return spoken
+    
+    def _answer_locally(self, transcript: str) -> bool:
+        """
+        Answer a known command without the LLM: speak its text (from the
+        TTS cache when it was said before) or play its pre-rendered audio.
+        
+        Args:
+            transcript (str): Transcribed speech input
+        
+        Returns:
+            bool: Whether the command router answered the transcript
+        """
+        routed = self.command_router.route(transcript)
+        if routed is None:
+            return False
+        _, reply = routed
+        speculation = self._take_speculation()
+        if speculation is not None:
+            speculation.cancel()
+        self._interrupted.clear()
+        self._speaking.set()
+        try:
+            if reply.audio is not None:
+                logger.info(f" Perceptra: {reply.text or '(pre-rendered audio)'}")
+                self.tts_service.play_audio(reply.audio)
+            elif reply.text:
+                self.tts_service.speak_stream([reply.text])
+        finally:
+            self._speaking.clear()
+        if reply.text and reply.remember:
+            self.conversation.record(transcript, reply.text)
+            self.last_reply = reply.text
+        return True
+    
+    def _interrupt(self):
+        """
+        Cut off the response being spoken: cancel the LLM stream and the
+        in-flight synthesis, and drop any audio still queued for playback.
+        """
+        if not self._speaking.is_set() or self._interrupted.is_set():
+            return
+        logger.info("Barge-in detected, interrupting response")
+        self._interrupted.set()
+        self.tts_service.cancel()
+        request = self._llm_request
+        if request is not None:
+            request.close()
+    
+    def stop_speaking(self):
+        """Interrupt the response being spoken, for the "stop" command"""
+        self._interrupt()
+    
+    def _barges_in(self, transcript: str) -> bool:
+        """
+        Whether speech heard during playback should cut it off: enough words,
+        or a local command such as a single "stop".
+        """
+        if len(transcript.split()) >= self.args.barge_in_min_words:
+            return True
+        return self.command_router is not None and self.command_router.match(transcript) is not None
     
     def _is_shutdown_command(self, transcript: str) -> bool:
         """
@@ -134,6 +424,35 @@ class PerceptraAgent:
         """
         return transcript.strip().lower() in self.SHUTDOWN_COMMANDS
     
+    def _handle_turn(self, transcript: str) -> bool:
+        """
+        Respond to one user utterance.
+        
+        Args:
+            transcript (str): Transcribed speech input
+        
+        Returns:
+            bool: False if a shutdown command was received
+        """
+        set_log_fields(turn=next(self._turn_ids))
+        logger.info(f"Transcript: {transcript}")
+        
+        if self._is_shutdown_command(transcript):
+            logger.info("Shutdown command received. Exiting...")
+            return False
+        
+        if self.command_router is None or not self._answer_locally(transcript):
+            self._respond(transcript)
+        self._record_turn_latency()
+        return True
+    
+    def _record_turn_latency(self):
+        """Record end of user speech to first response audio for the last turn"""
+        speech_end = self.asr_service.speech_end
+        first_audio = self.tts_service.first_audio_at
+        if speech_end is not None and first_audio is not None and first_audio > speech_end:
+            TURN_LATENCY.observe(first_audio - speech_end)
+    
     def run(self) -> Union[None, Exception]:
         """
         Main speech processing loop with error handling and graceful shutdown.
@@ -141,7 +460,18 @@ class PerceptraAgent:
         Returns:
             Optional exception if shutdown is requested
         """
+        if self.args.profile_startup:
+            PROFILE.stop_import_timing()
+            PROFILE.log_report(logger)
         logger.info("Perceptra: I'm listening!")
+        start_exporters(self.args)
+        
+        if self.args.translate:
+            return self._run_translation()
+        if self.args.barge_in:
+            return self._run_with_barge_in()
+        if self.args.continuous:
+            return self._run_continuous()
         
         while not self.stop_event.is_set():
             try:
@@ -150,14 +480,8 @@ class PerceptraAgent:
                 if not transcript:
                     continue
                 
-                logger.info(f"Transcript: {transcript}")
-                
-                if self._is_shutdown_command(transcript):
-                    logger.info("Shutdown command received. Exiting...")
+                if not self._handle_turn(transcript):
                     return None
-                
-                response_text = self._interact_with_anthropic(transcript)
-                self.tts_service.synthesize_speech(response_text)
             
             except KeyboardInterrupt:
                 logger.info("Recording stopped by user")
@@ -166,22 +490,145 @@ class PerceptraAgent:
                 logger.error(f"Speech processing error: {e}")
                 time.sleep(1)
     
+    def _run_translation(self) -> None:
+        """
+        Speech-to-speech translation loop: every utterance is played back in
+        the target language as the server synthesizes it. There are no
+        transcripts, so the session ends with Ctrl+C rather than a shutdown
+        command.
+        """
+        try:
+            self.translation_service.run(self.stop_event)
+        except KeyboardInterrupt:
+            logger.info("Recording stopped by user")
+        return None
+    
+    def _run_continuous(self) -> None:
+        """
+        Speech loop over one continuous mic stream, delimited by server endpointing.
+        """
+        try:
+            for transcript in self._finals():
+                try:
+                    if not self._handle_turn(transcript):
+                        return None
+                except Exception as e:
+                    logger.error(f"Speech processing error: {e}")
+        except KeyboardInterrupt:
+            logger.info("Recording stopped by user")
+        return None
+    
+    def _finals(self) -> Iterator[str]:
+        """Final transcripts of the continuous stream, passing interim ones to speculation"""
+        for transcript, is_final in self.asr_service.listen_events(self.stop_event):
+            self._observe_hypothesis(transcript, is_final)
+            if is_final:
+                yield transcript
+    
+    def _run_with_barge_in(self) -> None:
+        """
+        Continuous speech loop that keeps ASR running while the agent speaks.
+        
+        ASR runs on a background thread. Speech detected during playback
+        interrupts the current response, and the interrupting utterance is
+        answered as the next turn.
+        """
+        transcripts = queue.Queue()
+        listener = threading.Thread(
+            target=self._listen_for_barge_in,
+            args=(transcripts,),
+            name="asr-listener",
+            daemon=True,
+        )
+        listener.start()
+        
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    transcript = transcripts.get(timeout=0.1)
+                except queue.Empty:
+                    # The listener only returns once the mic stream ends,
+                    # e.g. at the end of a replayed trace
+                    if not listener.is_alive():
+                        return None
+                    continue
+                try:
+                    if not self._handle_turn(transcript):
+                        return None
+                except Exception as e:
+                    logger.error(f"Speech processing error: {e}")
+        except KeyboardInterrupt:
+            logger.info("Recording stopped by user")
+        finally:
+            self.stop_event.set()
+        return None
+    
+    def _listen_for_barge_in(self, transcripts: queue.Queue):
+        """
+        ASR thread for barge-in mode: queue final transcripts as turns and
+        interrupt playback as soon as the user starts talking over it.
+        """
+        try:
+            for transcript, is_final in self.asr_service.listen_events(self.stop_event):
+                self._observe_hypothesis(transcript, is_final)
+                if self._barges_in(transcript):
+                    self._interrupt()
+                if is_final:
+                    transcripts.put(transcript)
+        except Exception as e:
+            logger.error(f"ASR listener error: {e}")
+    
     def shutdown(self):
         """
         Gracefully stop the agent and release resources.
         """
         self.stop_event.set()
         logger.info("Perceptra shutting down...")
+        if self.speculator is not None:
+            self.speculator.close()
+        self.conversation.log_stats()
+        if self.speculation_stats is not None:
+            self.speculation_stats.log_stats()
+        if self.command_router is not None:
+            self.command_router.log_stats()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        for service in (self.asr_service, self.tts_service, self.translation_service):
+            if service is not None:
+                service.close()
+        self.channels.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        stop_exporters(self.args)
 
 def main():
     """
     Main entry point for the Perceptra Speech Agent.
     """
+    with PROFILE.step(".env"):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+    args = PerceptraAgent._parse_args()
+    configure_logging(args)
+    if args.serve:
+        from session_server import serve
+        serve(args)
+        return
+    if args.async_runtime:
+        from async_agent import run_async
+        run_async(args)
+        return
+    
+    agent = None
     try:
-        agent = PerceptraAgent()
+        agent = PerceptraAgent(args)
         agent.run()
     except Exception as e:
         logger.error(f"Fatal error in Perceptra: {e}")
+    finally:
+        if agent is not None:
+            agent.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
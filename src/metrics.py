@@ -0,0 +1,275 @@
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+# Upper bounds in seconds; the last bucket catches everything above 30 s
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5,
+    0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0,
+)
+# Prompt token counts per LLM request
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram.
+
+    ``observe`` only bisects a tuple and bumps preallocated counters, so it
+    is cheap enough to call from the audio and gRPC threads.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict:
+        summary = {"count": self.count, "sum": round(self.sum, 6)}
+        for q in QUANTILES:
+            value = self.quantile(q)
+            summary[f"p{int(q * 100)}"] = None if value is None else round(value, 6)
+        summary["buckets"] = dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))
+        return summary
+
+    def prometheus_lines(self, prefix: str):
+        name = f"{prefix}_{self.name}"
+        with self._lock:
+            counts = list(self.counts)
+            total, total_sum = self.count, self.sum
+        yield f"# HELP {name} {self.help_text}"
+        yield f"# TYPE {name} histogram"
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f'{name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{le="+Inf"}} {total}'
+        yield f"{name}_sum {total_sum}"
+        yield f"{name}_count {total}"
+        yield f"# TYPE {name}_estimate gauge"
+        for q in QUANTILES:
+            value = self.quantile(q)
+            if value is not None:
+                yield f'{name}_estimate{{quantile="{q}"}} {value}'
+
+
+class Counter:
+    """Monotonic counter with one value per combination of label values"""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(label, "") for label in self.labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            values = dict(self.values)
+        return {
+            "count": sum(values.values()),
+            "values": {
+                ",".join(f"{label}={value}" for label, value in zip(self.labels, key)): count
+                for key, count in values.items()
+            },
+        }
+
+    def prometheus_lines(self, prefix: str):
+        name = f"{prefix}_{self.name}"
+        with self._lock:
+            values = dict(self.values)
+        yield f"# HELP {name} {self.help_text}"
+        yield f"# TYPE {name} counter"
+        for key, value in values.items():
+            labels = ",".join(f'{label}="{label_value}"' for label, label_value in zip(self.labels, key))
+            yield f"{name}{{{labels}}} {value}"
+
+
+class MetricsRegistry:
+    """Named histograms and counters plus Prometheus and JSON exporters"""
+
+    def __init__(self, prefix: str = "perceptra"):
+        self.prefix = prefix
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, Counter] = {}
+        self._server = None
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(name, help_text, buckets)
+        return self._histograms[name]
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        if name not in self._counters:
+            self._counters[name] = Counter(name, help_text, labels)
+        return self._counters[name]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        snapshot = {name: h.snapshot() for name, h in self._histograms.items()}
+        snapshot.update({name: c.snapshot() for name, c in self._counters.items()})
+        return snapshot
+
+    def prometheus_text(self) -> str:
+        lines = []
+        for histogram in self._histograms.values():
+            lines.extend(histogram.prometheus_lines(self.prefix))
+        for counter in self._counters.values():
+            lines.extend(counter.prometheus_lines(self.prefix))
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        logger.info(f"Metrics written to {path}")
+
+    def log_summary(self):
+        for name, histogram in self._histograms.items():
+            if histogram.count:
+                p50, p95, p99 = (histogram.quantile(q) for q in QUANTILES)
+                if name.endswith("_seconds"):
+                    logger.info(f"{name}: n={histogram.count} p50={p50:.3f}s p95={p95:.3f}s p99={p99:.3f}s")
+                else:
+                    logger.info(f"{name}: n={histogram.count} p50={p50:.0f} p95={p95:.0f} p99={p99:.0f}")
+        for name, counter in self._counters.items():
+            snapshot = counter.snapshot()
+            if snapshot["count"]:
+                logger.info(f"{name}: {snapshot['values']}")
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """Expose /metrics in Prometheus text format on a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Metrics available at http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+REGISTRY = MetricsRegistry()
+
+ASR_FINALIZATION = REGISTRY.histogram(
+    "asr_finalization_seconds", "Time from the last speech hypothesis to the final transcript"
+)
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time from sending the LLM request to the first text delta"
+)
+LLM_TOTAL = REGISTRY.histogram(
+    "llm_total_seconds", "Time from sending the LLM request to the end of the stream"
+)
+TTS_TIME_TO_FIRST_AUDIO = REGISTRY.histogram(
+    "tts_time_to_first_audio_seconds", "Time from a synthesis request to its first audio"
+)
+TURN_LATENCY = REGISTRY.histogram(
+    "turn_speech_end_to_audio_seconds", "Time from the end of user speech to the first response audio"
+)
+TRANSLATION_LATENCY = REGISTRY.histogram(
+    "translation_speech_end_to_audio_seconds", "Time from the end of user speech to the first translated audio (--translate)"
+)
+LLM_SPECULATION_HEAD_START = REGISTRY.histogram(
+    "llm_speculation_head_start_seconds", "How long a kept speculative LLM request ran before the final transcript"
+)
+TTS_CONTROLLER_DECISIONS = REGISTRY.counter(
+    "tts_controller_decisions_total", "Synthesis mode and quality chosen by the latency controller", ("mode", "quality")
+)
+LLM_CACHE_READ_TOKENS = REGISTRY.histogram(
+    "llm_cache_read_tokens", "Prompt tokens read from the Anthropic prompt cache per request", TOKEN_BUCKETS
+)
+LLM_CACHE_WRITE_TOKENS = REGISTRY.histogram(
+    "llm_cache_write_tokens", "Prompt tokens written to the Anthropic prompt cache per request", TOKEN_BUCKETS
+)
+ENDPOINT_REQUESTS = REGISTRY.counter(
+    "endpoint_requests_total", "RPCs sent to each ASR/TTS backend of an endpoint pool", ("service", "backend", "outcome")
+)
+ENDPOINT_LATENCY = REGISTRY.counter(
+    "endpoint_latency_seconds_total",
+    "Summed time to the first response (ASR transcript, TTS audio) per backend; divide by endpoint_latency_samples_total for the mean",
+    ("service", "backend"),
+)
+ENDPOINT_LATENCY_SAMPLES = REGISTRY.counter(
+    "endpoint_latency_samples_total", "Answered RPCs summed into endpoint_latency_seconds_total", ("service", "backend")
+)
+TTS_HEDGES = REGISTRY.counter(
+    "tts_hedges_total", "Batch synthesis requests hedged to a second backend, by which request answered first", ("winner",)
+)
+LOCAL_COMMANDS = REGISTRY.counter(
+    "local_commands_total", "Turns answered by the local command router without the LLM", ("command",)
+)
+SESSION_ADMISSION_WAIT = REGISTRY.histogram(
+    "session_admission_wait_seconds", "Time a new server session waited for a free slot"
+)
+
+
+def start_exporters(args):
+    """Start the Prometheus endpoint if --metrics-port is set"""
+    if args.metrics_port:
+        REGISTRY.serve(args.metrics_port)
+
+
+def stop_exporters(args):
+    """Log a latency summary, write --metrics-json and stop the endpoint"""
+    REGISTRY.log_summary()
+    if args.metrics_json:
+        REGISTRY.dump_json(args.metrics_json)
+    REGISTRY.close()
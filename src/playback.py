@@ -0,0 +1,244 @@
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+
+class JitterBuffer:
+    """
+    Bounded byte ring buffer sitting between synthesis and the audio device.
+
+    Writers block while the buffer is full (backpressure), the reader blocks
+    while it is empty. Reads are always a whole number of frames.
+    """
+
+    def __init__(self, capacity_bytes: int, frame_bytes: int = 2):
+        capacity_bytes -= capacity_bytes % frame_bytes
+        self.capacity = max(capacity_bytes, frame_bytes)
+        self.frame_bytes = frame_bytes
+        self._buf = bytearray(self.capacity)
+        self._read_pos = 0
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Bumped by clear() so writers blocked on a full buffer give up
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def write(self, data, timeout: Optional[float] = None) -> int:
+        """
+        Copy data into the buffer, blocking while it is full.
+
+        Args:
+            data: bytes-like PCM data
+            timeout (Optional[float]): Give up after this many seconds
+
+        Returns:
+            int: Number of bytes written (less than len(data) on timeout,
+            clear or close)
+        """
+        view = memoryview(data).cast("B")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        written = 0
+        with self._cond:
+            epoch = self._epoch
+            while written < len(view):
+                while self._size == self.capacity and not self._closed and epoch == self._epoch:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return written
+                    self._cond.wait(remaining)
+                if self._closed or epoch != self._epoch:
+                    return written
+
+                write_pos = (self._read_pos + self._size) % self.capacity
+                n = min(len(view) - written, self.capacity - self._size, self.capacity - write_pos)
+                self._buf[write_pos:write_pos + n] = view[written:written + n]
+                self._size += n
+                written += n
+                self._cond.notify_all()
+        return written
+
+    def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        """
+        Take up to max_bytes of whole frames out of the buffer.
+
+        Returns an empty bytes object on timeout or once closed and drained.
+        """
+        with self._cond:
+            if self._size < self.frame_bytes and not self._closed:
+                self._cond.wait_for(lambda: self._size >= self.frame_bytes or self._closed, timeout)
+            n = min(max_bytes, self._size)
+            n -= n % self.frame_bytes
+            if n <= 0:
+                return b""
+
+            end = self._read_pos + n
+            if end <= self.capacity:
+                out = bytes(self._buf[self._read_pos:end])
+            else:
+                out = bytes(self._buf[self._read_pos:]) + bytes(self._buf[:end - self.capacity])
+            self._read_pos = end % self.capacity
+            self._size -= n
+            self._cond.notify_all()
+            return out
+
+    def clear(self) -> int:
+        """Drop all buffered audio and return how many bytes were dropped"""
+        with self._cond:
+            dropped = self._size
+            self._read_pos = 0
+            self._size = 0
+            self._epoch += 1
+            self._cond.notify_all()
+            return dropped
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class PlaybackEngine:
+    """
+    Long-lived audio output: one device stream, one writer thread, one jitter buffer.
+
+    Synthesis pushes PCM into the engine with ``write`` and returns as soon as
+    the data fits in the buffer; the writer thread feeds the device in small
+    periods so the device is opened once per process rather than once per turn.
+    ``volume`` scales what is written from the next period on, and
+    ``notify_first_audio`` reports when sound actually reaches the device.
+    """
+
+    def __init__(
+        self,
+        output_device: Optional[int],
+        framerate: int,
+        nchannels: int = 1,
+        sampwidth: int = 2,
+        buffer_ms: int = 2000,
+        period_ms: int = 20,
+    ):
+        self.output_device = output_device
+        self.framerate = framerate
+        self.nchannels = nchannels
+        self.sampwidth = sampwidth
+        self.volume = 1.0
+
+        frame_bytes = nchannels * sampwidth
+        self.period_bytes = max(frame_bytes, framerate * period_ms // 1000 * frame_bytes)
+        self.buffer = JitterBuffer(framerate * buffer_ms // 1000 * frame_bytes, frame_bytes)
+
+        self._sound_stream = None
+        self._writer = None
+        self._running = False
+        # Byte counters let drain() tell "buffer empty" apart from "device done"
+        self._queued = 0
+        self._played = 0
+        self._progress = threading.Condition()
+        self._first_audio_callback: Optional[Callable[[float], None]] = None
+
+    def start(self):
+        """Open the output device and start the writer thread"""
+        if self._running:
+            return
+        import riva.client.audio_io
+
+        self._sound_stream = riva.client.audio_io.SoundCallBack(
+            self.output_device,
+            nchannels=self.nchannels,
+            sampwidth=self.sampwidth,
+            framerate=self.framerate,
+        )
+        self._running = True
+        self._writer = threading.Thread(target=self._write_loop, name="playback-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"Playback engine started at {self.framerate} Hz")
+
+    def write(self, audio) -> int:
+        """Queue PCM for playback, blocking while the jitter buffer is full"""
+        if not self._running:
+            return 0
+        with self._progress:
+            self._queued += len(audio)
+        written = self.buffer.write(audio)
+        if written < len(audio):
+            self._account(len(audio) - written)
+        return written
+
+    def notify_first_audio(self, callback: Optional[Callable[[float], None]]):
+        """
+        Call ``callback`` once, on the writer thread, with the perf_counter()
+        time the next period with non-silent samples was written to the
+        device. Replaces any callback that has not fired yet.
+        """
+        self._first_audio_callback = callback
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all queued audio has been handed to the device"""
+        if not self._running:
+            return True
+        with self._progress:
+            return self._progress.wait_for(lambda: self._played >= self._queued, timeout)
+
+    def flush(self):
+        """Discard queued audio that has not reached the device yet"""
+        self._account(self.buffer.clear())
+
+    def close(self):
+        """Stop the writer thread and close the device"""
+        if not self._running:
+            return
+        self._running = False
+        self.buffer.close()
+        with self._progress:
+            self._played = self._queued
+            self._progress.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout=2)
+        if self._sound_stream is not None:
+            self._sound_stream.close()
+            self._sound_stream = None
+
+    def _account(self, nbytes: int):
+        with self._progress:
+            self._played += nbytes
+            self._progress.notify_all()
+
+    def _dtype(self) -> str:
+        return "<f4" if self.sampwidth == 4 else "<i2"
+
+    def _audible(self, data: bytes) -> bool:
+        return bool(np.count_nonzero(np.frombuffer(data, dtype=self._dtype())))
+
+    def _scaled(self, data: bytes) -> bytes:
+        dtype = self._dtype()
+        samples = np.frombuffer(data, dtype=dtype) * self.volume
+        if dtype == "<i2":
+            samples = np.clip(samples, -32768, 32767)
+        return samples.astype(dtype).tobytes()
+
+    def _write_loop(self):
+        while self._running:
+            data = self.buffer.read(self.period_bytes, timeout=0.1)
+            if not data:
+                continue
+            if self.volume != 1.0:
+                data = self._scaled(data)
+            try:
+                self._sound_stream(data)
+            except Exception as e:
+                logger.error(f"Playback error: {e}", extra={"rate_limit": 1.0})
+            # Before accounting, so the stamp is in place once drain() returns
+            callback = self._first_audio_callback
+            if callback is not None and self._audible(data):
+                self._first_audio_callback = None
+                callback(time.perf_counter())
+            self._account(len(data))
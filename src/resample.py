@@ -0,0 +1,173 @@
+from math import gcd
+from typing import Iterable, Iterator
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Playback sample formats: numpy dtype and bytes per sample. PyAudio opens a
+# 4-byte stream as float32, so there is no 32-bit integer format.
+SAMPLE_FORMATS = {
+    "s16": ("<i2", 2),
+    "f32": ("<f4", 4),
+}
+# Filter length in zero crossings of the sinc on each side, and the share of
+# the lower Nyquist frequency that is passed
+ZERO_CROSSINGS = 16
+ROLLOFF = 0.94
+KAISER_BETA = 8.6
+
+
+def design_polyphase_filter(up: int, down: int) -> np.ndarray:
+    """
+    Kaiser-windowed sinc low-pass for rational resampling by ``up / down``,
+    split into ``up`` phases.
+
+    Returns:
+        np.ndarray: float32 array of shape (up, taps), each row reversed so
+            that its last tap multiplies the newest input sample
+    """
+    # Taps per phase grow with the decimation factor so the transition band
+    # stays equally sharp when downsampling
+    taps = int(np.ceil(2 * ZERO_CROSSINGS * max(1.0, down / up)))
+    length = taps * up
+    cutoff = ROLLOFF * 0.5 / max(up, down)
+    t = np.arange(length) - (length - 1) / 2
+    prototype = 2 * cutoff * up * np.sinc(2 * cutoff * t) * np.kaiser(length, KAISER_BETA)
+    phases = prototype.reshape(taps, up).T
+    return np.ascontiguousarray(phases[:, ::-1], dtype=np.float32)
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler for frames of shape (samples, channels).
+
+    Output sample ``n`` sits at ``n * down / up`` input samples. It is the
+    dot product of the filter phase ``(n * down) % up`` with the ``taps``
+    input samples ending at ``(n * down) // up``. For a whole chunk the
+    windows are gathered from a strided view of the input, so the filter
+    runs as one vectorized product. The last ``taps - 1`` input samples and
+    the output phase carry over to the next chunk, which keeps chunk
+    boundaries seamless.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, channels: int = 1):
+        divisor = gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        self.channels = channels
+        self.filter = design_polyphase_filter(self.up, self.down)
+        self.taps = self.filter.shape[1]
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros((self.taps - 1, self.channels), dtype=np.float32)
+        # Position of the next output in upsampled units, relative to the
+        # first sample of the next chunk
+        self._position = 0
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        frames = frames.reshape(-1, self.channels)
+        count = len(frames)
+        buffer = np.concatenate((self._history, frames.astype(np.float32, copy=False)))
+        self._history = buffer[count:]
+        outputs = -(-(count * self.up - self._position) // self.down)
+        if outputs <= 0:
+            self._position -= count * self.up
+            return np.empty((0, self.channels), dtype=np.float32)
+
+        positions = self._position + np.arange(outputs) * self.down
+        self._position += outputs * self.down - count * self.up
+        # windows[j] holds the taps input samples ending at frames[j]
+        windows = sliding_window_view(buffer, self.taps, axis=0)
+        return np.einsum("nck,nk->nc", windows[positions // self.up], self.filter[positions % self.up])
+
+    def flush(self) -> np.ndarray:
+        """Push out the samples still inside the filter, then start over"""
+        tail = self.process(np.zeros((self.taps // 2, self.channels), dtype=np.float32))
+        self.reset()
+        return tail
+
+
+class AudioConverter:
+    """
+    Converts 16-bit interleaved PCM between sample rates, channel counts and
+    sample formats, one chunk at a time.
+
+    Chunks are read through ``np.frombuffer`` on a memoryview, so the input
+    is not copied. A chunk that needs no conversion is returned as it came.
+    Incomplete frames at the end of a chunk are carried over to the next one.
+    """
+
+    def __init__(
+        self,
+        in_rate: int,
+        out_rate: int,
+        in_channels: int = 1,
+        out_channels: int = 1,
+        out_format: str = "s16",
+    ):
+        if in_channels != out_channels and 1 not in (in_channels, out_channels):
+            raise ValueError(f"Cannot convert {in_channels} channels to {out_channels}")
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.out_dtype, self.out_width = SAMPLE_FORMATS[out_format]
+        self.in_frame = 2 * in_channels
+        self.passthrough = in_rate == out_rate and in_channels == out_channels and out_format == "s16"
+        self.resampler = PolyphaseResampler(in_rate, out_rate, in_channels) if in_rate != out_rate else None
+        self._partial = b""
+
+    @property
+    def out_frame(self) -> int:
+        return self.out_width * self.out_channels
+
+    def convert(self, chunk) -> bytes:
+        if self.passthrough:
+            return chunk
+        view = memoryview(chunk).cast("B")
+        if self._partial:
+            view = memoryview(self._partial + view.tobytes())
+            self._partial = b""
+        whole = len(view) - len(view) % self.in_frame
+        if whole < len(view):
+            self._partial = view[whole:].tobytes()
+        frames = np.frombuffer(view[:whole], dtype="<i2").reshape(-1, self.in_channels)
+        if self.resampler is not None:
+            frames = self.resampler.process(frames)
+        return self._encode(frames)
+
+    def _encode(self, frames: np.ndarray) -> bytes:
+        if self.out_channels != self.in_channels:
+            if self.out_channels == 1:
+                frames = frames.mean(axis=1, keepdims=True)
+            else:
+                frames = np.repeat(frames, self.out_channels, axis=1)
+        if self.out_dtype == "<i2":
+            if frames.dtype != np.int16:
+                frames = np.clip(np.rint(frames), -32768, 32767)
+            return frames.astype("<i2", copy=False).tobytes()
+        return (frames * (1 / 32768)).astype(self.out_dtype).tobytes()
+
+    def flush(self) -> bytes:
+        """Remaining output at the end of a stream; the converter can be reused afterwards"""
+        self._partial = b""
+        if self.resampler is None:
+            return b""
+        return self._encode(self.resampler.flush())
+
+    def reset(self):
+        """Drop buffered input, e.g. when playback is interrupted"""
+        self._partial = b""
+        if self.resampler is not None:
+            self.resampler.reset()
+
+    def stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Convert a chunk iterator, skipping empty outputs and appending the tail"""
+        for chunk in chunks:
+            data = self.convert(chunk)
+            if data:
+                yield data
+        tail = self.flush()
+        if tail:
+            yield tail
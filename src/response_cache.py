@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+FILLER_WORDS = {"um", "umm", "uh", "uhh", "uhm", "er", "erm", "ah", "eh", "hmm", "mm", "mhm"}
+# Questions whose answer depends on the moment or on earlier turns
+DEFAULT_DENY = (
+    r"\b(now|today|tonight|tomorrow|yesterday|current|currently|latest|weather|news)\b",
+    r"\b(remind|remember|earlier|again|previous|last one)\b",
+    r"\b(it|that|this|these|those|they|them|he|she|him|her)\b",
+    r"\btime is it\b",
+)
+_PUNCTUATION = re.compile(r"[^\w\s']|_")
+
+
+def normalize_transcript(transcript: str) -> str:
+    """Lowercase, drop punctuation and filler words, collapse whitespace"""
+    words = _PUNCTUATION.sub(" ", transcript.lower()).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+class ResponseCache:
+    """
+    LLM replies keyed by normalized transcript.
+
+    Entries expire ``ttl_seconds`` after they were stored and the least
+    recently used entry is evicted beyond ``max_entries``. With ``path`` set,
+    every store is appended to a JSON-lines file that is replayed (skipping
+    expired entries) on startup and rewritten compactly on ``close``.
+
+    A transcript is only cached if it matches no deny pattern and, when
+    allow patterns are given, at least one of them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        path: Optional[Union[str, Path]] = None,
+        allow: Iterable[str] = (),
+        deny: Iterable[str] = DEFAULT_DENY,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path).expanduser() if path else None
+        self.allow = [re.compile(pattern) for pattern in allow]
+        self.deny = [re.compile(pattern) for pattern in deny]
+
+        # normalized transcript -> (stored at, reply), oldest use first
+        self._entries: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._log = None
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._load()
+            self._log = open(self.path, "a", encoding="utf-8")
+
+    def cacheable(self, key: str) -> bool:
+        if not key or any(pattern.search(key) for pattern in self.deny):
+            return False
+        return not self.allow or any(pattern.search(key) for pattern in self.allow)
+
+    def get(self, transcript: str) -> Optional[str]:
+        """Cached reply for a transcript, or None on a miss or bypass"""
+        key = normalize_transcript(transcript)
+        with self._lock:
+            if not self.cacheable(key):
+                self.bypassed += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, transcript: str, reply: str):
+        """Store a complete reply; ignored for transcripts that bypass the cache"""
+        key = normalize_transcript(transcript)
+        if not reply or not self.cacheable(key):
+            return
+        stored_at = time.time()
+        with self._lock:
+            self._store(key, stored_at, reply)
+            if self._log is not None:
+                try:
+                    self._log.write(json.dumps({"key": key, "at": stored_at, "reply": reply}, ensure_ascii=False) + "\n")
+                    self._log.flush()
+                except OSError as e:
+                    logger.warning(f"LLM cache: could not write entry: {e}")
+
+    def _store(self, key: str, stored_at: float, reply: str):
+        self._entries.pop(key, None)
+        self._entries[key] = (stored_at, reply)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Hit/miss/bypass counters and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        now = time.time()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        if now - record["at"] < self.ttl_seconds:
+                            self._store(record["key"], record["at"], record["reply"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError as e:
+            logger.warning(f"LLM cache: could not read {self.path}: {e}")
+            return
+        logger.info(f"LLM cache: {len(self._entries)} entries loaded from {self.path}")
+
+    def close(self):
+        """Log the hit rate and rewrite the backing file with only the live entries"""
+        logger.info(f"LLM cache stats: {self.stats()}")
+        if self.path is None:
+            return
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            now = time.time()
+            tmp = self.path.with_suffix(".tmp")
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for key, (stored_at, reply) in self._entries.items():
+                        if now - stored_at < self.ttl_seconds:
+                            f.write(json.dumps({"key": key, "at": stored_at, "reply": reply}, ensure_ascii=False) + "\n")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning(f"LLM cache: could not compact {self.path}: {e}")
+
+
+def build_response_cache(args):
+    """Create the LLM response cache configured on the command line, if any"""
+    if args.llm_cache_size <= 0:
+        return None
+    return ResponseCache(
+        args.llm_cache_size,
+        args.llm_cache_ttl,
+        path=args.llm_cache_file,
+        allow=args.llm_cache_allow or (),
+        deny=DEFAULT_DENY + tuple(args.llm_cache_deny or ()),
+    )
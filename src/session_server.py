@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import itertools
+import time
+
+import anthropic
+import grpc
+
+from async_agent import AsyncASRService, AsyncPerceptraAgent, AsyncTTSService, open_aio_channel
+from channels import MAX_MESSAGE_BYTES, load_protos
+from metrics import SESSION_ADMISSION_WAIT, start_exporters, stop_exporters
+from response_cache import build_response_cache
+from shared_logging import log_context, setup_logger
+from tts_controller import build_tts_controller
+from tts_service import build_tts_cache, load_custom_dictionary
+
+logger = setup_logger()
+
+
+def session_protos():
+    """perceptra.v1 messages and stubs from proto/perceptra_session.proto"""
+    return load_protos("perceptra_session.proto")
+
+
+class RemoteSession(AsyncPerceptraAgent):
+    """
+    One remote caller.
+
+    Runs the same listen/respond pipeline as AsyncPerceptraAgent, but audio
+    comes from the client's Converse stream and responses go back into a
+    bounded outbox instead of local devices. Channels, the TTS cache and the
+    Anthropic client belong to the server and are shared by all sessions.
+    """
+
+    def __init__(self, server: "SessionServer", session_id: int):
+        self.server = server
+        self.session_id = session_id
+        self.messages = server.messages
+        self.outbox = asyncio.Queue(maxsize=server.args.session_queue_size)
+        super().__init__(
+            server.args,
+            asr_service=AsyncASRService(server.args, channel=server.asr_channel),
+            tts_service=AsyncTTSService(
+                server.args,
+                channel=server.tts_channel,
+                cache=server.tts_cache,
+                sink=self._send_audio,
+                controller=server.tts_controller,
+                custom_dictionary=server.custom_dictionary,
+            ),
+            anthropic_client=server.anthropic_client,
+            response_cache=server.response_cache,
+        )
+
+    async def _send_audio(self, audio):
+        await self.outbox.put(self.messages.ServerMessage(audio=bytes(audio)))
+
+    async def _announce(self, sentence: str):
+        await self.outbox.put(self.messages.ServerMessage(response_text=sentence))
+
+    def _interrupt(self):
+        super()._interrupt()
+        if not self._interrupted:
+            return
+        # Drop response audio that has not been sent yet, keep other events
+        pending = []
+        while not self.outbox.empty():
+            message = self.outbox.get_nowait()
+            if message.WhichOneof("event") != "audio":
+                pending.append(message)
+        for message in pending:
+            self.outbox.put_nowait(message)
+
+    def _speculate(self, hypothesis: str):
+        # Speculative LLM requests would run outside --max-active-turns, so
+        # only speculate while the server has a turn slot to spare
+        if self.server.turn_slots.locked():
+            self._speculation_timer = None
+            return
+        super()._speculate(hypothesis)
+
+    async def _read_client(self, request_iterator, audio_queue: asyncio.Queue):
+        # Awaiting a bounded queue pushes back on the client through gRPC flow control
+        async for message in request_iterator:
+            if message.audio:
+                await audio_queue.put(message.audio)
+
+    async def _answer(self, transcripts: asyncio.Queue):
+        while True:
+            transcript = await transcripts.get()
+            logger.info(f"[session {self.session_id}] Transcript: {transcript}")
+            await self.outbox.put(self.messages.ServerMessage(transcript=transcript))
+            if self._is_shutdown_command(transcript):
+                return
+            async with self.server.turn_slots:
+                completed = await self._take_turn(transcript)
+            await self.outbox.put(
+                self.messages.ServerMessage(turn_end=self.messages.TurnEnd(completed=completed))
+            )
+
+    async def run(self, request_iterator):
+        """Serve the session until the client closes its stream or says a shutdown command"""
+        audio_queue = asyncio.Queue(maxsize=self.args.session_queue_size)
+        transcripts = asyncio.Queue()
+        reader = asyncio.create_task(self._read_client(request_iterator, audio_queue))
+        listener = asyncio.create_task(self._listen(audio_queue, transcripts))
+        answerer = asyncio.create_task(self._answer(transcripts))
+        try:
+            await asyncio.wait({reader, answerer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if self._current_turn is not None:
+                self._current_turn.cancel()
+            self._cancel_speculation()
+            for task in (reader, listener, answerer):
+                task.cancel()
+            await asyncio.gather(reader, listener, answerer, return_exceptions=True)
+            if self.vad is not None:
+                self.vad.log_stats(f"[session {self.session_id}] VAD")
+            self.conversation.log_stats(f"[session {self.session_id}] Conversation")
+            if self.speculation_stats is not None:
+                self.speculation_stats.log_stats(f"[session {self.session_id}] Speculation")
+
+
+class SessionServer:
+    """
+    gRPC VoiceSession server.
+
+    Admission control: at most --max-sessions sessions run at once; a new
+    caller waits up to --admission-timeout for a slot and is rejected with
+    RESOURCE_EXHAUSTED otherwise. Across admitted sessions at most
+    --max-active-turns turns run the LLM and TTS stages concurrently.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.messages, self.services = session_protos()
+        self.asr_channel = open_aio_channel(args, args.asr_server)
+        self.tts_channel = open_aio_channel(args, args.tts_server)
+        self.tts_cache = build_tts_cache(args)
+        # Parsed once; every session's synthesis and cache keys use the same mapping
+        self.custom_dictionary = load_custom_dictionary(args.custom_dictionary)
+        # One latency model for the TTS server every session talks to
+        self.tts_controller = build_tts_controller(args, 20 if args.quality is None else args.quality)
+        self.anthropic_client = anthropic.AsyncAnthropic()
+        self.response_cache = build_response_cache(args)
+        self.session_slots = asyncio.Semaphore(args.max_sessions)
+        self.turn_slots = asyncio.Semaphore(args.max_active_turns)
+        self._ids = itertools.count(1)
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._server = None
+
+    async def Converse(self, request_iterator, context):
+        waited = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.session_slots.acquire(), timeout=self.args.admission_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            logger.warning(f"Rejecting session: {self.active} active (limit {self.args.max_sessions})")
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Server is at its session limit")
+        SESSION_ADMISSION_WAIT.observe(time.perf_counter() - waited)
+
+        self.active += 1
+        self.admitted += 1
+        session_id = next(self._ids)
+        logger.info(f"[session {session_id}] started ({self.active}/{self.args.max_sessions} active)")
+        task = None
+        try:
+            # Everything the session's tasks log carries its ID
+            with log_context(session=session_id):
+                session = RemoteSession(self, session_id)
+                task = asyncio.create_task(session.run(request_iterator))
+            while True:
+                if session.outbox.empty():
+                    getter = asyncio.ensure_future(session.outbox.get())
+                    await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        getter.cancel()
+                        break
+                    yield getter.result()
+                else:
+                    yield session.outbox.get_nowait()
+            while not session.outbox.empty():
+                yield session.outbox.get_nowait()
+        finally:
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            self.active -= 1
+            self.session_slots.release()
+            logger.info(f"[session {session_id}] ended ({self.active} active)")
+
+    async def start(self):
+        """Wait for the NIMs, then accept sessions on --listen"""
+        start = time.time()
+        await asyncio.gather(
+            AsyncASRService(self.args, channel=self.asr_channel).warm_up(),
+            AsyncTTSService(
+                self.args,
+                channel=self.tts_channel,
+                cache=self.tts_cache,
+                sink=self._discard,
+                custom_dictionary=self.custom_dictionary,
+            ).warm_up(),
+        )
+        logger.info(f"ASR and TTS are SERVING, ready in {(time.time() - start):.3f}s")
+
+        self._server = grpc.aio.server(
+            options=[
+                ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+                ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+            ]
+        )
+        # The generated registration only looks up Converse, so the server is its own servicer
+        self.services.add_VoiceSessionServicer_to_server(self, self._server)
+        self._server.add_insecure_port(self.args.listen)
+        await self._server.start()
+        start_exporters(self.args)
+        logger.info(f"Serving voice sessions on {self.args.listen}")
+
+    @staticmethod
+    async def _discard(audio):
+        pass
+
+    async def wait(self):
+        await self._server.wait_for_termination()
+
+    async def close(self):
+        logger.info(f"Session server stopping: {self.admitted} sessions served, {self.rejected} rejected")
+        if self._server is not None:
+            await self._server.stop(grace=5)
+        await self.asr_channel.close()
+        await self.tts_channel.close()
+        if self.tts_cache is not None:
+            logger.info(f"TTS cache stats: {self.tts_cache.stats()}")
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self.tts_controller is not None:
+            self.tts_controller.log_stats()
+        stop_exporters(self.args)
+
+
+async def _serve(args: argparse.Namespace):
+    # Channels and the server bind to the running loop, so build them inside it
+    server = SessionServer(args)
+    try:
+        await server.start()
+        await server.wait()
+    finally:
+        await server.close()
+
+
+def serve(args: argparse.Namespace):
+    """Run the session server until Ctrl+C"""
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        logger.info("Session server stopped by user")
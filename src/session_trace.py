@@ -0,0 +1,229 @@
+import json
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+MAGIC = b"PTRC\x01"
+# kind (u8), nanoseconds since the trace started (i64), payload length (u32)
+HEADER = struct.Struct("<BqI")
+
+# Record kinds. Each *_OPEN record starts a mic stream, RPC or LLM request;
+# the records after it belong to it until the next *_OPEN of the same kind.
+META = 0  # JSON: recording settings
+MIC_OPEN = 1
+MIC_AUDIO = 2  # 16-bit PCM at the capture rate
+ASR_OPEN = 3
+ASR_RESPONSE = 4  # serialized StreamingRecognizeResponse
+LLM_OPEN = 5  # UTF-8 user message as sent
+LLM_TEXT = 6  # UTF-8 text delta
+TTS_OPEN = 7  # JSON: text and streaming flag
+TTS_AUDIO = 8  # 16-bit PCM at the TTS rate, after --tts-encoding is decoded
+KIND_NAMES = {
+    META: "meta",
+    MIC_OPEN: "mic_open",
+    MIC_AUDIO: "mic_audio",
+    ASR_OPEN: "asr_open",
+    ASR_RESPONSE: "asr_response",
+    LLM_OPEN: "llm_open",
+    LLM_TEXT: "llm_text",
+    TTS_OPEN: "tts_open",
+    TTS_AUDIO: "tts_audio",
+}
+FLUSH_SECONDS = 1.0
+
+
+class TraceWriter:
+    """
+    Append-only binary trace of one session (``--record-trace``).
+
+    Every record is a 13 byte header followed by its payload, timestamped
+    with the monotonic clock relative to the start of the trace. Records are
+    written from the ASR, TTS and LLM threads under one lock into a buffered
+    file that is flushed at most once a second, so recording adds no system
+    call per audio chunk. A trace cut short by a crash stays readable up to
+    its last complete record.
+    """
+
+    def __init__(self, path: Path, meta: Dict):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter_ns()
+        self._flushed = time.perf_counter()
+        self.records = dict.fromkeys(KIND_NAMES, 0)
+        self.bytes = 0
+        self.write(META, json.dumps(meta).encode())
+
+    def write(self, kind: int, payload=b""):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(HEADER.pack(kind, time.perf_counter_ns() - self._start, len(payload)))
+            self._file.write(payload)
+            self.records[kind] += 1
+            self.bytes += HEADER.size + len(payload)
+            now = time.perf_counter()
+            if now - self._flushed >= FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed = now
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+        counts = {KIND_NAMES[kind]: count for kind, count in self.records.items() if count}
+        logger.info(f"Session trace written to {self.path}: {self.bytes} bytes, {counts}")
+
+
+def read_trace(path: Path) -> Iterator[Tuple[int, float, bytes]]:
+    """
+    Records of a trace file in order.
+
+    Yields:
+        Tuple[int, float, bytes]: Kind, seconds since the trace started and payload
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session trace")
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            kind, nanoseconds, length = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield kind, nanoseconds / 1e9, payload
+
+
+class Exchange(NamedTuple):
+    """One mic stream, RPC or LLM request and what it carried, with offsets from its start"""
+    start: float
+    request: bytes
+    items: List[Tuple[float, bytes]]
+
+
+class SessionTrace:
+    """A trace file grouped into mic streams, ASR RPCs, LLM requests and TTS requests"""
+
+    def __init__(self, path: Path):
+        self.meta = {}
+        self.mic: List[Exchange] = []
+        self.asr: List[Exchange] = []
+        self.llm: List[Exchange] = []
+        self.tts: List[Exchange] = []
+        groups = {MIC_AUDIO: self.mic, ASR_RESPONSE: self.asr, LLM_TEXT: self.llm, TTS_AUDIO: self.tts}
+        opens = {MIC_OPEN: self.mic, ASR_OPEN: self.asr, LLM_OPEN: self.llm, TTS_OPEN: self.tts}
+        for kind, seconds, payload in read_trace(path):
+            if kind == META:
+                self.meta = json.loads(payload)
+            elif kind in opens:
+                opens[kind].append(Exchange(seconds, payload, []))
+            elif kind in groups and groups[kind]:
+                exchange = groups[kind][-1]
+                exchange.items.append((seconds - exchange.start, payload))
+
+    @property
+    def duration(self) -> float:
+        ends = [e.start + (e.items[-1][0] if e.items else 0.0) for e in self.mic + self.asr + self.llm + self.tts]
+        return max(ends, default=0.0)
+
+
+class TraceMicrophone:
+    """Drop-in for riva's MicrophoneStream that plays back one recorded mic stream at the recorded pace"""
+
+    def __init__(self, chunks: List[Tuple[float, bytes]], speed: float):
+        self.chunks = chunks
+        self.speed = speed
+        self.closed = True
+        self._index = 0
+        self._start = None
+
+    def __enter__(self):
+        self.closed = False
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.closed = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        if self.closed or self._index >= len(self.chunks):
+            self.closed = True
+            raise StopIteration
+        offset, chunk = self.chunks[self._index]
+        self._index += 1
+        delay = self._start + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return chunk
+
+
+class TraceReplay:
+    """
+    Mic side of ``--replay-trace``: each time the agent opens the microphone
+    it gets the next recorded mic stream. Once all were played, opening the
+    microphone sets ``stop_event`` so the agent finishes its last turn and exits.
+    """
+
+    def __init__(self, trace: SessionTrace, speed: float = 1.0, stop_event: Optional[threading.Event] = None):
+        self.trace = trace
+        self.speed = speed
+        self.stop_event = stop_event
+        self._streams = list(trace.mic)
+        self._lock = threading.Lock()
+
+    def microphone(self) -> TraceMicrophone:
+        with self._lock:
+            stream = self._streams.pop(0) if self._streams else None
+        if stream is None:
+            logger.info("Replayed trace has no more mic audio")
+            if self.stop_event is not None:
+                self.stop_event.set()
+            return TraceMicrophone([], self.speed)
+        return TraceMicrophone(stream.items, self.speed)
+
+
+def trace_mode(args) -> str:
+    if args.barge_in:
+        return "barge_in"
+    return "continuous" if args.continuous else "window"
+
+
+def build_trace_writer(args) -> Optional[TraceWriter]:
+    """Open the --record-trace file, or None if no trace is recorded"""
+    if args.record_trace is None:
+        return None
+    from agent_config import audio_rates
+
+    meta = {
+        "started": time.time(),
+        "mode": trace_mode(args),
+        "rates": audio_rates(args)._asdict(),
+        "stream": args.stream,
+        "vad": args.vad,
+    }
+    return TraceWriter(args.record_trace, meta)
+
+
+def build_trace_replay(args, stop_event: Optional[threading.Event] = None) -> Optional[TraceReplay]:
+    """Load the --replay-trace file, or None if no trace is replayed"""
+    if args.replay_trace is None:
+        return None
+    trace = SessionTrace(args.replay_trace)
+    logger.info(
+        f"Replaying {args.replay_trace} at {args.replay_speed}x: {len(trace.mic)} mic streams, "
+        f"{len(trace.asr)} ASR streams, {len(trace.llm)} LLM requests, {len(trace.tts)} TTS requests"
+    )
+    return TraceReplay(trace, args.replay_speed, stop_event)
@@ -1,27 +1,192 @@
-import colorlog
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
 
-def setup_logger():
-    """Set up colored logging configuration"""
-    handler = colorlog.StreamHandler()
-    handler.setFormatter(colorlog.ColoredFormatter(
-        '%(log_color)s%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        log_colors={
-            'DEBUG':    'cyan',
-            'INFO':     'green',
-            'WARNING': 'yellow',
-            'ERROR':   'red',
-            'CRITICAL': 'red,bg_white',
+import colorlog
+
+LOG_FORMATS = ("auto", "color", "plain", "json")
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_COLORS = {
+    'DEBUG':    'cyan',
+    'INFO':     'green',
+    'WARNING': 'yellow',
+    'ERROR':   'red',
+    'CRITICAL': 'red,bg_white',
+}
+
+# Fields attached to every record: process-wide ones (the local agent's
+# session and turn, shared by its threads) and per-task ones (server
+# sessions, which each run in their own asyncio tasks)
+_fields = {}
+_context = contextvars.ContextVar("log_context", default={})
+# Attributes every LogRecord has; anything else was passed with ``extra``
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "rate_limit"}
+
+_configured = False
+_listener = None
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps the session/turn fields on a record on the thread that logged it"""
+
+    def filter(self, record):
+        for key, value in {**_fields, **_context.get()}.items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class _RateLimitFilter(logging.Filter):
+    """
+    Drops records logged with ``extra={"rate_limit": seconds}`` that come
+    from the same call site within that many seconds; the next record let
+    through carries the number of records dropped in between.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._sites = {}  # (pathname, lineno) -> (last emitted, dropped since)
+
+    def filter(self, record):
+        interval = getattr(record, "rate_limit", None)
+        if interval is None:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            last, dropped = self._sites.get(site, (None, 0))
+            if last is not None and now - last < interval:
+                self._sites[site] = (last, dropped + 1)
+                return False
+            self._sites[site] = (now, 0)
+        if dropped:
+            record.suppressed = dropped
+            if isinstance(record.msg, str):
+                record.msg += f" ({dropped} similar suppressed)"
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message merged and the traceback rendered, and nothing else formatted"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the session/turn fields and any ``extra`` fields"""
+
+    def format(self, record):
+        event = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
         }
-    ))
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                event[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, default=str)
 
-    logger = colorlog.getLogger()
+
+def _interactive() -> bool:
+    return sys.stderr.isatty() and "NO_COLOR" not in os.environ
+
+
+def _output_handler(log_format: str) -> logging.Handler:
+    if log_format == "auto":
+        log_format = "color" if _interactive() else "plain"
+    handler = logging.StreamHandler()
+    if log_format == "color":
+        handler = colorlog.StreamHandler()
+        handler.setFormatter(colorlog.ColoredFormatter(
+            '%(log_color)s' + TEXT_FORMAT, datefmt=DATE_FORMAT, log_colors=LOG_COLORS
+        ))
+    elif log_format == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    return handler
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def setup_logger():
+    """
+    Set up logging once and return the root logger.
+
+    Logging calls only stamp the record and put it on an unbounded queue; a
+    QueueListener thread formats it and writes to the terminal, so audio and
+    gRPC threads never wait on terminal I/O. Output is colored on a terminal
+    and plain text otherwise, until ``configure_logging`` applies
+    --log-format.
+    """
+    global _configured, _listener
+    logger = logging.getLogger()
+    if _configured:
+        return logger
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    handler.addFilter(_RateLimitFilter())
+    handler.addFilter(_ContextFilter())
+    # Remove any existing handlers to avoid duplicate logs
+    for existing in logger.handlers[:]:
+        logger.removeHandler(existing)
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
 
-    # Remove any existing handlers to avoid duplicate logs
-    for handler in logger.handlers[:-1]:
-        logger.removeHandler(handler)
+    _listener = logging.handlers.QueueListener(handler.queue, _output_handler("auto"))
+    _listener.start()
+    # Flush what is still queued at exit
+    atexit.register(_stop_listener)
+
+    _configured = True
+    return logger
+
+
+def configure_logging(args):
+    """Apply --log-format and --log-level"""
+    logger = setup_logger()
+    logger.setLevel(args.log_level)
+    # The listener thread reads its handlers per record, so they can be swapped while it runs
+    _listener.handlers = (_output_handler(args.log_format),)
+
+
+def set_log_fields(**fields):
+    """Set fields logged with every record of the process, e.g. the local agent's turn"""
+    _fields.update(fields)
+
 
-    return logger 
\ No newline at end of file
+@contextmanager
+def log_context(**fields):
+    """Add fields to the records logged by the current thread or asyncio task and the tasks it starts"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
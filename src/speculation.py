@@ -0,0 +1,223 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+from metrics import LLM_SPECULATION_HEAD_START
+from response_cache import normalize_transcript
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+_END = object()
+
+# Deltas buffered ahead of the consumer before the drain thread waits
+SPECULATION_BUFFER = 256
+
+
+class LLMRequest:
+    """
+    Stream handle and outcome of one LLM request.
+
+    Each request owns its state, so a speculative request and the
+    foreground one never close or judge each other's stream.
+    """
+
+    def __init__(self):
+        self.failed = False
+        self.closed = False
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def attach(self, stream):
+        """Track the open stream; closes it at once if the request was closed first"""
+        with self._lock:
+            self._stream = stream
+            closed = self.closed
+        if closed:
+            stream.close()
+
+    def detach(self):
+        with self._lock:
+            self._stream = None
+
+    def close(self):
+        """Close the underlying stream, from any thread"""
+        with self._lock:
+            self.closed = True
+            stream = self._stream
+        if stream is not None:
+            stream.close()
+
+
+class SpeculationStats:
+    """How often a speculative LLM request was kept, and how far ahead it started"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.attempts += 1
+
+    def hit(self, head_start: float):
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += head_start
+        LLM_SPECULATION_HEAD_START.observe(head_start)
+        logger.info(f"Speculative request kept, started {head_start:.3f}s before the final transcript")
+
+    def miss(self, hypothesis: str, transcript: str):
+        with self._lock:
+            self.misses += 1
+        logger.info(f"Speculative request discarded: {hypothesis!r} != {transcript!r}")
+
+    def log_stats(self, label: str = "Speculation"):
+        if not self.attempts:
+            return
+        decided = self.hits + self.misses
+        logger.info(
+            f"{label}: {self.attempts} requests, {self.hits} kept, {self.misses} discarded "
+            f"(hit rate {self.hits / decided if decided else 0.0:.1%}), "
+            f"{self.saved_seconds:.2f}s of LLM latency saved"
+        )
+
+
+class SpeculativeReply:
+    """
+    LLM reply to an interim hypothesis, started before the final transcript.
+
+    The stream is drained on a background thread into a bounded buffer
+    until the final transcript decides: ``deltas`` replays what arrived so
+    far and continues live, ``cancel`` closes the underlying stream.
+    """
+
+    def __init__(self, hypothesis: str, stream: Callable[[str, LLMRequest], Iterator[str]]):
+        self.hypothesis = hypothesis
+        self.key = normalize_transcript(hypothesis)
+        self.started_at = time.perf_counter()
+        self.request = LLMRequest()
+        self._deltas = queue.Queue(maxsize=SPECULATION_BUFFER)
+        self._cancelled = threading.Event()
+        threading.Thread(
+            target=self._drain, args=(stream(hypothesis, self.request),), name="llm-speculation", daemon=True
+        ).start()
+
+    def _put(self, item) -> bool:
+        """Wait for room in the buffer; False once the reply was cancelled or closed"""
+        while not (self._cancelled.is_set() or self.request.closed):
+            try:
+                self._deltas.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, deltas: Iterator[str]):
+        try:
+            for delta in deltas:
+                if not self._put(delta):
+                    break
+        finally:
+            # Closing the generator closes the underlying HTTP stream
+            deltas.close()
+            self._put(_END)
+
+    def matches(self, transcript: str) -> bool:
+        return normalize_transcript(transcript) == self.key
+
+    def cancel(self):
+        self._cancelled.set()
+        self.request.close()
+
+    def deltas(self) -> Iterator[str]:
+        while not self._cancelled.is_set():
+            try:
+                delta = self._deltas.get(timeout=0.1)
+            except queue.Empty:
+                if self.request.closed:
+                    return
+                continue
+            if delta is _END:
+                return
+            yield delta
+
+
+class Speculator:
+    """
+    Starts a ``SpeculativeReply`` once an interim hypothesis has stayed the
+    same for ``window_ms``, for the threaded agent.
+
+    Every change of hypothesis, final transcript and hand-over bumps a
+    generation counter; a stability timer that fires after its generation
+    was superseded does nothing, so no request is started for words the
+    final transcript has already been handled for.
+    """
+
+    def __init__(
+        self,
+        window_ms: float,
+        stream: Callable[[str, LLMRequest], Iterator[str]],
+        stats: SpeculationStats,
+        paused: Callable[[], bool] = lambda: False,
+    ):
+        self.window_ms = window_ms
+        self.stream = stream
+        self.stats = stats
+        self.paused = paused
+        self._lock = threading.Lock()
+        self._timer = None
+        self._generation = 0
+        self._key = None
+        self._speculation = None
+
+    def _stop_timer(self):
+        self._generation += 1
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def observe(self, transcript: str, is_final: bool):
+        """Restart the stability timer when the hypothesis changes; stop it on the final transcript"""
+        key = normalize_transcript(transcript)
+        with self._lock:
+            if not is_final and key == self._key:
+                return
+            self._stop_timer()
+            self._key = None if is_final else key
+            if is_final or self.paused():
+                return
+            self._timer = threading.Timer(self.window_ms / 1000, self._speculate, args=(transcript, self._generation))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _speculate(self, hypothesis: str, generation: int):
+        with self._lock:
+            if generation != self._generation or self.paused():
+                return
+            self._timer = None
+            if self._speculation is not None:
+                if self._speculation.matches(hypothesis):
+                    return
+                self._speculation.cancel()
+                self.stats.miss(self._speculation.hypothesis, hypothesis)
+            logger.info(f"Speculating on interim transcript: {hypothesis}")
+            self._speculation = SpeculativeReply(hypothesis, self.stream)
+            self.stats.started()
+
+    def take(self) -> Optional[SpeculativeReply]:
+        """Stop the stability timer and hand over the speculative request, if any"""
+        with self._lock:
+            self._stop_timer()
+            self._key = None
+            speculation, self._speculation = self._speculation, None
+        return speculation
+
+    def close(self):
+        speculation = self.take()
+        if speculation is not None:
+            speculation.cancel()
@@ -0,0 +1,116 @@
+import builtins
+import collections
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# Taken when main.py starts importing, before any heavy dependency
+PROCESS_START = time.perf_counter()
+PROFILE_FLAG = "--profile-startup"
+
+
+class StartupProfile:
+    """
+    Where the time before "I'm listening!" goes.
+
+    Import time is measured by wrapping ``__import__`` and charged, as self
+    time, to the top-level package whose import statement ran it, similar to
+    ``python -X importtime`` but aggregated per package. Initialization steps
+    are timed with ``step``; steps started from ``run_parallel`` overlap, so
+    their sum can exceed the wall-clock total.
+    """
+
+    def __init__(self):
+        self.imports: Dict[str, float] = collections.defaultdict(float)
+        self.steps = []  # (name, offset from process start, seconds, thread name)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    def start_import_timing(self):
+        if self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop_import_timing(self):
+        if self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        if level or name in sys.modules or original is None:
+            return original(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            with self._lock:
+                self.imports[name.partition(".")[0]] += elapsed - children
+            if stack:
+                stack[-1] += elapsed
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.steps.append(
+                    (name, start - PROCESS_START, time.perf_counter() - start, threading.current_thread().name)
+                )
+
+    def run_parallel(
+        self, tasks: Dict[str, Callable[[], Any]], cleanup: Optional[Callable[[Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run independent initialization steps on their own threads and return
+        their results by name. The first exception raised by a step is
+        re-raised once all of them finished, after ``cleanup`` was called
+        with the result of every step that succeeded.
+        """
+        def timed(name, fn):
+            with self.step(name):
+                return fn()
+
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="startup") as pool:
+            futures = {name: pool.submit(timed, name, fn) for name, fn in tasks.items()}
+        results = {}
+        error = None
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            if cleanup is not None:
+                for result in results.values():
+                    cleanup(result)
+            raise error
+        return results
+
+    def log_report(self, logger, top: int = 12):
+        """Log the import and initialization breakdown"""
+        total = time.perf_counter() - PROCESS_START
+        imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+        logger.info(f"Startup profile: {total:.3f}s from first import to listening, {sum(self.imports.values()):.3f}s importing")
+        for name, seconds in imports[:top]:
+            logger.info(f"Startup import  {name:<24} {seconds * 1000:8.1f} ms")
+        for name, offset, seconds, thread in sorted(self.steps, key=lambda step: step[1]):
+            logger.info(f"Startup init    {name:<24} {seconds * 1000:8.1f} ms  (at +{offset:.3f}s on {thread})")
+
+
+PROFILE = StartupProfile()
+if PROFILE_FLAG in sys.argv:
+    # Imports run before arguments are parsed, so the flag is checked here
+    PROFILE.start_import_timing()
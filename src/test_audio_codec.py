@@ -0,0 +1,95 @@
+import io
+
+import numpy as np
+import pytest
+
+from audio_codec import Decoder, Encoder, alaw_decode, alaw_encode, encode_chunks, mulaw_decode, mulaw_encode
+
+
+def _pcm(samples) -> bytes:
+    return np.asarray(samples, dtype="<i2").tobytes()
+
+
+def _samples(pcm) -> np.ndarray:
+    return np.frombuffer(pcm, dtype="<i2").astype(np.int32)
+
+
+ALL_SAMPLES = np.arange(-32768, 32768)
+
+
+@pytest.mark.parametrize(
+    "encode, decode",
+    [(mulaw_encode, mulaw_decode), (alaw_encode, alaw_decode)],
+    ids=["mulaw", "alaw"],
+)
+class TestG711:
+    def test_one_byte_per_sample(self, encode, decode):
+        pcm = _pcm(ALL_SAMPLES)
+        assert len(encode(pcm)) == len(ALL_SAMPLES)
+
+    def test_codes_round_trip(self, encode, decode):
+        # Every 8-bit code decodes to a level that encodes back to the same
+        # code, except mu-law's negative zero, which encodes as positive zero
+        codes = bytes(code for code in range(256) if encode is not mulaw_encode or code != 0x7F)
+        assert encode(decode(codes)) == codes
+
+    def test_error_grows_with_level(self, encode, decode):
+        decoded = _samples(decode(encode(_pcm(ALL_SAMPLES))))
+        error = np.abs(decoded - ALL_SAMPLES)
+        quiet = np.abs(ALL_SAMPLES) < 256
+        # Steps are finest near zero and 1024 wide in the loudest segment
+        assert error[quiet].max() <= 16
+        assert error.max() <= 1024
+        assert np.all(np.sign(decoded[np.abs(ALL_SAMPLES) > 64]) == np.sign(ALL_SAMPLES[np.abs(ALL_SAMPLES) > 64]))
+
+    def test_decoded_levels_are_monotonic(self, encode, decode):
+        decoded = _samples(decode(encode(_pcm(ALL_SAMPLES))))
+        assert np.all(np.diff(decoded) >= 0)
+
+
+def test_reference_codes():
+    # Values from the ITU G.711 reference implementation (Sun g711.c)
+    assert mulaw_encode(_pcm([0, -1, 32767, -32768])) == bytes([0xFF, 0x7E, 0x80, 0x00])
+    assert alaw_encode(_pcm([0, -1, 32767, -32768])) == bytes([0xD5, 0x55, 0xAA, 0x2A])
+
+
+def test_pcm_passes_through():
+    pcm = _pcm([1, -2, 3])
+    assert Encoder("pcm", 16000).encode(pcm) == pcm
+    assert Decoder("pcm").decode(pcm) == pcm
+
+
+def test_g711_stream_has_no_tail():
+    pcm = _pcm(np.arange(-1000, 1000, 10))
+    encoder = Encoder("mulaw", 8000)
+    wire = encoder.encode(pcm)
+    assert encoder.flush() == b""
+    decoder = Decoder("mulaw")
+    assert decoder.decode(wire) == mulaw_decode(wire)
+    assert decoder.flush() == b""
+
+
+def test_encode_chunks_skips_empty_output():
+    chunks = [_pcm([1, 2]), b"", _pcm([3])]
+    assert list(encode_chunks(chunks, "alaw", 8000)) == [alaw_encode(chunks[0]), alaw_encode(chunks[2])]
+
+
+def test_flac_upload_is_one_stream():
+    pytest.importorskip("soundfile")
+    pcm = _pcm((8000 * np.sin(np.arange(16000) / 10)).astype(np.int16))
+    wire = list(encode_chunks([pcm[:16000], pcm[16000:]], "flac", 16000))
+    assert wire and wire[0].startswith(b"fLaC")
+    assert sum(len(data) for data in wire) < len(pcm)
+
+
+def test_flac_download_is_decoded_on_flush():
+    soundfile = pytest.importorskip("soundfile")
+    pcm = _pcm((8000 * np.sin(np.arange(16000) / 10)).astype(np.int16))
+    buffer = io.BytesIO()
+    soundfile.write(buffer, np.frombuffer(pcm, dtype="<i2"), 16000, format="FLAC")
+    response = buffer.getvalue()
+    decoder = Decoder("flac")
+    assert decoder.decode(response[:1000]) == b""
+    assert decoder.decode(response[1000:]) == b""
+    # FLAC is lossless
+    assert decoder.flush() == pcm
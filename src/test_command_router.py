@@ -0,0 +1,177 @@
+import json
+import random
+import types
+import wave
+
+import pytest
+
+from command_router import (
+    CommandReply,
+    CommandRouter,
+    build_command_router,
+    edit_distance,
+    load_command_file,
+    register_builtin_commands,
+)
+
+
+def _osa_distance(a: str, b: str) -> int:
+    """Unbanded optimal string alignment distance, as the reference"""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def test_edit_distance_matches_the_reference():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 8)))
+        b = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 8)))
+        limit = rng.randint(0, 2)
+        expected = _osa_distance(a, b)
+        assert edit_distance(a, b, limit) == (expected if expected <= limit else limit + 1), (a, b, limit)
+
+
+def test_exact_match_is_normalized():
+    router = CommandRouter()
+    command = router.register("weather", ["what's the weather"], reply="Sunny.")
+    match = router.match("Um, what's the WEATHER?")
+    assert match.command is command
+    assert match.edits == 0
+    assert router.match("what's the weather like") is None
+
+
+def test_wildcard_matches_the_rest_and_the_bare_phrase():
+    router = CommandRouter()
+    router.register("play", ["play *"], reply="Okay.")
+    assert router.match("play some jazz").rest == "some jazz"
+    assert router.match("play").rest == ""
+    assert router.match("player") is None
+
+
+def test_exact_phrase_wins_over_wildcard_prefix():
+    router = CommandRouter()
+    router.register("play", ["play *"], reply="Okay.")
+    stop = router.register("stop music", ["play nothing"], reply="Stopped.")
+    assert router.match("play nothing").command is stop
+    assert router.match("play nothing else").command.name == "play"
+
+
+def test_fuzzy_match_allows_one_edit_on_long_phrases():
+    router = CommandRouter(max_edits=1)
+    router.register("lights", ["turn on the lights", "dim"], reply="Done.")
+    assert router.match("turn on the lihgts").edits == 1
+    assert router.match("turn on the ligts").edits == 1
+    assert router.match("turn on the lgts") is None
+    # Too short for an edit
+    assert router.match("dum") is None
+
+
+def test_exact_router_does_no_fuzzy_matching():
+    router = CommandRouter()
+    router.register("lights", ["turn on the lights"], reply="Done.")
+    assert router.match("turn on the ligts") is None
+
+
+def test_max_edits_is_capped():
+    with pytest.raises(ValueError):
+        CommandRouter(max_edits=2)
+
+
+def test_route_counts_hits_and_misses():
+    router = CommandRouter()
+    router.register("hello", ["hello"], reply="Hi.")
+    router.register("maybe", ["maybe"], handler=lambda match: None)
+    assert router.route("hello")[1] == CommandReply("Hi.")
+    # A handler returning None passes the transcript on to the LLM
+    assert router.route("maybe") is None
+    assert router.route("something else") is None
+    assert router.hits == {"hello": 1}
+    assert router.misses == 1
+
+
+def test_duplicate_phrase_keeps_the_first_command():
+    router = CommandRouter()
+    first = router.register("one", ["hello"], reply="One.")
+    router.register("two", ["Hello!"], reply="Two.")
+    assert router.match("hello").command is first
+
+
+def test_prerender_renders_fixed_text_replies_only():
+    router = CommandRouter()
+    router.register("fixed", ["hello"], reply="Hi.")
+    router.register("dynamic", ["time"], handler=lambda match: CommandReply("Noon."))
+    router.prerender(lambda text: text.encode())
+    assert router.route("hello")[1].audio == b"Hi."
+    assert router.route("time")[1].audio is None
+
+
+def test_load_command_file(tmp_path):
+    with wave.open(str(tmp_path / "chime.wav"), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(bytes(3200))
+    lines = [
+        {"name": "hours", "phrases": ["opening hours"], "reply": "Nine to five."},
+        {"phrases": ["ring the bell"], "audio": "chime.wav"},
+        {"reply": "no phrases"},
+    ]
+    path = tmp_path / "commands.jsonl"
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\nnot json\n")
+    router = CommandRouter()
+    load_command_file(router, path, 16000)
+    assert router.route("opening hours")[1].text == "Nine to five."
+    reply = router.route("ring the bell")[1]
+    assert reply.audio == bytes(3200)
+    assert [command.name for command in router.commands] == ["hours", "commands:2"]
+
+
+def _agent(last_reply=None):
+    agent = types.SimpleNamespace(
+        last_reply=last_reply,
+        tts_service=types.SimpleNamespace(playback=types.SimpleNamespace(volume=1.0)),
+        interrupted=0,
+    )
+    agent.stop_speaking = lambda: setattr(agent, "interrupted", agent.interrupted + 1)
+    return agent
+
+
+def test_builtin_commands():
+    agent = _agent()
+    router = CommandRouter()
+    register_builtin_commands(router, agent)
+    # Nothing to repeat yet
+    assert router.route("repeat that") is None
+    agent.last_reply = "Paris."
+    assert router.route("say that again")[1] == CommandReply("Paris.", remember=False)
+    assert router.route("never mind")[1].text is None
+    # "stop" cuts off the response being spoken
+    assert agent.interrupted == 1
+    router.route("louder")
+    assert agent.tts_service.playback.volume == pytest.approx(1.5)
+    assert router.route("what time is it")[1].text.startswith("It's ")
+
+
+def test_builtin_commands_are_opt_in():
+    args = types.SimpleNamespace(local_commands=False, command_file=None, command_max_edits=0)
+    assert build_command_router(args, _agent()) is None
+    args.local_commands = True
+    assert build_command_router(args, _agent()).match("repeat that") is not None
+
+
+def test_commands_barge_in_below_the_word_minimum():
+    from main import PerceptraAgent
+
+    router = CommandRouter()
+    register_builtin_commands(router, _agent())
+    agent = types.SimpleNamespace(args=types.SimpleNamespace(barge_in_min_words=2), command_router=router)
+    assert PerceptraAgent._barges_in(agent, "Stop!")
+    assert not PerceptraAgent._barges_in(agent, "hmm")
+    assert PerceptraAgent._barges_in(agent, "wait a second")
+    agent.command_router = None
+    assert not PerceptraAgent._barges_in(agent, "stop")
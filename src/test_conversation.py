@@ -0,0 +1,101 @@
+import types
+
+from conversation import (
+    CACHE_CONTROL,
+    COMPACT_TO,
+    DIGEST_REPLY_CHARS,
+    DIGEST_USER_CHARS,
+    Conversation,
+)
+
+
+def _turn(index: int):
+    # About 25 tokens of question (the transcript limit) and 150 of reply
+    return f"{index} " + "q" * 98, f"{index} " + "r" * 598
+
+
+def _fill(conversation: Conversation, turns: int):
+    for index in range(turns):
+        conversation.record(*_turn(index))
+
+
+def test_request_puts_breakpoints_on_system_and_last_reply():
+    conversation = Conversation(10000, system_prompt="Be brief.")
+    conversation.record("Hi", "Hello!")
+    conversation.record("Capital of France?", "Paris.")
+    request = conversation.request("And Spain?")
+    assert request["system"] == [{"type": "text", "text": "Be brief.", "cache_control": CACHE_CONTROL}]
+    messages = request["messages"]
+    assert [message["role"] for message in messages] == ["user", "assistant", "user", "assistant", "user"]
+    assert messages[1]["content"] == "Hello!"
+    assert messages[3]["content"] == [{"type": "text", "text": "Paris.", "cache_control": CACHE_CONTROL}]
+    assert messages[4]["content"] == "And Spain?"
+
+
+def test_without_prompt_cache_the_request_is_plain():
+    conversation = Conversation(10000, system_prompt="Be brief.", prompt_cache=False)
+    conversation.record("Hi", "Hello!")
+    request = conversation.request("Bye")
+    assert request["system"] == "Be brief."
+    assert request["messages"][1]["content"] == "Hello!"
+
+
+def test_empty_replies_and_disabled_history_are_not_recorded():
+    conversation = Conversation(10000)
+    conversation.record("Hi", "  ")
+    assert conversation.turns == []
+    disabled = Conversation(0)
+    disabled.record("Hi", "Hello!")
+    assert disabled.turns == []
+    assert len(disabled.request("Hi")["messages"]) == 1
+
+
+def test_history_under_budget_is_not_compacted():
+    conversation = Conversation(500)
+    _fill(conversation, 2)
+    assert len(conversation.turns) == 2
+    assert conversation.digest == []
+
+
+def test_compaction_folds_oldest_turns_into_a_digest():
+    conversation = Conversation(500)
+    _fill(conversation, 3)
+    assert conversation._history_tokens() <= 500 * COMPACT_TO
+    # The latest turn is kept verbatim
+    assert conversation.turns == [_turn(2)]
+    assert len(conversation.digest) == 2
+    user, reply = _turn(0)
+    assert conversation.digest[0] == f"- User: {user[:DIGEST_USER_CHARS]} / You: {reply[:DIGEST_REPLY_CHARS]}"
+    system = conversation.request("Next")["system"]
+    assert system[1]["text"].startswith("Earlier in this conversation:\n- User: 0 ")
+    assert system[1]["cache_control"] == CACHE_CONTROL
+    assert "cache_control" not in system[0]
+
+
+def test_compaction_drops_the_oldest_digest_lines():
+    conversation = Conversation(500)
+    _fill(conversation, 5)
+    assert conversation._history_tokens() <= 500 * COMPACT_TO
+    assert conversation.turns == [_turn(4)]
+    assert [line.split()[2] for line in conversation.digest] == ["2", "3"]
+
+
+def test_digest_is_stable_between_compactions():
+    conversation = Conversation(500)
+    _fill(conversation, 3)
+    before = conversation.request("Next")
+    # The fourth turn still fits, so the cached system block is unchanged
+    conversation.record(*_turn(3))
+    after = conversation.request("Next")
+    assert after["system"] == before["system"]
+    assert after["messages"][0] == before["messages"][0]
+    assert len(after["messages"]) == len(before["messages"]) + 2
+
+
+def test_record_usage_accumulates_cache_tokens():
+    conversation = Conversation(1000)
+    assert conversation.record_usage(None) is None
+    usage = types.SimpleNamespace(input_tokens=10, cache_read_input_tokens=90, cache_creation_input_tokens=None, output_tokens=5)
+    assert conversation.record_usage(usage) == {"input_tokens": 10, "cache_read_tokens": 90, "cache_write_tokens": 0, "output_tokens": 5}
+    conversation.record_usage(usage)
+    assert conversation.totals == {"turns": 2, "input_tokens": 20, "cache_read_tokens": 180, "cache_write_tokens": 0, "output_tokens": 10}
@@ -0,0 +1,143 @@
+import time
+
+import grpc
+import pytest
+
+from endpoint_pool import LATENCY_EWMA, EndpointPool
+from metrics import ENDPOINT_LATENCY, ENDPOINT_LATENCY_SAMPLES
+
+
+class FakeChannels:
+    """Stands in for ChannelManager: one auth per URI and scripted health answers"""
+
+    def __init__(self, serving=None, delays=None):
+        self.serving = serving or {}
+        self.delays = delays or {}
+
+    def auth(self, uri):
+        return f"auth:{uri}"
+
+    def check_health(self, uri, timeout):
+        time.sleep(self.delays.get(uri, 0))
+        return self.serving.get(uri, True)
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+def _pool(uris=("a", "b"), channels=None):
+    return EndpointPool("ASR", list(uris), channels or FakeChannels(), lambda auth: f"service({auth})")
+
+
+def test_backends_get_a_service_per_auth():
+    pool = _pool()
+    assert [backend.service for backend in pool.backends] == ["service(auth:a)", "service(auth:b)"]
+
+
+def test_least_in_flight_backend_is_picked():
+    pool = _pool()
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first)
+    assert pool.pick() is first
+
+
+def test_ties_go_to_the_lower_latency():
+    pool = _pool()
+    a, b = pool.backends
+    pool.observe(a, 0.2)
+    pool.observe(b, 0.1)
+    assert pool.pick() is b
+    # The smoothed latency moves towards new samples
+    pool.observe(b, 0.5)
+    assert b.latency == pytest.approx(0.1 + LATENCY_EWMA * 0.4)
+    assert pool.pick() is a
+
+
+def test_lease_releases_and_counts_errors():
+    pool = _pool(["a"])
+    with pytest.raises(ValueError):
+        with pool.lease() as backend:
+            assert backend.in_flight == 1
+            raise ValueError("boom")
+    assert backend.in_flight == 0
+    assert backend.requests == 1
+    assert backend.errors == 1
+
+
+def test_unavailable_backend_is_routed_around():
+    pool = _pool()
+    a, b = pool.backends
+    pool.acquire()
+    pool.release(a, FakeRpcError(grpc.StatusCode.UNAVAILABLE))
+    assert a.serving is False
+    assert all(pool.acquire() is b for _ in range(3))
+    # With no usable backend left, all are tried again
+    b.serving = False
+    assert pool.pick(exclude=b) is a
+
+
+def test_single_backend_stays_in_rotation():
+    pool = _pool(["a"])
+    backend = pool.acquire()
+    pool.release(backend, FakeRpcError(grpc.StatusCode.UNAVAILABLE))
+    assert backend.serving is None
+
+
+def test_cancelled_rpcs_are_not_errors():
+    pool = _pool(["a"])
+    backend = pool.acquire()
+    pool.release(backend, FakeRpcError(grpc.StatusCode.CANCELLED))
+    backend = pool.acquire()
+    pool.release(backend, cancelled=True)
+    assert backend.errors == 0
+
+
+def test_hedges_avoid_the_excluded_backend():
+    pool = _pool()
+    primary = pool.acquire()
+    hedge = pool.acquire(exclude=primary, hedge=True)
+    assert hedge is not primary
+    assert hedge.hedges == 1
+
+
+def test_wait_until_serving_returns_on_the_first_serving_backend():
+    channels = FakeChannels(serving={"a": False, "b": True}, delays={"a": 1.0})
+    pool = _pool(channels=channels)
+    start = time.monotonic()
+    assert pool.wait_until_serving(timeout=5)
+    assert time.monotonic() - start < 0.5
+    assert pool.backends[1].serving is True
+
+
+def test_wait_until_serving_fails_when_none_serve():
+    pool = _pool(channels=FakeChannels(serving={"a": False, "b": False}))
+    assert not pool.wait_until_serving(timeout=1)
+    assert [backend.serving for backend in pool.backends] == [False, False]
+
+
+def test_stats_report_latency_percentiles():
+    pool = _pool(["a"])
+    backend = pool.backends[0]
+    for seconds in (0.01, 0.02, 0.03, 0.04):
+        pool.observe(backend, seconds)
+    (row,) = pool.stats()
+    assert row["p50_ms"] == 30.0
+    assert row["p95_ms"] == 30.0
+    assert row["requests"] == 0
+
+
+def test_lost_hedges_steer_routing_but_are_not_exported():
+    pool = _pool(["latency-a"])
+    backend = pool.backends[0]
+    pool.observe(backend, 0.1)
+    pool.observe(backend, 0.5, answered=False)
+    assert backend.latency > 0.1
+    assert ENDPOINT_LATENCY.values[("ASR", "latency-a")] == pytest.approx(0.1)
+    assert ENDPOINT_LATENCY_SAMPLES.values[("ASR", "latency-a")] == 1
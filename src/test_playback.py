@@ -0,0 +1,143 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from playback import JitterBuffer, PlaybackEngine
+
+
+def _later(fn, delay=0.05):
+    thread = threading.Thread(target=lambda: (time.sleep(delay), fn()), daemon=True)
+    thread.start()
+    return thread
+
+
+def test_capacity_and_reads_are_whole_frames():
+    buffer = JitterBuffer(capacity_bytes=11, frame_bytes=4)
+    assert buffer.capacity == 8
+    buffer.write(b"abcdef")
+    assert buffer.read(5) == b"abcd"
+    # Half a frame stays until it is completed
+    assert buffer.read(8, timeout=0.01) == b""
+    buffer.write(b"gh")
+    assert buffer.read(8) == b"efgh"
+
+
+def test_order_is_kept_across_the_wrap():
+    buffer = JitterBuffer(capacity_bytes=8)
+    buffer.write(b"012345")
+    assert buffer.read(4) == b"0123"
+    buffer.write(b"6789ab")
+    assert len(buffer) == 8
+    assert buffer.read(8) == b"456789ab"
+
+
+def test_underrun_returns_nothing_until_refilled():
+    buffer = JitterBuffer(capacity_bytes=16)
+    start = time.monotonic()
+    assert buffer.read(4, timeout=0.05) == b""
+    assert time.monotonic() - start >= 0.04
+    # A blocked reader wakes up as soon as audio arrives
+    _later(lambda: buffer.write(b"\x01\x02"))
+    assert buffer.read(4, timeout=2) == b"\x01\x02"
+
+
+def test_full_buffer_applies_backpressure():
+    buffer = JitterBuffer(capacity_bytes=4)
+    assert buffer.write(b"abcdefgh", timeout=0.05) == 4
+    _later(lambda: buffer.read(4))
+    assert buffer.write(b"ijkl", timeout=2) == 4
+    assert buffer.read(4) == b"ijkl"
+
+
+def test_clear_drops_audio_and_releases_writers():
+    buffer = JitterBuffer(capacity_bytes=4)
+    buffer.write(b"abcd")
+    _later(buffer.clear)
+    assert buffer.write(b"efgh") == 0
+    assert len(buffer) == 0
+    assert buffer.clear() == 0
+
+
+def test_close_ends_reads_after_the_drain():
+    buffer = JitterBuffer(capacity_bytes=8)
+    buffer.write(b"ab")
+    buffer.close()
+    assert buffer.read(8) == b"ab"
+    assert buffer.read(8) == b""
+    assert buffer.write(b"cd") == 0
+
+
+class _Device(list):
+    """Records the periods written to it, like riva's SoundCallBack plays them"""
+
+    def __call__(self, data):
+        self.append(data)
+
+    def close(self):
+        pass
+
+
+class _Engine(PlaybackEngine):
+    """A playback engine writing to a list instead of an audio device"""
+
+    def start(self):
+        self.periods = self._sound_stream = _Device()
+        self._running = True
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+
+@pytest.fixture
+def engine():
+    engine = _Engine(None, framerate=1000, buffer_ms=100, period_ms=10)
+    engine.start()
+    yield engine
+    engine.close()
+
+
+def test_engine_plays_in_periods_and_drains(engine):
+    audio = np.arange(1, 251, dtype="<i2").tobytes()
+    # More than the buffer holds: write() waits for the device to catch up
+    assert engine.write(audio) == len(audio)
+    assert engine.drain(timeout=2)
+    assert b"".join(engine.periods) == audio
+    assert all(len(period) == engine.period_bytes for period in engine.periods)
+
+
+def test_engine_resumes_after_an_underrun(engine):
+    engine.write(np.ones(20, dtype="<i2").tobytes())
+    assert engine.drain(timeout=2)
+    time.sleep(0.15)
+    engine.write(np.full(20, 2, dtype="<i2").tobytes())
+    assert engine.drain(timeout=2)
+    assert np.frombuffer(b"".join(engine.periods), "<i2").tolist() == [1] * 20 + [2] * 20
+
+
+def test_first_audio_fires_on_the_first_audible_period(engine):
+    stamps = []
+    engine.notify_first_audio(stamps.append)
+    engine.write(bytes(40))
+    assert engine.drain(timeout=2)
+    assert stamps == []
+    engine.write(np.ones(20, dtype="<i2").tobytes() * 2)
+    assert engine.drain(timeout=2)
+    assert len(stamps) == 1
+
+
+def test_volume_scales_and_clips(engine):
+    engine.volume = 2.0
+    engine.write(np.array([100, -20000] * 5, dtype="<i2").tobytes())
+    assert engine.drain(timeout=2)
+    assert np.frombuffer(b"".join(engine.periods), "<i2").tolist() == [200, -32768] * 5
+
+
+def test_flush_counts_dropped_audio_as_played():
+    engine = _Engine(None, framerate=1000, buffer_ms=100, period_ms=10)
+    # Not started: nothing reads the buffer, so only flush() can drain it
+    engine._running = True
+    engine.write(bytes(100))
+    assert not engine.drain(timeout=0.05)
+    engine.flush()
+    assert engine.drain(timeout=0.05)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from resample import AudioConverter, PolyphaseResampler
+
+
+def _tone(rate: int, hz: float, seconds: float = 0.5, level: float = 8000) -> np.ndarray:
+    return (level * np.sin(2 * np.pi * hz * np.arange(int(rate * seconds)) / rate)).astype("<i2")
+
+
+def _convert_in_chunks(converter: AudioConverter, pcm: bytes, chunk_bytes: int) -> bytes:
+    chunks = [pcm[i:i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+    return b"".join(converter.stream(chunks))
+
+
+def _level_at(samples: np.ndarray, rate: int, hz: float) -> float:
+    """Amplitude of one frequency, away from the filter's edges"""
+    middle = samples[len(samples) // 4: 3 * len(samples) // 4].astype(np.float64)
+    t = np.arange(len(middle)) / rate
+    return 2 * abs(np.mean(middle * np.exp(-2j * np.pi * hz * t)))
+
+
+@pytest.mark.parametrize("in_rate, out_rate", [(16000, 48000), (48000, 16000), (22050, 16000), (16000, 44100)])
+def test_output_length_follows_the_ratio(in_rate, out_rate):
+    pcm = _tone(in_rate, 440).tobytes()
+    converter = AudioConverter(in_rate, out_rate)
+    out = _convert_in_chunks(converter, pcm, 1000)
+    # flush() pushes half a filter of silence through to release the delayed tail
+    expected = (len(pcm) // 2 + converter.resampler.taps // 2) * out_rate / in_rate
+    assert abs(len(out) // 2 - expected) <= 1
+
+
+@pytest.mark.parametrize("in_rate, out_rate", [(16000, 48000), (48000, 16000), (22050, 16000)])
+def test_tone_keeps_its_level(in_rate, out_rate):
+    out = np.frombuffer(_convert_in_chunks(AudioConverter(in_rate, out_rate), _tone(in_rate, 440).tobytes(), 640), "<i2")
+    assert _level_at(out, out_rate, 440) == pytest.approx(8000, rel=0.02)
+
+
+def test_downsampling_removes_content_above_nyquist():
+    # 7 kHz is above the 4 kHz Nyquist frequency of 8 kHz output
+    out = np.frombuffer(_convert_in_chunks(AudioConverter(16000, 8000), _tone(16000, 7000).tobytes(), 640), "<i2")
+    assert np.abs(out[len(out) // 4: 3 * len(out) // 4]).max() < 80
+
+
+def test_chunking_does_not_change_the_output():
+    pcm = _tone(16000, 1000).tobytes()
+    whole = _convert_in_chunks(AudioConverter(16000, 22050), pcm, len(pcm))
+    # Odd sizes split samples across chunks
+    pieces = _convert_in_chunks(AudioConverter(16000, 22050), pcm, 333)
+    assert len(whole) == len(pieces)
+    assert np.abs(np.frombuffer(whole, "<i2").astype(int) - np.frombuffer(pieces, "<i2")).max() <= 1
+
+
+def test_same_format_passes_chunks_through():
+    converter = AudioConverter(16000, 16000)
+    chunk = _tone(16000, 440).tobytes()
+    assert converter.convert(chunk) is chunk
+    assert converter.flush() == b""
+
+
+def test_channel_and_format_conversion():
+    mono = np.array([0, 16384, -16384], dtype="<i2")
+    stereo = np.frombuffer(AudioConverter(16000, 16000, 1, 2).convert(mono.tobytes()), "<i2")
+    assert stereo.tolist() == [0, 0, 16384, 16384, -16384, -16384]
+    downmixed = np.frombuffer(AudioConverter(16000, 16000, 2, 1).convert(stereo.tobytes()), "<i2")
+    assert downmixed.tolist() == mono.tolist()
+    floats = np.frombuffer(AudioConverter(16000, 16000, out_format="f32").convert(mono.tobytes()), "<f4")
+    assert floats.tolist() == [0.0, 0.5, -0.5]
+
+
+def test_unsupported_channel_mapping_is_rejected():
+    with pytest.raises(ValueError):
+        AudioConverter(16000, 16000, 2, 3)
+
+
+def test_reset_drops_filter_state():
+    resampler = PolyphaseResampler(16000, 48000)
+    first = resampler.process(_tone(16000, 440).reshape(-1, 1))
+    resampler.reset()
+    again = resampler.process(_tone(16000, 440).reshape(-1, 1))
+    np.testing.assert_allclose(first, again)
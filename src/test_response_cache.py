@@ -0,0 +1,95 @@
+import json
+import time
+import types
+
+from response_cache import ResponseCache, build_response_cache, normalize_transcript
+
+
+def test_normalize_drops_case_punctuation_and_fillers():
+    assert normalize_transcript("  Um, what's the CAPITAL of France?? ") == "what's the capital of france"
+    assert normalize_transcript("uh... hmm") == ""
+
+
+def test_hit_after_put_with_a_differently_spoken_transcript():
+    cache = ResponseCache(10, 60)
+    assert cache.get("What is the capital of France?") is None
+    cache.put("What is the capital of France?", "Paris.")
+    assert cache.get("uh, what is the capital of france") == "Paris."
+    assert cache.stats() == {"hits": 1, "misses": 1, "bypassed": 0, "hit_rate": 0.5, "entries": 1}
+
+
+def test_context_dependent_questions_bypass_the_cache():
+    cache = ResponseCache(10, 60)
+    for transcript in ["What's the weather today?", "Say that again", "What time is it?", "Who wrote it?"]:
+        cache.put(transcript, "Reply.")
+        assert cache.get(transcript) is None
+    assert cache.stats()["bypassed"] == 4
+    assert cache.stats()["entries"] == 0
+
+
+def test_allow_patterns_restrict_what_is_cached():
+    cache = ResponseCache(10, 60, allow=[r"^define "])
+    cache.put("Define entropy.", "A measure of disorder.")
+    cache.put("How tall is Everest?", "8849 metres.")
+    assert cache.get("define entropy") == "A measure of disorder."
+    assert cache.get("how tall is everest") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(2, 60)
+    cache.put("one", "1")
+    cache.put("two", "2")
+    cache.get("one")
+    cache.put("three", "3")
+    assert cache.get("two") is None
+    assert cache.get("one") == "1"
+    assert cache.get("three") == "3"
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(10, 60)
+    cache.put("capital of france", "Paris.")
+    now[0] += 59
+    assert cache.get("capital of france") == "Paris."
+    now[0] += 2
+    assert cache.get("capital of france") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_empty_reply_is_not_stored():
+    cache = ResponseCache(10, 60)
+    cache.put("capital of france", "")
+    assert cache.stats()["entries"] == 0
+
+
+def test_file_is_replayed_and_compacted(tmp_path):
+    path = tmp_path / "llm_cache.jsonl"
+    cache = ResponseCache(10, 60, path=path)
+    cache.put("capital of france", "Lyon.")
+    cache.put("capital of france", "Paris.")
+    cache.put("capital of spain", "Madrid.")
+    assert len(path.read_text().splitlines()) == 3
+    cache.close()
+    assert [json.loads(line)["reply"] for line in path.read_text().splitlines()] == ["Paris.", "Madrid."]
+
+    # Expired and malformed lines are skipped on replay
+    with open(path, "a") as f:
+        f.write(json.dumps({"key": "old question", "at": time.time() - 120, "reply": "Stale."}) + "\n")
+        f.write("not json\n")
+    replayed = ResponseCache(10, 60, path=path)
+    assert replayed.get("capital of france") == "Paris."
+    assert replayed.get("old question") is None
+    assert replayed.stats()["entries"] == 2
+    replayed.close()
+
+
+def test_build_is_disabled_without_a_size():
+    args = types.SimpleNamespace(llm_cache_size=0, llm_cache_ttl=60, llm_cache_file=None, llm_cache_allow=None, llm_cache_deny=None)
+    assert build_response_cache(args) is None
+    args.llm_cache_size = 5
+    args.llm_cache_deny = [r"\bpassword\b"]
+    cache = build_response_cache(args)
+    assert not cache.cacheable("what is my password")
+    assert not cache.cacheable("what's the news")
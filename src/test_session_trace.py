@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+
+import session_trace
+from session_trace import (
+    ASR_OPEN,
+    ASR_RESPONSE,
+    HEADER,
+    LLM_OPEN,
+    LLM_TEXT,
+    MAGIC,
+    META,
+    MIC_AUDIO,
+    MIC_OPEN,
+    SessionTrace,
+    TraceReplay,
+    TraceWriter,
+    read_trace,
+)
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "session.trace"
+    writer = TraceWriter(path, {"mode": "barge_in"})
+    writer.write(MIC_OPEN)
+    writer.write(MIC_AUDIO, b"\x01\x00" * 4)
+    writer.write(MIC_AUDIO, b"\x02\x00" * 4)
+    writer.write(ASR_OPEN)
+    writer.write(ASR_RESPONSE, b"partial")
+    writer.write(LLM_OPEN, "Capital of France?".encode())
+    writer.write(LLM_TEXT, "Paris.".encode())
+    writer.close()
+    return path
+
+
+def test_records_round_trip(trace_path):
+    records = list(read_trace(trace_path))
+    assert [(kind, payload) for kind, _, payload in records] == [
+        (META, json.dumps({"mode": "barge_in"}).encode()),
+        (MIC_OPEN, b""),
+        (MIC_AUDIO, b"\x01\x00" * 4),
+        (MIC_AUDIO, b"\x02\x00" * 4),
+        (ASR_OPEN, b""),
+        (ASR_RESPONSE, b"partial"),
+        (LLM_OPEN, b"Capital of France?"),
+        (LLM_TEXT, b"Paris."),
+    ]
+    times = [seconds for _, seconds, _ in records]
+    assert times == sorted(times) and times[0] >= 0
+
+
+def test_writer_counts_records_and_bytes(tmp_path):
+    writer = TraceWriter(tmp_path / "counted.trace", {})
+    writer.write(MIC_AUDIO, b"abcd")
+    writer.close()
+    # Writes after close are ignored
+    writer.write(MIC_AUDIO, b"abcd")
+    assert writer.records[MIC_AUDIO] == 1
+    assert writer.bytes == (tmp_path / "counted.trace").stat().st_size - len(MAGIC)
+
+
+@pytest.mark.parametrize("cut", [1, HEADER.size - 1, HEADER.size + 3])
+def test_truncated_last_record_is_skipped(trace_path, cut):
+    data = trace_path.read_bytes()
+    # The last record is LLM_TEXT with a 6 byte payload
+    last = len(data) - HEADER.size - len(b"Paris.")
+    trace_path.write_bytes(data[:last + cut])
+    kinds = [kind for kind, _, _ in read_trace(trace_path)]
+    assert kinds[-1] == LLM_OPEN
+    assert len(kinds) == 7
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not.trace"
+    path.write_bytes(b"RIFF....")
+    with pytest.raises(ValueError):
+        list(read_trace(path))
+
+
+def test_periodic_flush_keeps_a_crashed_trace_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_trace, "FLUSH_SECONDS", 0.0)
+    path = tmp_path / "crashed.trace"
+    writer = TraceWriter(path, {})
+    writer.write(MIC_OPEN)
+    # Read while the writer is still open, as after a crash
+    assert [kind for kind, _, _ in read_trace(path)] == [META, MIC_OPEN]
+    writer.close()
+
+
+def test_records_are_grouped_into_exchanges(trace_path):
+    trace = SessionTrace(trace_path)
+    assert trace.meta == {"mode": "barge_in"}
+    assert len(trace.mic) == 1
+    assert [payload for _, payload in trace.mic[0].items] == [b"\x01\x00" * 4, b"\x02\x00" * 4]
+    assert trace.asr[0].items[0][1] == b"partial"
+    assert trace.llm[0].request == b"Capital of France?"
+    assert trace.tts == []
+    assert all(offset >= 0 for offset, _ in trace.mic[0].items)
+    assert trace.duration >= trace.llm[0].start
+
+
+def test_replay_hands_out_mic_streams_then_stops(trace_path):
+    stop = threading.Event()
+    replay = TraceReplay(SessionTrace(trace_path), speed=1000.0, stop_event=stop)
+    with replay.microphone() as mic:
+        assert list(mic) == [b"\x01\x00" * 4, b"\x02\x00" * 4]
+    assert not stop.is_set()
+    with replay.microphone() as mic:
+        assert list(mic) == []
+    assert stop.is_set()
@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+import shared_logging
+from shared_logging import JSONFormatter, _ContextFilter, _QueueHandler, _RateLimitFilter, log_context
+
+
+def _record(msg="ASR is falling behind", args=None, lineno=10, **extra):
+    record = logging.LogRecord("root", logging.WARNING, "agent.py", lineno, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(shared_logging.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_records_without_a_rate_limit_pass(clock):
+    limiter = _RateLimitFilter()
+    assert all(limiter.filter(_record()) for _ in range(5))
+
+
+def test_rate_limit_drops_repeats_and_reports_them(clock):
+    limiter = _RateLimitFilter()
+    assert limiter.filter(_record(rate_limit=1.0))
+    clock[0] += 0.4
+    assert not limiter.filter(_record(rate_limit=1.0))
+    clock[0] += 0.4
+    assert not limiter.filter(_record(rate_limit=1.0))
+    clock[0] += 0.4
+    record = _record(rate_limit=1.0)
+    assert limiter.filter(record)
+    assert record.suppressed == 2
+    assert record.getMessage() == "ASR is falling behind (2 similar suppressed)"
+    # The window restarts at the record that got through
+    clock[0] += 0.5
+    assert not limiter.filter(_record(rate_limit=1.0))
+
+
+def test_rate_limit_is_per_call_site(clock):
+    limiter = _RateLimitFilter()
+    assert limiter.filter(_record(rate_limit=1.0, lineno=10))
+    assert limiter.filter(_record(rate_limit=1.0, lineno=20))
+    assert not limiter.filter(_record(rate_limit=1.0, lineno=10))
+
+
+def test_queue_handler_merges_arguments_and_renders_tracebacks():
+    handler = _QueueHandler(queue.SimpleQueue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = _record("dropped %d chunks", (3,))
+        record.exc_info = sys.exc_info()
+    handler.handle(record)
+    queued = handler.queue.get_nowait()
+    assert (queued.msg, queued.args, queued.exc_info) == ("dropped 3 chunks", None, None)
+    assert "ValueError: boom" in queued.exc_text
+    # The caller's record is left alone
+    assert record.args == (3,)
+
+
+def test_json_lines_carry_context_and_extra_fields():
+    context = _ContextFilter()
+    with log_context(session="abc", turn=2):
+        record = _record(rate_limit=1.0, chunk=7)
+        context.filter(record)
+    event = json.loads(JSONFormatter().format(record))
+    assert event["msg"] == "ASR is falling behind"
+    assert (event["session"], event["turn"], event["chunk"]) == ("abc", 2, 7)
+    assert "rate_limit" not in event
+    # Fields passed with the call win over the context
+    with log_context(turn=3):
+        record = _record(turn=9)
+        context.filter(record)
+    assert record.turn == 9
@@ -0,0 +1,133 @@
+import time
+
+from speculation import SPECULATION_BUFFER, LLMRequest, SpeculationStats, SpeculativeReply, Speculator
+
+
+class FakeStream:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+def _replying(*deltas, endless=False):
+    """A stream function yielding fixed deltas, forever if ``endless``"""
+    calls = []
+
+    def stream(hypothesis, request):
+        calls.append(hypothesis)
+
+        def generate():
+            yield from deltas
+            while endless:
+                yield "."
+
+        return generate()
+
+    stream.calls = calls
+    return stream
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_request_closes_its_stream():
+    request = LLMRequest()
+    stream = FakeStream()
+    request.attach(stream)
+    request.close()
+    assert request.closed and stream.closed == 1
+    # Once detached, closing the request leaves the stream alone
+    other = LLMRequest()
+    other.attach(stream)
+    other.detach()
+    other.close()
+    assert stream.closed == 1
+
+
+def test_stream_attached_after_close_is_closed_at_once():
+    request = LLMRequest()
+    request.close()
+    stream = FakeStream()
+    request.attach(stream)
+    assert stream.closed == 1
+
+
+def test_reply_replays_buffered_deltas():
+    reply = SpeculativeReply("Um, capital of France?", _replying("Paris", " is", " the capital."))
+    assert reply.matches("capital of france")
+    assert not reply.matches("capital of spain")
+    assert "".join(reply.deltas()) == "Paris is the capital."
+
+
+def test_cancel_stops_an_endless_reply():
+    reply = SpeculativeReply("tell me a story", _replying(endless=True))
+    _wait_for(lambda: reply._deltas.full())
+    # The drain thread waits on the bounded buffer instead of reading ahead
+    assert reply._deltas.qsize() == SPECULATION_BUFFER
+    reply.cancel()
+    assert reply.request.closed
+    assert list(reply.deltas()) == []
+
+
+def _speculator(stream, window_ms=20, paused=lambda: False):
+    stats = SpeculationStats()
+    return Speculator(window_ms, stream, stats, paused), stats
+
+
+def test_stable_hypothesis_is_speculated_once():
+    stream = _replying("Paris.")
+    speculator, stats = _speculator(stream)
+    speculator.observe("capital of France", is_final=False)
+    # The same words again do not restart the timer
+    speculator.observe("Capital of France?", is_final=False)
+    _wait_for(lambda: stats.attempts == 1)
+    speculation = speculator.take()
+    assert speculation.hypothesis == "capital of France"
+    assert stream.calls == ["capital of France"]
+    assert speculator.take() is None
+
+
+def test_final_transcript_stops_the_timer():
+    stream = _replying("Paris.")
+    speculator, stats = _speculator(stream)
+    speculator.observe("capital of France", is_final=False)
+    speculator.observe("capital of France", is_final=True)
+    time.sleep(0.1)
+    assert stats.attempts == 0 and stream.calls == []
+
+
+def test_no_speculation_while_speaking():
+    stream = _replying("Paris.")
+    speculator, stats = _speculator(stream, paused=lambda: True)
+    speculator.observe("capital of France", is_final=False)
+    time.sleep(0.1)
+    assert stats.attempts == 0
+
+
+def test_timer_firing_after_the_hand_over_starts_nothing():
+    stream = _replying("Paris.")
+    speculator, stats = _speculator(stream, window_ms=10_000)
+    speculator.observe("capital of France", is_final=False)
+    generation = speculator._generation
+    # The final transcript is handed over while the fired timer waits for the lock
+    assert speculator.take() is None
+    speculator._speculate("capital of France", generation)
+    assert speculator.take() is None
+    assert stats.attempts == 0 and stream.calls == []
+
+
+def test_timer_for_a_superseded_hypothesis_starts_nothing():
+    stream = _replying("Paris.")
+    speculator, stats = _speculator(stream, window_ms=10_000)
+    speculator.observe("capital of", is_final=False)
+    generation = speculator._generation
+    speculator.observe("capital of France", is_final=False)
+    speculator._speculate("capital of", generation)
+    assert stats.attempts == 0
+    speculator.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from text_chunker import SentenceChunker
+
+
+def _chunk(text, min_chars=10, max_chars=80, step=3):
+    """Feed ``text`` in small deltas, like an LLM token stream"""
+    chunker = SentenceChunker(min_chars, max_chars)
+    return list(chunker.chunks(text[i:i + step] for i in range(0, len(text), step)))
+
+
+def test_splits_at_sentence_ends():
+    text = "The capital of France is Paris. It is on the Seine! Want to know more?"
+    assert _chunk(text) == ["The capital of France is Paris.", "It is on the Seine!", "Want to know more?"]
+
+
+def test_boundary_needs_the_following_whitespace():
+    chunker = SentenceChunker(5, 80)
+    # The period could still be a decimal point
+    assert chunker.feed("It costs 3.") == []
+    assert chunker.feed("50 euros. Then") == ["It costs 3.50 euros."]
+    assert chunker.flush() == "Then"
+
+
+def test_short_sentences_are_merged_up_to_min_chars():
+    assert _chunk("Yes. No. Maybe so. Definitely.", min_chars=12) == ["Yes. No. Maybe so.", "Definitely."]
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    assert _chunk('She said "hello there." Then she left.') == ['She said "hello there."', "Then she left."]
+
+
+@pytest.mark.parametrize("abbreviation", ["Dr.", "e.g.", "etc."])
+def test_abbreviations_do_not_end_a_sentence(abbreviation):
+    text = f"Ask your doctor {abbreviation} Smith about it today. Done."
+    assert _chunk(text)[0] == f"Ask your doctor {abbreviation} Smith about it today."
+
+
+def test_only_the_first_chunk_is_cut_at_a_clause():
+    text = "Well, to be honest with you, it depends, on many things, really. Then, later, more words, and more."
+    chunks = _chunk(text, min_chars=15)
+    assert chunks[0] == "Well, to be honest with you,"
+    assert chunks[1] == "it depends, on many things, really."
+    assert chunks[2] == "Then, later, more words, and more."
+
+
+@pytest.mark.parametrize("step", [3, 1000], ids=["streamed", "whole"])
+def test_long_chunks_are_forced_out_at_a_clause_or_word(step):
+    words = " ".join(["word"] * 30)
+    text = f"{words}; {words}. The end."
+    chunks = _chunk(text, min_chars=10, max_chars=60, step=step)
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert " ".join(chunks) == text
+    assert chunks[-1] == "The end."
+
+
+def test_unbroken_text_is_cut_at_max_chars():
+    chunker = SentenceChunker(10, 20)
+    assert chunker.feed("x" * 45) == ["x" * 20, "x" * 20]
+    assert chunker.flush() == "x" * 5
+
+
+def test_flush_returns_none_when_empty():
+    chunker = SentenceChunker()
+    assert chunker.feed("   ") == []
+    assert chunker.flush() is None
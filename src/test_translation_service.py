@@ -0,0 +1,100 @@
+import types
+
+import numpy as np
+import pytest
+
+from agent_config import build_arg_parser
+from audio_codec import mulaw_encode
+from translation_service import TranslationService, build_s2s_config
+
+
+def _args(*argv):
+    return build_arg_parser().parse_args(["--translate", "--target-language", "de-DE", *argv])
+
+
+def test_s2s_config_chains_recognition_translation_and_synthesis():
+    config = build_s2s_config(
+        _args(
+            "--source-language", "es-US",
+            "--translation-model", "megatronnmt_any_any_1b",
+            "--dnt-phrase", "Perceptra",
+            "--dnt-phrase", "NVIDIA",
+            "--voice", "German-DE.Female-1",
+            "--tts-rate-hz", "22050",
+        )
+    )
+    assert config.asr_config.config.language_code == "es-US"
+    # Only final transcripts are translated
+    assert not config.asr_config.interim_results
+    translation = config.translation_config
+    assert (translation.source_language_code, translation.target_language_code) == ("es-US", "de-DE")
+    assert translation.model_name == "megatronnmt_any_any_1b"
+    assert list(translation.dnt_phrases) == ["Perceptra", "NVIDIA"]
+    assert config.tts_config.language_code == "de-DE"
+    assert config.tts_config.voice_name == "German-DE.Female-1"
+    assert config.tts_config.sample_rate_hz == 22050
+
+
+def test_source_language_defaults_to_the_language_code():
+    config = build_s2s_config(_args("--language-code", "en-GB"))
+    assert config.asr_config.config.language_code == "en-GB"
+    assert config.translation_config.source_language_code == "en-GB"
+    assert config.translation_config.model_name == ""
+    assert config.tts_config.voice_name == ""
+
+
+def _response(audio: bytes):
+    return types.SimpleNamespace(speech=types.SimpleNamespace(audio=audio))
+
+
+class FakeS2S:
+    """Returns scripted responses and keeps what the request stream carried"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.sent = []
+        self.config = None
+
+    def streaming_s2s_response_generator(self, audio_chunks, streaming_config):
+        self.config = streaming_config
+        self.sent = list(audio_chunks)
+        return iter(self.responses)
+
+
+@pytest.fixture
+def service():
+    """A translation service without playback whose only backend is a FakeS2S"""
+
+    def make(responses, *argv):
+        args = _args(*argv)
+        args.play_audio = False
+        service = TranslationService(args)
+        fake = FakeS2S(responses)
+        service.pool.backends[0].service = fake
+        return service, fake
+
+    return make
+
+
+def test_translate_sends_mic_audio_and_ends_utterances(service):
+    speech = (8000 * np.sin(np.arange(1600) / 5)).astype("<i2").tobytes()
+    translated, fake = service([_response(b"\x01\x00" * 4), _response(b"\x02\x00" * 4), _response(b""), _response(b"")])
+    out = list(translated.translate(iter([speech, bytes(3200)])))
+    assert fake.sent == [speech, bytes(3200)]
+    assert fake.config is translated.s2s_config
+    # The empty buffer after an utterance is passed on once; a repeated one is not
+    assert out == [b"\x01\x00" * 4, b"\x02\x00" * 4, b""]
+    assert translated.utterances == 1
+    assert translated.audio_bytes == 16
+    assert translated.speech_end is not None and translated.first_audio_at is not None
+    translated.close()
+
+
+def test_translate_encodes_and_decodes_the_wire_format(service):
+    pcm = np.array([0, 1000, -1000, 20000], dtype="<i2").tobytes()
+    translated, fake = service([_response(mulaw_encode(pcm)), _response(b"")], "--asr-encoding", "mulaw", "--tts-encoding", "mulaw")
+    out = list(translated.translate(iter([pcm])))
+    assert fake.sent == [mulaw_encode(pcm)]
+    assert len(out) == 2 and len(out[0]) == len(pcm)
+    assert np.abs(np.frombuffer(out[0], "<i2").astype(int) - np.frombuffer(pcm, "<i2")).max() < 1024
+    translated.close()
@@ -0,0 +1,106 @@
+import os
+import threading
+from pathlib import Path
+
+from tts_cache import TTSCache
+
+
+def _key(text: str, **overrides) -> str:
+    params = dict(voice="English-US.Female-1", language_code="en-US", sample_rate_hz=44100, quality=20)
+    params.update(overrides)
+    return TTSCache.make_key(text, **params)
+
+
+def test_key_covers_every_synthesis_parameter():
+    base = _key("Hello.")
+    assert _key("Hello.") == base
+    assert _key("Hello!") != base
+    assert _key("Hello.", voice="English-US.Male-1") != base
+    assert _key("Hello.", sample_rate_hz=16000) != base
+    assert _key("Hello.", custom_dictionary={"nvidia": "en vidia"}) != base
+    assert _key("Hello.", encoding="mulaw") != base
+    # PCM keys are unchanged by the encoding parameter
+    assert _key("Hello.", encoding="pcm") == base
+
+
+def test_dictionary_order_does_not_change_the_key():
+    first = _key("Hi.", custom_dictionary={"a": "1", "b": "2"})
+    assert first == _key("Hi.", custom_dictionary={"b": "2", "a": "1"})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = TTSCache(memory_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert cache.stats()["memory_bytes"] == 8
+
+
+def test_oversized_and_empty_audio_is_not_cached():
+    cache = TTSCache(memory_bytes=4)
+    cache.put("big", b"12345")
+    cache.put("empty", b"")
+    assert cache.get("big") is None
+    assert cache.get("empty") is None
+    assert cache.stats()["memory_bytes"] == 0
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    TTSCache(memory_bytes=100, cache_dir=tmp_path, disk_bytes=100).put("ab12", b"audio")
+    cache = TTSCache(memory_bytes=100, cache_dir=tmp_path, disk_bytes=100)
+    assert cache.get("ab12") == b"audio"
+    assert cache.get("ab12") == b"audio"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    assert stats["hit_rate"] == 1.0
+
+
+def test_disk_index_reload_evicts_oldest_first(tmp_path):
+    cache = TTSCache(memory_bytes=0, cache_dir=tmp_path, disk_bytes=100)
+    for index, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, bytes(40))
+        os.utime(tmp_path / key[:2] / f"{key}.pcm", (index, index))
+    reloaded = TTSCache(memory_bytes=0, cache_dir=tmp_path, disk_bytes=80)
+    assert reloaded.stats()["disk_bytes"] == 80
+    assert reloaded.get("aa01") is None
+    assert not (tmp_path / "aa" / "aa01.pcm").exists()
+    assert reloaded.get("cc03") == bytes(40)
+
+
+def test_unreadable_entry_is_dropped(tmp_path):
+    cache = TTSCache(memory_bytes=0, cache_dir=tmp_path, disk_bytes=100)
+    cache.put("ab12", b"audio")
+    (tmp_path / "ab" / "ab12.pcm").unlink()
+    assert cache.get("ab12") is None
+    assert cache.stats()["disk_bytes"] == 0
+    assert cache.misses == 1
+
+
+def test_slow_disk_read_does_not_block_memory_hits(tmp_path, monkeypatch):
+    cache = TTSCache(memory_bytes=100, cache_dir=tmp_path, disk_bytes=100)
+    cache.put("ab12", b"disk")
+    cache._memory.clear()
+    cache._memory_size = 0
+    cache.put("cd34", b"memory")
+
+    reading, release = threading.Event(), threading.Event()
+    read_bytes = Path.read_bytes
+
+    def slow_read(path):
+        reading.set()
+        release.wait(2)
+        return read_bytes(path)
+
+    monkeypatch.setattr(Path, "read_bytes", slow_read)
+    reader = threading.Thread(target=cache.get, args=("ab12",))
+    reader.start()
+    assert reading.wait(2)
+    # The disk read is in progress and the memory tier still answers
+    assert cache.get("cd34") == b"memory"
+    release.set()
+    reader.join()
+    assert cache.stats()["disk_hits"] == 1
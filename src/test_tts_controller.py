@@ -0,0 +1,111 @@
+import types
+
+import pytest
+
+from tts_controller import BATCH_SECONDS_PER_CHAR, LENGTH_BUCKETS, Decision, TTSController, build_tts_controller
+
+SHORT = "Hello there."
+LONG = "x" * 150
+
+
+def _controller(**kwargs):
+    kwargs.setdefault("slo_seconds", 0.3)
+    kwargs.setdefault("qualities", [20])
+    kwargs.setdefault("probe_every", 1000)
+    return TTSController(**kwargs)
+
+
+def _teach(controller, stream, quality, text, first_audio, times=4):
+    bucket = controller.bucket(text)
+    for _ in range(times):
+        controller.observe(Decision(stream, quality, bucket, None), first_audio, first_audio * 2, 1.0)
+
+
+def test_length_buckets():
+    assert [TTSController.bucket("x" * n) for n in (0, 40, 41, 120, 121)] == [0, 0, 1, 1, len(LENGTH_BUCKETS)]
+
+
+def test_untried_batch_is_estimated_by_length():
+    controller = _controller()
+    # 12 characters are estimated well inside the SLO, 150 are not
+    assert len(SHORT) * BATCH_SECONDS_PER_CHAR < 0.3 < len(LONG) * BATCH_SECONDS_PER_CHAR
+    assert controller.choose(SHORT).mode == "batch"
+    decision = controller.choose(LONG)
+    assert decision.mode == "stream"
+    assert decision.predicted is None
+
+
+def test_measured_arms_decide():
+    controller = _controller(qualities=[40, 20])
+    _teach(controller, False, 40, SHORT, 0.5)
+    _teach(controller, True, 40, SHORT, 0.2)
+    decision = controller.choose(SHORT)
+    assert (decision.mode, decision.quality) == ("stream", 40)
+    assert decision.predicted == pytest.approx(0.2)
+
+
+def test_cheaper_quality_when_nothing_meets_the_slo_at_the_top():
+    controller = _controller(qualities=[40, 20])
+    _teach(controller, False, 40, SHORT, 0.9)
+    _teach(controller, True, 40, SHORT, 0.6)
+    _teach(controller, False, 20, SHORT, 0.25)
+    decision = controller.choose(SHORT)
+    assert (decision.mode, decision.quality) == ("batch", 20)
+
+
+def test_fastest_arm_when_none_meets_the_slo():
+    controller = _controller()
+    _teach(controller, False, 20, SHORT, 0.9)
+    _teach(controller, True, 20, SHORT, 0.6)
+    assert controller.choose(SHORT).mode == "stream"
+
+
+def test_probe_tries_the_next_preferred_arm():
+    controller = _controller(probe_every=3)
+    _teach(controller, False, 20, SHORT, 0.9)
+    _teach(controller, True, 20, SHORT, 0.2)
+    modes = [controller.choose(SHORT).mode for _ in range(6)]
+    assert modes == ["stream", "stream", "batch", "stream", "stream", "batch"]
+
+
+@pytest.mark.parametrize("first_audio, bound", [(100.0, 10.0), (0.0001, 0.5)])
+def test_slowdown_is_clamped(first_audio, bound):
+    controller = _controller()
+    decision = Decision(True, 20, 0, 0.2)
+    for _ in range(50):
+        controller.observe(decision, first_audio, first_audio, 1.0)
+    assert controller.slowdown == pytest.approx(bound)
+
+
+def test_slowdown_scales_every_prediction():
+    controller = _controller()
+    _teach(controller, False, 20, SHORT, 0.2, times=10)
+    decision = controller.choose(SHORT)
+    assert (decision.mode, decision.predicted) == ("batch", pytest.approx(0.2))
+    # Twice as slow as predicted moves the shared factor a fifth of the way
+    controller.observe(decision, 0.4, 0.4, 1.0)
+    assert controller.slowdown == pytest.approx(1.2)
+    assert controller.choose(SHORT).predicted == pytest.approx(0.24)
+
+
+def test_snapshot_reports_each_arm():
+    controller = _controller()
+    _teach(controller, True, 20, LONG, 0.2)
+    # An arm looked up before any sample arrived
+    controller._first_audio[(False, 20, 0)]
+    rows = {(row["mode"], row["max_chars"]): row for row in controller.snapshot()}
+    assert rows[("stream", None)]["samples"] == 4
+    assert rows[("stream", None)]["predicted_first_audio"] == pytest.approx(0.2)
+    assert rows[("stream", None)]["throughput"] == pytest.approx(2.5)
+    assert rows[("batch", 40)] == {
+        "mode": "batch", "quality": 20, "max_chars": 40, "samples": 0, "predicted_first_audio": None, "throughput": None,
+    }
+
+
+def test_build_only_with_an_slo():
+    args = types.SimpleNamespace(tts_slo_ms=0, tts_quality_levels=[40, 20], audio_prompt_file=None)
+    assert build_tts_controller(args, 20) is None
+    args.tts_slo_ms = 300
+    assert [quality for _, quality in build_tts_controller(args, 20).arms] == [20, 20]
+    args.audio_prompt_file = "voice.wav"
+    assert [quality for _, quality in build_tts_controller(args, 20).arms] == [40, 40, 20, 20]
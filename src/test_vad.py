@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from vad import VoiceActivityGate
+
+RATE = 16000
+CHUNK = 1600  # 100 ms
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def _noise(rng, db: float, frames: int = CHUNK) -> bytes:
+    level = 32768 * 10 ** (db / 20)
+    return rng.normal(0, level, frames).clip(-32768, 32767).astype("<i2").tobytes()
+
+
+def _silence(frames: int = CHUNK) -> bytes:
+    return bytes(2 * frames)
+
+
+def test_classifies_loud_audio_as_speech(rng):
+    gate = VoiceActivityGate(RATE)
+    assert not gate.is_speech(_silence())
+    assert gate.is_speech(_noise(rng, -20))
+
+
+def test_short_chunks_are_not_speech():
+    gate = VoiceActivityGate(RATE)
+    assert not gate.is_speech(b"\xff\x7f" * 10)
+
+
+def test_utterance_has_preroll_and_ends_after_hangover(rng):
+    gate = VoiceActivityGate(RATE, hangover_ms=300, preroll_ms=200)
+    silence = [_silence() for _ in range(5)]
+    speech = [_noise(rng, -20) for _ in range(3)]
+    trailing = [_silence() for _ in range(10)]
+    out = list(gate.utterance(iter(silence + speech + trailing)))
+    # Two chunks of pre-roll, the speech and three chunks of hangover
+    assert out == silence[-2:] + speech + trailing[:3]
+    assert gate.utterances == 1
+
+
+def test_filter_suppresses_silence_between_utterances(rng):
+    gate = VoiceActivityGate(RATE, hangover_ms=200, preroll_ms=0)
+    chunks = [_noise(rng, -20)] + [_silence()] * 10 + [_noise(rng, -20)] + [_silence()] * 10
+    out = list(gate.filter(chunks))
+    assert len(out) == 6
+    assert gate.utterances == 2
+    stats = gate.stats()
+    assert stats["audio_s"] == pytest.approx(2.2)
+    assert stats["sent_s"] == pytest.approx(0.6)
+
+
+def test_noise_floor_follows_rising_background_noise(rng):
+    gate = VoiceActivityGate(RATE)
+    for _ in range(20):
+        gate.is_speech(_noise(rng, -60))
+    # Steady noise louder than the initial threshold is speech at first ...
+    assert gate.is_speech(_noise(rng, -38))
+    for _ in range(300):
+        gate.is_speech(_noise(rng, -38))
+    # ... until the floor has caught up with it; speech above it still counts
+    assert not gate.is_speech(_noise(rng, -38))
+    assert gate.is_speech(_noise(rng, -15))
+
+
+def test_noise_floor_adapts_while_speech_continues(rng):
+    gate = VoiceActivityGate(RATE)
+    # Loud speech with short pauses at a raised background level
+    for index in range(400):
+        gate.is_speech(_noise(rng, -15 if index % 4 else -40))
+    assert gate.noise_floor_db > -45
@@ -0,0 +1,106 @@
+import re
+from typing import Iterable, Iterator, List, Optional
+
+
+class SentenceChunker:
+    """
+    Split a stream of LLM text deltas into speakable sentence or clause chunks.
+
+    Chunks are cut at sentence boundaries once they reach ``min_chars``. The
+    first chunk may also be cut at a clause boundary so that synthesis can
+    start as early as possible. Chunks longer than ``max_chars`` are forced
+    out at the last clause or word boundary.
+    """
+
+    SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*(?=\s)")
+    CLAUSE_END = re.compile(r"[,;:—](?=\s)")
+    ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "e.g.", "i.e.", "etc."}
+
+    def __init__(self, min_chars: int = 24, max_chars: int = 240):
+        """
+        Args:
+            min_chars (int): Minimum chunk length before a boundary is honoured.
+            max_chars (int): Length after which a chunk is cut regardless.
+        """
+        self.min_chars = min_chars
+        self.max_chars = max(max_chars, min_chars)
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, delta: str) -> List[str]:
+        """
+        Add a text delta and return any chunks that are now complete.
+
+        Args:
+            delta (str): Text fragment from the token stream
+
+        Returns:
+            List[str]: Completed chunks, in order
+        """
+        self._buffer += delta
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:].lstrip()
+            if chunk:
+                self._emitted += 1
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> Optional[str]:
+        """
+        Return whatever text is left in the buffer once the stream has ended.
+        """
+        chunk = self._buffer.strip()
+        self._buffer = ""
+        if not chunk:
+            return None
+        self._emitted += 1
+        return chunk
+
+    def chunks(self, deltas: Iterable[str]) -> Iterator[str]:
+        """
+        Lazily turn an iterable of text deltas into an iterator of chunks.
+        """
+        for delta in deltas:
+            yield from self.feed(delta)
+        tail = self.flush()
+        if tail:
+            yield tail
+
+    def _find_cut(self) -> Optional[int]:
+        # A boundary past max_chars is only seen when a delta arrives in one
+        # piece (e.g. a cached reply); cut at the max_chars fallback instead
+        for match in self.SENTENCE_END.finditer(self._buffer):
+            if match.end() > self.max_chars:
+                break
+            if match.end() < self.min_chars:
+                continue
+            if self._is_abbreviation(match.start()):
+                continue
+            return match.end()
+
+        if self._emitted == 0:
+            for match in self.CLAUSE_END.finditer(self._buffer):
+                if match.end() > self.max_chars:
+                    break
+                if match.end() >= self.min_chars:
+                    return match.end()
+
+        if len(self._buffer) <= self.max_chars:
+            return None
+
+        window = self._buffer[: self.max_chars]
+        clauses = list(self.CLAUSE_END.finditer(window))
+        if clauses and clauses[-1].end() >= self.min_chars:
+            return clauses[-1].end()
+        space = window.rfind(" ")
+        return space if space >= self.min_chars else self.max_chars
+
+    def _is_abbreviation(self, end: int) -> bool:
+        start = self._buffer.rfind(" ", 0, end) + 1
+        word = self._buffer[start:end + 1].lower()
+        return word in self.ABBREVIATIONS
@@ -0,0 +1,215 @@
+import itertools
+import time
+import riva.client
+from agent_config import audio_rates
+from asr_service import _MicFeed, build_streaming_config, open_microphone
+from audio_codec import Decoder, encode_chunks, proto_encoding
+from channels import ChannelManager, split_endpoints
+from endpoint_pool import build_endpoint_pool
+from metrics import TRANSLATION_LATENCY
+from playback import PlaybackEngine
+from resample import AudioConverter
+from shared_logging import setup_logger
+from vad import VoiceActivityGate, build_vad
+
+logger = setup_logger()
+
+
+def build_s2s_config(args) -> riva.client.StreamingTranslateSpeechToSpeechConfig:
+    """Recognition in --source-language, translation to --target-language and synthesis in one config"""
+    asr_config = build_streaming_config(args)
+    asr_config.config.language_code = args.source_language or args.language_code
+    asr_config.interim_results = False
+    return riva.client.StreamingTranslateSpeechToSpeechConfig(
+        asr_config=asr_config,
+        translation_config=riva.client.TranslationConfig(
+            source_language_code=args.source_language or args.language_code,
+            target_language_code=args.target_language,
+            model_name=args.translation_model or "",
+            dnt_phrases=args.dnt_phrase or [],
+        ),
+        tts_config=riva.client.SynthesizeSpeechConfig(
+            encoding=proto_encoding(args.tts_encoding),
+            sample_rate_hz=audio_rates(args).tts,
+            voice_name=args.voice or "",
+            language_code=args.target_language,
+        ),
+    )
+
+
+class TranslationService:
+    """
+    Speech-to-speech translation over Riva's StreamingTranslateSpeechToSpeech
+    RPC (--translate).
+
+    Mic audio goes up and translated speech comes back on one bidirectional
+    stream; recognition, translation and synthesis are chained on the server,
+    so there is no transcript, LLM request or synthesis request per turn.
+    The server sends an empty audio buffer after the speech of each
+    utterance.
+    """
+
+    def __init__(self, args, channels=None):
+        self.args = args
+        self._owns_channels = channels is None
+        self.channels = channels or ChannelManager(args)
+        # Riva serves NMT next to ASR unless --nmt-server says otherwise
+        self.pool = build_endpoint_pool(
+            "NMT",
+            split_endpoints(args.nmt_server or args.asr_server),
+            self.channels,
+            riva.client.NeuralMachineTranslationClient,
+        )
+        self.rates = audio_rates(args)
+        self.s2s_config = build_s2s_config(args)
+        # --vad gates what is sent; the speech detector only timestamps the end of speech
+        self.vad = build_vad(args)
+        self._speech = VoiceActivityGate(self.rates.capture, args.vad_threshold_db)
+
+        self.playback = None
+        self.converter = AudioConverter(
+            self.rates.tts,
+            self.rates.playback,
+            1,
+            self.args.playback_channels,
+            self.args.playback_format,
+        )
+        if self.args.output_device is not None or self.args.play_audio:
+            self.playback = PlaybackEngine(
+                self.args.output_device,
+                self.rates.playback,
+                nchannels=self.args.playback_channels,
+                sampwidth=self.converter.out_width,
+                buffer_ms=self.args.playback_buffer_ms,
+            )
+            self.playback.start()
+
+        # perf_counter() of the last mic chunk with speech, and of the first
+        # translated audio of the latest utterance
+        self.speech_end = None
+        self.first_audio_at = None
+        self.utterances = 0
+        self.audio_bytes = 0
+
+    def warm_up(self):
+        """Run a short silent stream on every backend so the first utterance is not the slowest"""
+        self.pool.for_each(self._warm_up_backend)
+
+    def _warm_up_backend(self, backend):
+        if backend.serving is False:
+            return
+        start = time.time()
+        try:
+            silence = bytes(2 * self.args.file_streaming_chunk)
+            for _ in backend.service.streaming_s2s_response_generator(
+                audio_chunks=self._encoded([silence]), streaming_config=self.s2s_config
+            ):
+                pass
+        except Exception as e:
+            logger.warning(f"S2S translation warm-up of {backend.uri} failed: {str(e)}")
+            return
+        logger.info(f"S2S translation warm-up of {backend.uri}: {(time.time() - start):.3f}s")
+
+    def _encoded(self, audio_chunks):
+        """Resample mic PCM to --asr-rate-hz and encode it with --asr-encoding"""
+        if self.rates.capture != self.rates.asr:
+            audio_chunks = AudioConverter(self.rates.capture, self.rates.asr).stream(audio_chunks)
+        return encode_chunks(audio_chunks, self.args.asr_encoding, self.rates.asr)
+
+    def _track_speech(self, audio_chunks):
+        """Timestamp the last chunk with speech as the request stream reads it"""
+        for chunk in audio_chunks:
+            if self._speech.is_speech(chunk):
+                self.speech_end = time.perf_counter()
+            yield chunk
+
+    def translate(self, audio_chunks):
+        """
+        Stream mic audio through one S2S RPC and yield the translated speech as it arrives.
+
+        Args:
+            audio_chunks: 16-bit PCM chunks at the capture rate
+
+        Yields:
+            bytes: 16-bit PCM at the TTS rate; an empty chunk ends each utterance
+        """
+        with self.pool.lease() as backend:
+            responses = backend.service.streaming_s2s_response_generator(
+                audio_chunks=self._encoded(self._track_speech(audio_chunks)),
+                streaming_config=self.s2s_config,
+            )
+            decoder = Decoder(self.args.tts_encoding)
+            first = True
+            for response in responses:
+                if not response.speech.audio:
+                    tail = decoder.flush()
+                    if tail:
+                        yield tail
+                    if not first:
+                        self.utterances += 1
+                        yield b""
+                    decoder = Decoder(self.args.tts_encoding)
+                    first = True
+                    continue
+                audio = decoder.decode(response.speech.audio)
+                if not audio:
+                    continue
+                if first:
+                    first = False
+                    self.first_audio_at = time.perf_counter()
+                    if self.speech_end is not None and self.first_audio_at > self.speech_end:
+                        TRANSLATION_LATENCY.observe(self.first_audio_at - self.speech_end)
+                self.audio_bytes += len(audio)
+                yield audio
+            tail = decoder.flush()
+            if tail:
+                yield tail
+
+    def _play(self, audio):
+        if self.playback is None:
+            return
+        # An empty chunk ends the utterance and pushes out the resampler's tail
+        self.playback.write(self.converter.convert(audio) if audio else self.converter.flush())
+
+    def run(self, stop_event=None):
+        """
+        Translate the microphone until ``stop_event`` is set, playing the
+        translated speech chunk by chunk as it arrives.
+
+        One mic stream feeds a long-lived RPC that is reopened on errors or
+        server-side stream limits, like ``ASRService.listen``. With --vad each
+        RPC carries one utterance and is only opened once speech starts.
+        """
+        with open_microphone(self.args) as audio_stream:
+            feed = _MicFeed(audio_stream, stop_event)
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    chunks = feed.chunks()
+                    if self.vad is not None:
+                        chunks = self.vad.utterance(chunks)
+                        first = next(chunks, None)
+                        if first is None:
+                            return
+                        chunks = itertools.chain([first], chunks)
+                    for audio in self.translate(chunks):
+                        self._play(audio)
+                    if audio_stream.closed:
+                        return
+                except Exception as e:
+                    if stop_event is not None and stop_event.is_set():
+                        return
+                    logger.error(f"S2S translation stream error, reconnecting: {str(e)}")
+                    time.sleep(0.5)
+
+    def close(self):
+        """Report the translated utterances and audio, and the load per backend"""
+        seconds = self.audio_bytes / (2 * self.rates.tts)
+        logger.info(f"S2S translation: {self.utterances} utterances, {seconds:.1f}s of translated speech")
+        if self.vad is not None:
+            self.vad.log_stats()
+        self.pool.log_stats()
+        self.pool.close()
+        if self.playback is not None:
+            self.playback.close()
+        if self._owns_channels:
+            self.channels.close()
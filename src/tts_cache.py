@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized PCM.
+
+    Entries are keyed by everything that affects the audio (text, voice,
+    language, sample rate, quality, custom dictionary). Lookups hit a bounded
+    in-memory LRU first, then an optional on-disk tier of raw ``.pcm`` files;
+    a disk hit is read once and promoted to the memory tier. Both tiers evict
+    least recently used entries once their byte budget is exceeded.
+
+    The lock only guards the indexes and counters; files are read, written
+    and deleted outside it, so a slow disk never stalls memory hits.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        cache_dir: Optional[Union[str, Path]] = None,
+        disk_bytes: int = 0,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else None
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._writing = set()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(
+        text: str,
+        voice: Optional[str],
+        language_code: str,
+        sample_rate_hz: int,
+        quality: int,
+        custom_dictionary: Optional[Dict[str, str]] = None,
+        encoding: str = "pcm",
+    ) -> str:
+        """
+        Build the cache key for a synthesis request.
+
+        Args:
+            encoding (str): Transport encoding; lossy codecs change the decoded audio
+
+        Returns:
+            str: Hex SHA-256 digest of the request parameters
+        """
+        params = [text, voice, language_code, sample_rate_hz, quality, sorted((custom_dictionary or {}).items())]
+        if encoding != "pcm":
+            # Appended only for compressed transport so existing PCM keys stay valid
+            params.append(encoding)
+        payload = json.dumps(params, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up cached audio.
+
+        Returns:
+            Optional[bytes]: PCM, or None on a miss
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+            if key not in self._disk:
+                self.misses += 1
+                return None
+
+        audio = error = None
+        try:
+            audio = self._path(key).read_bytes()
+        except OSError as e:
+            error = e
+
+        with self._lock:
+            if audio is None:
+                if key in self._disk:
+                    logger.warning(f"TTS cache: dropping unreadable entry {key[:12]}: {error}")
+                    self._disk_size -= self._disk.pop(key)
+                self.misses += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        """Store audio in the memory tier and, if configured, on disk"""
+        if not audio:
+            return
+        audio = bytes(audio)
+        with self._lock:
+            self._remember(key, audio)
+            if self.cache_dir is None or len(audio) > self.disk_bytes or key in self._disk or key in self._writing:
+                return
+            self._writing.add(key)
+
+        written = self._write_disk(key, audio)
+        with self._lock:
+            self._writing.discard(key)
+            evicted = []
+            if written:
+                self._disk[key] = len(audio)
+                self._disk_size += len(audio)
+                evicted = self._evict_disk()
+        self._unlink(evicted)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Hit/miss counters and tier occupancy"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_bytes": self._memory_size,
+            "disk_bytes": self._disk_size,
+        }
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pcm"
+
+    def _load_disk_index(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.pcm"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self._unlink(self._evict_disk())
+        logger.info(f"TTS cache: {len(self._disk)} entries on disk ({self._disk_size / 1e6:.1f} MB)")
+
+    def _write_disk(self, key: str, audio: bytes) -> bool:
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"TTS cache: could not write entry: {e}")
+            return False
+        return True
+
+    def _evict_disk(self) -> List[str]:
+        """Drop least recently used entries from the disk index; returns their keys"""
+        evicted = []
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            evicted.append(key)
+        return evicted
+
+    def _unlink(self, keys: List[str]):
+        for key in keys:
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
@@ -0,0 +1,154 @@
+import collections
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from metrics import TTS_CONTROLLER_DECISIONS
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+# Upper bounds in characters of the text length buckets; the last is open-ended
+LENGTH_BUCKETS = (40, 120)
+# Pessimistic first-audio estimate of an untried batch arm: batch audio only
+# arrives once the whole text is synthesized
+BATCH_SECONDS_PER_CHAR = 0.01
+
+
+class Decision(NamedTuple):
+    stream: bool
+    quality: int
+    bucket: int
+    predicted: Optional[float]
+
+    @property
+    def mode(self) -> str:
+        return "stream" if self.stream else "batch"
+
+
+class TTSController:
+    """
+    Picks streaming vs batch synthesis and the zero-shot quality per utterance
+    to keep time to first audio under an SLO.
+
+    Every (mode, quality, text length bucket) arm keeps its last ``window``
+    time-to-first-audio and throughput observations; an arm's prediction is
+    the 90th percentile of its window, scaled by a shared slowdown factor
+    (smoothed ratio of observed to predicted latency across all arms), so a
+    slow TTS server pushes every arm towards cheaper settings at once.
+
+    Arms are preferred by quality, then batch over streaming. The first arm
+    predicted to meet the SLO wins. A streaming arm without data is tried as
+    if it met the SLO exactly; a batch arm without data is estimated at
+    ``BATCH_SECONDS_PER_CHAR`` per character, so long sentences start out
+    streaming. If none is predicted to meet it, the fastest is used.
+    Every ``probe_every`` decisions the next preferred arm is tried once, so
+    the controller recovers after the server speeds up again.
+    """
+
+    def __init__(
+        self,
+        slo_seconds: float,
+        qualities: Sequence[int],
+        modes: Sequence[bool] = (False, True),
+        window: int = 16,
+        probe_every: int = 20,
+    ):
+        self.slo_seconds = slo_seconds
+        self.arms = [(stream, quality) for quality in sorted(set(qualities), reverse=True) for stream in modes]
+        self.window = window
+        self.probe_every = probe_every
+        self.slowdown = 1.0
+        self.decisions = 0
+        self._first_audio: Dict[tuple, collections.deque] = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.window)
+        )
+        self._throughput: Dict[tuple, collections.deque] = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.window)
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket(text: str) -> int:
+        for index, limit in enumerate(LENGTH_BUCKETS):
+            if len(text) <= limit:
+                return index
+        return len(LENGTH_BUCKETS)
+
+    def _predict(self, stream: bool, quality: int, bucket: int) -> Optional[float]:
+        samples = self._first_audio.get((stream, quality, bucket))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))] * self.slowdown
+
+    def choose(self, text: str) -> Decision:
+        """Pick the mode and quality for one utterance"""
+        bucket = self.bucket(text)
+        with self._lock:
+            self.decisions += 1
+            predictions = [self._predict(stream, quality, bucket) for stream, quality in self.arms]
+            # Estimates only steer the choice; the slowdown factor learns from real predictions
+            expected = [
+                len(text) * BATCH_SECONDS_PER_CHAR * self.slowdown if predicted is None and not stream else predicted
+                for predicted, (stream, _) in zip(predictions, self.arms)
+            ]
+            index = next(
+                (i for i, predicted in enumerate(expected) if predicted is None or predicted <= self.slo_seconds),
+                None,
+            )
+            if index is None:
+                index = min(range(len(self.arms)), key=lambda i: expected[i])
+            if index > 0 and self.decisions % self.probe_every == 0:
+                index -= 1
+            stream, quality = self.arms[index]
+            decision = Decision(stream, quality, bucket, predictions[index])
+
+        TTS_CONTROLLER_DECISIONS.inc(mode=decision.mode, quality=str(quality))
+        predicted = "unknown" if decision.predicted is None else f"{decision.predicted:.3f}s"
+        logger.info(
+            f"TTS controller: {decision.mode} quality={quality} for {len(text)} chars "
+            f"(predicted first audio {predicted}, SLO {self.slo_seconds:.3f}s, slowdown x{self.slowdown:.2f})"
+        )
+        return decision
+
+    def observe(self, decision: Decision, first_audio: float, total: float, audio_seconds: float):
+        """Feed back the measured time to first audio and synthesis throughput of a decision"""
+        arm = (decision.stream, decision.quality, decision.bucket)
+        with self._lock:
+            if decision.predicted:
+                ratio = first_audio / (decision.predicted / self.slowdown)
+                self.slowdown = min(10.0, max(0.5, 0.8 * self.slowdown + 0.2 * ratio))
+            self._first_audio[arm].append(first_audio)
+            if total > 0:
+                self._throughput[arm].append(audio_seconds / total)
+
+    def snapshot(self) -> List[Dict]:
+        """Current model per arm, for logs and reports"""
+        with self._lock:
+            rows = []
+            for (stream, quality, bucket), samples in sorted(self._first_audio.items()):
+                throughput = self._throughput.get((stream, quality, bucket))
+                predicted = self._predict(stream, quality, bucket)
+                rows.append({
+                    "mode": "stream" if stream else "batch",
+                    "quality": quality,
+                    "max_chars": LENGTH_BUCKETS[bucket] if bucket < len(LENGTH_BUCKETS) else None,
+                    "samples": len(samples),
+                    "predicted_first_audio": round(predicted, 4) if predicted is not None else None,
+                    "throughput": round(sum(throughput) / len(throughput), 3) if throughput else None,
+                })
+            return rows
+
+    def log_stats(self):
+        logger.info(f"TTS controller: {self.decisions} decisions, slowdown x{self.slowdown:.2f}")
+        for row in self.snapshot():
+            logger.info(f"TTS controller model: {row}")
+
+
+def build_tts_controller(args, default_quality: int):
+    """Create the controller if --tts-slo-ms is set"""
+    if args.tts_slo_ms <= 0:
+        return None
+    # Riva only applies quality to zero-shot synthesis
+    qualities = args.tts_quality_levels if args.audio_prompt_file is not None else [default_quality]
+    return TTSController(args.tts_slo_ms / 1000, qualities)
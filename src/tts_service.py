@@ -1,27 +1,203 @@
+import json
+import queue
+import threading
 import wave
 import time
+import grpc
 import riva.client
-import riva.client.audio_io
-import os
-import anthropic
-from dotenv import load_dotenv
+from agent_config import audio_rates
+from audio_codec import Decoder, proto_encoding
+from channels import ChannelManager, split_endpoints
+from endpoint_pool import build_endpoint_pool
+from metrics import TTS_HEDGES, TTS_TIME_TO_FIRST_AUDIO
+from playback import PlaybackEngine
+from resample import AudioConverter
+from session_trace import TTS_AUDIO, TTS_OPEN
 from shared_logging import setup_logger
+from tts_cache import TTSCache
+from tts_controller import build_tts_controller
 
 logger = setup_logger()
 
+_END_OF_STREAM = object()
+
+
+def load_custom_dictionary(file_path):
+    """Parse a user dictionary file with key-value pairs separated by double spaces"""
+    result_dict = {}
+    if file_path is None:
+        return result_dict
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            try:
+                key, value = line.split('  ', 1)
+                result_dict[str(key.strip())] = str(value.strip())
+            except ValueError:
+                logger.warning(f"Malformed custom dictionary line: {line}")
+    return result_dict
+
+
+def build_tts_cache(args):
+    """Create the synthesis cache configured on the command line, if any"""
+    if args.tts_cache_memory_mb <= 0 and not args.tts_cache_dir:
+        return None
+    return TTSCache(
+        args.tts_cache_memory_mb * 1024 * 1024,
+        cache_dir=args.tts_cache_dir,
+        disk_bytes=args.tts_cache_disk_mb * 1024 * 1024 if args.tts_cache_dir else 0,
+    )
+
 
 class TTSService:
-    def __init__(self, args):
+    def __init__(self, args, channels=None, recorder=None):
         """Initialize TTS service with configuration parameters"""
-        load_dotenv()  # This will load the .env file
-
         self.args = args
-        self.tts_auth = riva.client.Auth(
-            args.ssl_cert, args.use_ssl, args.tts_server, args.metadata
+        self._owns_channels = channels is None
+        self.channels = channels or ChannelManager(args)
+        # --record-trace writer, if any
+        self.recorder = recorder
+        # Every --tts-server endpoint; RPCs go to the least loaded one
+        self.pool = build_endpoint_pool(
+            "TTS", split_endpoints(args.tts_server), self.channels, riva.client.SpeechSynthesisService
         )
-        self.tts_service = riva.client.SpeechSynthesisService(self.tts_auth)
+        self.tts_auth = self.pool.primary.auth
+        self.tts_service = self.pool.primary.service
+        # Format of the synthesized audio; playback may differ (--playback-*)
+        self.rates = audio_rates(args)
         self.nchannels = 1
         self.sampwidth = 2
+        self.quality = 20 if self.args.quality is None else self.args.quality
+        self.custom_dictionary = load_custom_dictionary(self.args.custom_dictionary)
+        self.cache = build_tts_cache(self.args)
+        self.controller = build_tts_controller(self.args, self.quality)
+
+        # One output stream for the lifetime of the service
+        self.playback = None
+        self.converter = AudioConverter(
+            self.rates.tts,
+            self.rates.playback,
+            self.nchannels,
+            self.args.playback_channels,
+            self.args.playback_format,
+        )
+        if self.args.output_device is not None or self.args.play_audio:
+            self.playback = PlaybackEngine(
+                self.args.output_device,
+                self.rates.playback,
+                nchannels=self.args.playback_channels,
+                sampwidth=self.converter.out_width,
+                buffer_ms=self.args.playback_buffer_ms,
+            )
+            self.playback.start()
+
+        # Barge-in support: the in-flight RPC can be cancelled from another thread
+        self._cancelled = threading.Event()
+        self._call_lock = threading.Lock()
+        self._active_calls = ()
+
+        # perf_counter() of the first audio of the current utterance written
+        # to the device, and of the pending synthesis request that has not
+        # produced audio yet
+        self.first_audio_at = None
+        self._awaiting_audio = None
+        self._chunk_first_audio = None
+
+    def cancel(self):
+        """
+        Stop speaking now: cancel the in-flight synthesis RPC and drop queued audio.
+
+        Safe to call from any thread; the current ``speak_stream`` or
+        ``synthesize_speech`` call returns promptly afterwards.
+        """
+        self._cancelled.set()
+        with self._call_lock:
+            for call in self._active_calls:
+                call.cancel()
+        if self.playback is not None:
+            self.playback.flush()
+
+    def _track_call(self, *calls):
+        """Remember the in-flight RPCs (two while hedging) so that cancel() can reach them"""
+        with self._call_lock:
+            self._active_calls = calls
+            if self._cancelled.is_set():
+                for call in calls:
+                    call.cancel()
+
+    def warm_up(self):
+        """Fetch the synthesis config and run a tiny synthesis on every backend so the first turn is not the slowest"""
+        self.pool.for_each(self._warm_up_backend)
+
+    def _warm_up_backend(self, backend):
+        if backend.serving is False:
+            return
+        start = time.time()
+        try:
+            backend.service.stub.GetRivaSynthesisConfig(
+                riva.client.proto.riva_tts_pb2.RivaSynthesisConfigRequest(),
+                metadata=backend.auth.get_auth_metadata(),
+            )
+            backend.service.synthesize(
+                "Hi.",
+                self.args.voice,
+                self.args.language_code,
+                encoding=proto_encoding(self.args.tts_encoding),
+                sample_rate_hz=self.rates.tts,
+            )
+        except Exception as e:
+            logger.warning(f"TTS warm-up of {backend.uri} failed: {e}")
+            return
+        logger.info(f"TTS warm-up of {backend.uri}: {(time.time() - start):.3f}s")
+
+    def close(self):
+        """Log cache, controller and backend stats and release the playback device"""
+        if self.cache is not None:
+            logger.info(f"TTS cache stats: {self.cache.stats()}")
+        if self.controller is not None:
+            self.controller.log_stats()
+        self.pool.log_stats()
+        self.pool.close()
+        if self.playback is not None:
+            self.playback.close()
+        if self._owns_channels:
+            self.channels.close()
+
+    def arm_first_audio(self):
+        """Start a new utterance: ``first_audio_at`` is stamped when its first sound reaches the device"""
+        self.first_audio_at = None
+        if self.playback is not None:
+            self.playback.notify_first_audio(self._on_first_audio)
+
+    def _on_first_audio(self, at: float):
+        if self.first_audio_at is None:
+            self.first_audio_at = at
+
+    def _play(self, audio):
+        """Push synthesized PCM into the playback jitter buffer"""
+        if self._awaiting_audio is not None:
+            now = time.perf_counter()
+            TTS_TIME_TO_FIRST_AUDIO.observe(now - self._awaiting_audio)
+            self._awaiting_audio = None
+            self._chunk_first_audio = now
+        if self.playback is None:
+            # Without a device the audio is "played" once it is decoded
+            self._on_first_audio(time.perf_counter())
+            return
+        # Feed in period-sized slices so large batch responses never sit in
+        # the jitter buffer all at once
+        view = memoryview(self.converter.convert(audio))
+        step = self.playback.period_bytes * 16
+        for offset in range(0, len(view), step):
+            if self._cancelled.is_set():
+                return
+            self.playback.write(view[offset:offset + step])
+
+    def _wait_for_playback(self):
+        if self.playback is not None:
+            if not self._cancelled.is_set():
+                self.playback.write(self.converter.flush())
+            self.playback.drain()
 
     def synthesize_speech(self, text):
         """Synthesize speech from text input"""
@@ -38,68 +214,299 @@ class TTSService:
 
         # response_anth = message.content[0].text
         logger.info(f" Perceptra: {text}")
-        sound_stream = None
+        self._cancelled.clear()
+        self.converter.reset()
+        self.arm_first_audio()
 
         try:
-            # Initialize audio output devices if specified
-            if self.args.output_device is not None or self.args.play_audio:
-                sound_stream = riva.client.audio_io.SoundCallBack(
-                    self.args.output_device,
-                    nchannels=self.nchannels,
-                    sampwidth=self.sampwidth,
-                    framerate=self.args.sample_rate_hz,
-                )
-
             start = time.time()
 
-            if self.args.stream:
-                self._handle_streaming_synthesis(
-                    text, sound_stream, start
-                )  # Use Anthropic response
-            else:
-                self._handle_batch_synthesis(
-                    text, sound_stream, start
-                )  # Use Anthropic response
+            self._synthesize_chunk(text, start)  # Use Anthropic response
+
+            self._wait_for_playback()
 
         except Exception as e:
-            logger.error(f"TTS Error: {e}")
+            self._log_synthesis_error(e)
         finally:
-            if sound_stream is not None:
-                sound_stream.close()
+            self._track_call()
 
-    def _handle_streaming_synthesis(self, text, sound_stream, start):
-        """Handle streaming synthesis mode"""
-        responses = self.tts_service.synthesize_online(
-            text,
-            self.args.voice,
-            self.args.language_code,
-            sample_rate_hz=self.args.sample_rate_hz,
-            audio_prompt_file=self.args.audio_prompt_file,
-            quality=20 if self.args.quality is None else self.args.quality,
-            custom_dictionary={},
+    def render(self, text) -> bytes:
+        """Synthesize text to PCM at the TTS rate without playing it, e.g. to pre-render fixed replies"""
+        resp = self._hedged_synthesize(text)
+        decoder = Decoder(self.args.tts_encoding)
+        return decoder.decode(resp.audio) + decoder.flush()
+
+    def play_audio(self, audio):
+        """Play pre-rendered PCM at the TTS rate without contacting TTS"""
+        self._cancelled.clear()
+        self.converter.reset()
+        self._awaiting_audio = None
+        self.arm_first_audio()
+        self._play(audio)
+        self._wait_for_playback()
+
+    def speak_stream(self, text_chunks) -> str:
+        """
+        Synthesize and play text chunks as they arrive from an upstream iterator.
+
+        The upstream iterator (typically the LLM token stream cut into
+        sentences) is drained on a background thread into a bounded queue, so
+        the next sentence is generated while the current one is synthesized
+        and played. Chunks are spoken strictly in order.
+
+        Args:
+            text_chunks: Iterable of text chunks to speak
+
+        Returns:
+            str: The full text that was spoken
+        """
+        chunk_queue = queue.Queue(maxsize=self.args.tts_queue_size)
+        done = threading.Event()
+        spoken = []
+        self._cancelled.clear()
+        self.converter.reset()
+        self.arm_first_audio()
+
+        producer = threading.Thread(
+            target=self._produce_chunks,
+            args=(text_chunks, chunk_queue, done),
+            name="tts-chunk-producer",
+            daemon=True,
         )
+        start = time.time()
+        producer.start()
 
-        first = True
-        for resp in responses:
-            stop = time.time()
-            if first:
-                logger.info(f"Time to first audio: {(stop - start):.3f}s")
+        try:
+            first = True
+            while not self._cancelled.is_set():
+                try:
+                    chunk = chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if chunk is _END_OF_STREAM:
+                    break
+                logger.info(f" Perceptra: {chunk}")
+                spoken.append(chunk)
+                self._synthesize_chunk(chunk, start, first)
                 first = False
-            if sound_stream is not None:
-                sound_stream(resp.audio)
+            self._wait_for_playback()
+            if self._cancelled.is_set():
+                logger.info(f"Speech interrupted after {(time.time() - start):.3f}s")
+            elif not first:
+                logger.info(f"Turn audio complete: {(time.time() - start):.3f}s")
+        except Exception as e:
+            self._log_synthesis_error(e)
+        finally:
+            done.set()
+            self._track_call()
+
+        return " ".join(spoken)
+
+    def _log_synthesis_error(self, error):
+        if self._cancelled.is_set():
+            logger.info("Speech interrupted")
+        else:
+            logger.error(f"TTS Error: {error}")
+
+    @staticmethod
+    def _produce_chunks(text_chunks, chunk_queue, done):
+        """Move chunks from the upstream iterator into the bounded queue"""
+        try:
+            for chunk in text_chunks:
+                while not done.is_set():
+                    try:
+                        chunk_queue.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if done.is_set():
+                    return
+        except Exception as e:
+            logger.error(f"Text stream error: {e}")
+        finally:
+            while not done.is_set():
+                try:
+                    chunk_queue.put(_END_OF_STREAM, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _synthesize_chunk(self, text, start, first=True):
+        """
+        Speak one piece of text, from the cache when possible.
+
+        A cache hit starts playback without any server round trip; a miss is
+        synthesized (streaming or batch) and the complete audio is stored.
+        With --tts-slo-ms the controller picks the mode and quality.
+        """
+        stream, quality, decision = self.args.stream, self.quality, None
+        if self.controller is not None:
+            decision = self.controller.choose(text)
+            stream, quality = decision.stream, decision.quality
+        self._awaiting_audio = time.perf_counter()
+        self._chunk_first_audio = None
+        key = None
+        if self.cache is not None and self.args.audio_prompt_file is None:
+            key = TTSCache.make_key(
+                text,
+                self.args.voice,
+                self.args.language_code,
+                self.rates.tts,
+                quality,
+                self.custom_dictionary,
+                self.args.tts_encoding,
+            )
+            audio = self.cache.get(key)
+            if audio is not None:
+                if first:
+                    logger.info(f"Time to first audio (cached): {(time.time() - start):.3f}s")
+                self._play(audio)
+                return
 
-    def _handle_batch_synthesis(self, text, sound_stream, start):
+        requested = self._awaiting_audio
+        try:
+            audio = self._synthesize(text, start, first, stream, quality, collect=key is not None or decision is not None)
+        except grpc.RpcError as e:
+            # Fail over once if the backend went away before any audio played
+            if e.code() != grpc.StatusCode.UNAVAILABLE or len(self.pool) < 2 or self._chunk_first_audio is not None:
+                raise
+            logger.warning(f"TTS backend unavailable, retrying on another: {e.details()}")
+            audio = self._synthesize(text, start, first, stream, quality, collect=key is not None or decision is not None)
+
+        if decision is not None and self._chunk_first_audio is not None and not self._cancelled.is_set():
+            self.controller.observe(
+                decision,
+                self._chunk_first_audio - requested,
+                time.perf_counter() - requested,
+                len(audio) / (self.sampwidth * self.rates.tts),
+            )
+        if key is not None and audio and not self._cancelled.is_set():
+            self.cache.put(key, audio)
+
+    def _synthesize(self, text, start, first, stream, quality, collect):
+        if self.recorder is not None:
+            self.recorder.write(TTS_OPEN, json.dumps({"text": text, "stream": stream}).encode())
+        if stream:
+            return self._handle_streaming_synthesis(text, start, first, collect=collect, quality=quality)
+        return self._handle_batch_synthesis(text, start, first, quality=quality)
+
+    def _handle_streaming_synthesis(self, text, start, first=True, collect=False, quality=None):
+        """Handle streaming synthesis mode"""
+        with self.pool.lease() as backend:
+            sent = time.perf_counter()
+            responses = backend.service.synthesize_online(
+                text,
+                self.args.voice,
+                self.args.language_code,
+                encoding=proto_encoding(self.args.tts_encoding),
+                sample_rate_hz=self.rates.tts,
+                audio_prompt_file=self.args.audio_prompt_file,
+                quality=self.quality if quality is None else quality,
+                custom_dictionary=self.custom_dictionary,
+            )
+            self._track_call(responses)
+
+            collected = []
+            decoder = Decoder(self.args.tts_encoding)
+            for resp in responses:
+                if self._cancelled.is_set():
+                    break
+                audio = decoder.decode(resp.audio)
+                if not audio:
+                    continue
+                if sent is not None:
+                    self.pool.observe(backend, time.perf_counter() - sent)
+                    sent = None
+                if self.recorder is not None:
+                    self.recorder.write(TTS_AUDIO, audio)
+                stop = time.time()
+                if first:
+                    logger.info(f"Time to first audio: {(stop - start):.3f}s")
+                    first = False
+                self._play(audio)
+                if collect:
+                    collected.append(audio)
+        audio = decoder.flush()
+        if audio and not self._cancelled.is_set():
+            if self.recorder is not None:
+                self.recorder.write(TTS_AUDIO, audio)
+            self._play(audio)
+            if collect:
+                collected.append(audio)
+        return b"".join(collected)
+
+    def _handle_batch_synthesis(self, text, start, first=True, quality=None):
         """Handle batch synthesis mode"""
-        resp = self.tts_service.synthesize(
-            text,
-            self.args.voice,
-            self.args.language_code,
-            sample_rate_hz=self.args.sample_rate_hz,
-            audio_prompt_file=self.args.audio_prompt_file,
-            quality=20 if self.args.quality is None else self.args.quality,
-        )
+        resp = self._hedged_synthesize(text, quality)
         stop = time.time()
-        logger.info(f"Time spent: {(stop - start):.3f}s")
+        if first:
+            logger.info(f"Time spent: {(stop - start):.3f}s")
+
+        decoder = Decoder(self.args.tts_encoding)
+        audio = decoder.decode(resp.audio) + decoder.flush()
+        if self.recorder is not None:
+            self.recorder.write(TTS_AUDIO, audio)
+        self._play(audio)
+        return audio
+
+    def _hedged_synthesize(self, text, quality=None):
+        """
+        Batch Synthesize on the least loaded backend. With --tts-hedge-ms and
+        a second backend, a request still unanswered after the threshold is
+        also sent to the second one; the first successful answer wins and the
+        other request is cancelled.
+        """
+        answered = queue.Queue()
+
+        def send(backend):
+            sent = time.perf_counter()
+            call = backend.service.synthesize(
+                text,
+                self.args.voice,
+                self.args.language_code,
+                encoding=proto_encoding(self.args.tts_encoding),
+                sample_rate_hz=self.rates.tts,
+                audio_prompt_file=self.args.audio_prompt_file,
+                quality=self.quality if quality is None else quality,
+                future=True,
+                custom_dictionary=self.custom_dictionary,
+            )
+            self.pool.release_when_done(backend, call)
+
+            def done(call):
+                if not call.cancelled() and call.exception() is None:
+                    self.pool.observe(backend, time.perf_counter() - sent)
+                elif call.cancelled() and not self._cancelled.is_set():
+                    # Lost a hedge: it took at least this long
+                    self.pool.observe(backend, time.perf_counter() - sent, answered=False)
+                answered.put(call)
+
+            call.add_done_callback(done)
+            return call
+
+        primary = self.pool.acquire()
+        calls = [send(primary)]
+        self._track_call(*calls)
+        call = None
+        if self.args.tts_hedge_ms > 0 and len(self.pool) > 1:
+            try:
+                call = answered.get(timeout=self.args.tts_hedge_ms / 1000)
+            except queue.Empty:
+                calls.append(send(self.pool.acquire(exclude=primary, hedge=True)))
+                self._track_call(*calls)
 
-        if sound_stream is not None:
-            sound_stream(resp.audio)
\ No newline at end of file
+        # Take the first successful answer, or the last failure
+        pending = len(calls)
+        while True:
+            if call is None:
+                call = answered.get()
+            pending -= 1
+            if pending == 0 or (not call.cancelled() and call.exception() is None):
+                break
+            call = None
+        for other in calls:
+            if other is not call:
+                other.cancel()
+        if len(calls) > 1:
+            TTS_HEDGES.inc(winner="hedge" if call is calls[1] else "primary")
+        return call.result()
@@ -0,0 +1,167 @@
+import collections
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from agent_config import audio_rates
+from shared_logging import setup_logger
+
+logger = setup_logger()
+
+
+class VoiceActivityGate:
+    """
+    Client-side voice activity detection for mic audio.
+
+    Each chunk is split into short frames and classified with vectorized
+    energy and zero-crossing-rate features: a frame is speech if its level
+    is above the threshold, or slightly below it with a high crossing rate
+    (unvoiced sounds such as "s" and "f"). The threshold follows the room's
+    noise floor, a low percentile of the frame levels over the last
+    ``noise_window_ms``: pauses between words reach it even while someone
+    keeps talking, so rising background noise is picked up. An utterance opens on the first speech chunk, prefixed with
+    the last ``preroll_ms`` of audio so onsets are not clipped, and closes
+    after ``hangover_ms`` without speech. Everything else is suppressed.
+    """
+
+    def __init__(
+        self,
+        sample_rate_hz: int,
+        threshold_db: float = -45.0,
+        hangover_ms: int = 600,
+        preroll_ms: int = 300,
+        frame_ms: int = 20,
+        noise_margin_db: float = 10.0,
+        fricative_zcr: float = 0.25,
+        noise_window_ms: int = 5000,
+        noise_percentile: float = 10.0,
+    ):
+        self.sample_rate_hz = sample_rate_hz
+        self.threshold_db = threshold_db
+        self.hangover_ms = hangover_ms
+        self.preroll_ms = preroll_ms
+        self.frame = max(1, sample_rate_hz * frame_ms // 1000)
+        self.noise_margin_db = noise_margin_db
+        self.fricative_zcr = fricative_zcr
+        self.noise_floor_db = threshold_db - noise_margin_db
+        self.noise_percentile = noise_percentile
+        self._levels = collections.deque(maxlen=max(1, noise_window_ms // frame_ms))
+
+        self._preroll = collections.deque()
+        self._preroll_bytes = 0
+        self._active = False
+        self._silence_ms = 0.0
+
+        self.total_bytes = 0
+        self.sent_bytes = 0
+        self.utterances = 0
+
+    def _frame_speech(self, chunk) -> np.ndarray:
+        samples = np.frombuffer(chunk, dtype="<i2")
+        n = len(samples) // self.frame
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+        frames = samples[: n * self.frame].reshape(n, self.frame).astype(np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1)) + 1e-3
+        level_db = 20 * np.log10(rms / 32768.0)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+
+        threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+        speech = (level_db > threshold) | ((level_db > threshold - 6.0) & (zcr > self.fricative_zcr))
+        # Track the noise floor slowly, whatever the frames were classified as
+        self._levels.extend(level_db.tolist())
+        floor = float(np.percentile(self._levels, self.noise_percentile))
+        self.noise_floor_db += 0.05 * (floor - self.noise_floor_db)
+        return speech
+
+    def is_speech(self, chunk) -> bool:
+        """Whether any frame of the chunk is classified as speech"""
+        return bool(self._frame_speech(chunk).any())
+
+    def push(self, chunk) -> Tuple[List[bytes], bool]:
+        """
+        Feed one mic chunk.
+
+        Returns:
+            Tuple of (chunks to send now, whether the utterance just ended)
+        """
+        self.total_bytes += len(chunk)
+        chunk_ms = 1000 * len(chunk) / (2 * self.sample_rate_hz)
+        speech = self.is_speech(chunk)
+
+        if not self._active:
+            if not speech:
+                self._preroll.append(chunk)
+                self._preroll_bytes += len(chunk)
+                while self._preroll and self._preroll_bytes - len(self._preroll[0]) >= (
+                    2 * self.sample_rate_hz * self.preroll_ms // 1000
+                ):
+                    self._preroll_bytes -= len(self._preroll.popleft())
+                return [], False
+            self._active = True
+            self._silence_ms = 0.0
+            self.utterances += 1
+            out = list(self._preroll) + [chunk]
+            self._preroll.clear()
+            self._preroll_bytes = 0
+            self.sent_bytes += sum(len(c) for c in out)
+            return out, False
+
+        self.sent_bytes += len(chunk)
+        self._silence_ms = 0.0 if speech else self._silence_ms + chunk_ms
+        if self._silence_ms >= self.hangover_ms:
+            self._active = False
+            return [chunk], True
+        return [chunk], False
+
+    def utterance(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield one utterance (pre-roll, speech and hangover) from a chunk iterator"""
+        for chunk in chunks:
+            out, ended = self.push(chunk)
+            yield from out
+            if ended:
+                return
+
+    async def utterance_async(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Async counterpart of ``utterance``"""
+        async for chunk in chunks:
+            out, ended = self.push(chunk)
+            for item in out:
+                yield item
+            if ended:
+                return
+
+    def filter(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield only the speech portions of a chunk iterator, across utterances"""
+        for chunk in chunks:
+            out, _ = self.push(chunk)
+            yield from out
+
+    def stats(self) -> Dict[str, float]:
+        """Audio seen and sent, and the fraction suppressed"""
+        seconds = 1 / (2 * self.sample_rate_hz)
+        return {
+            "utterances": self.utterances,
+            "audio_s": round(self.total_bytes * seconds, 3),
+            "sent_s": round(self.sent_bytes * seconds, 3),
+            "suppressed_fraction": round(1 - self.sent_bytes / self.total_bytes, 4) if self.total_bytes else 0.0,
+        }
+
+    def log_stats(self, label: str = "VAD"):
+        stats = self.stats()
+        logger.info(
+            f"{label}: suppressed {stats['suppressed_fraction']:.1%} of {stats['audio_s']:.1f}s "
+            f"of audio over {stats['utterances']} utterances"
+        )
+
+
+def build_vad(args):
+    """Create the gate configured on the command line, or None if --vad is off"""
+    if not args.vad:
+        return None
+    return VoiceActivityGate(
+        audio_rates(args).capture,
+        threshold_db=args.vad_threshold_db,
+        hangover_ms=args.vad_hangover_ms,
+        preroll_ms=args.vad_preroll_ms,
+    )